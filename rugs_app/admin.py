@@ -1,7 +1,9 @@
 from django.contrib import admin
-from .models import User, Rug, Order
+from .models import User, Rug, Order, EmailJob, RugHold
 
 # Register your models here.
 admin.site.register(User)
 admin.site.register(Rug)
 admin.site.register(Order)
+admin.site.register(EmailJob)
+admin.site.register(RugHold)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class RugsAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'rugs_app'
+
+    def ready(self):
+        from . import signals
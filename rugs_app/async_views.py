@@ -0,0 +1,141 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.http import Http404
+from rest_framework import exceptions
+from rest_framework.response import Response
+
+
+class AsyncAPIViewMixin:
+    """
+    With `ASYNC_VIEWS` on, serves a DRF view's GET requests from a coroutine,
+    `aget`, whose queries go through Django's async ORM. Cache reads and the
+    like, which may hit the database too (e.g. the database cache backend),
+    are awaited through sync_to_async. Other methods go through the regular
+    sync view.
+
+    Django 4.1's async ORM still runs each query in a thread, so under an
+    ASGI server this only frees the request's thread between queries;
+    `manage.py benchmark_concurrency` compares it with the sync views.
+
+    Django only keeps a request on the event loop when every middleware is
+    async capable. PerformanceMiddleware is sync only, so with
+    PERFORMANCE_METRICS on, these views run in a thread like the sync ones.
+    """
+    async_methods = ("GET",)
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        sync_view = super().as_view(**initkwargs)
+        if not getattr(settings, "ASYNC_VIEWS", False):
+            return sync_view
+        run_sync_view = sync_to_async(sync_view)
+
+        async def view(request, *args, **kwargs):
+            if request.method not in cls.async_methods:
+                return await run_sync_view(request, *args, **kwargs)
+            self = cls(**initkwargs)
+            self.setup(request, *args, **kwargs)
+            return await self.adispatch(request, *args, **kwargs)
+
+        view.cls = cls
+        view.initkwargs = initkwargs
+        # What csrf_exempt() does, without wrapping the coroutine in a sync function
+        view.csrf_exempt = True
+        return view
+
+    async def adispatch(self, request, *args, **kwargs):
+        # APIView.dispatch, awaiting the steps that query
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await self.ainitial(request, *args, **kwargs)
+            response = await getattr(self, "a" + request.method.lower())(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def ainitial(self, request, *args, **kwargs):
+        # APIView.initial; of its steps, only authentication queries
+        self.format_kwarg = self.get_format_suffix(**kwargs)
+        request.accepted_renderer, request.accepted_media_type = self.perform_content_negotiation(request)
+        request.version, request.versioning_scheme = self.determine_version(request, *args, **kwargs)
+        await self.aperform_authentication(request)
+        self.check_permissions(request)
+        self.check_throttles(request)
+
+    async def aperform_authentication(self, request):
+        # Request._authenticate, with each authenticator's `aauthenticate` when it has one
+        for authenticator in request.authenticators:
+            authenticate = getattr(authenticator, "aauthenticate", None) or sync_to_async(authenticator.authenticate)
+            try:
+                user_auth_tuple = await authenticate(request)
+            except exceptions.APIException:
+                request._not_authenticated()
+                raise
+            if user_auth_tuple is not None:
+                request._authenticator = authenticator
+                request.user, request.auth = user_auth_tuple
+                return
+        request._not_authenticated()
+
+
+class AsyncGenericAPIViewMixin(AsyncAPIViewMixin):
+    """
+    The queryset steps of GenericAPIView for async views. Pagination goes
+    through the pagination class's `apaginate_queryset` (see
+    rugs_app.pagination).
+    """
+
+    async def afilter_queryset(self, queryset):
+        # Filtering may query, to pick a replica or find the search backend
+        return await sync_to_async(self.filter_queryset)(queryset)
+
+    async def apaginate_queryset(self, queryset):
+        if self.paginator is None:
+            return None
+        return await self.paginator.apaginate_queryset(queryset, self.request, view=self)
+
+    async def aget_object(self):
+        # GenericAPIView.get_object over the async ORM
+        queryset = await self.afilter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            instance = await queryset.aget(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (queryset.model.DoesNotExist, TypeError, ValueError, ValidationError):
+            raise Http404
+        self.check_object_permissions(self.request, instance)
+        return instance
+
+
+class AsyncListModelMixin(AsyncGenericAPIViewMixin):
+
+    async def aget(self, request, *args, **kwargs):
+        return await self.alist(request, *args, **kwargs)
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = await self.afilter_queryset(self.get_queryset())
+        page = await self.apaginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+
+        serializer = self.get_serializer([instance async for instance in queryset], many=True)
+        return Response(serializer.data)
+
+
+class AsyncRetrieveModelMixin(AsyncGenericAPIViewMixin):
+
+    async def aget(self, request, *args, **kwargs):
+        return await self.aretrieve(request, *args, **kwargs)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        instance = await self.aget_object()
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data)
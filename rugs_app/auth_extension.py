@@ -4,6 +4,7 @@ from drf_spectacular.extensions import OpenApiAuthenticationExtension
 class AuthenticationScheme(OpenApiAuthenticationExtension):
     target_class = 'knox.auth.TokenAuthentication'
     name = 'TokenAuthentication'
+    match_subclasses = True
 
     def get_security_definition(self, auto_schema):
         return {
@@ -11,3 +12,9 @@ class AuthenticationScheme(OpenApiAuthenticationExtension):
             'name': 'Authorization',
             'in': 'header'
         }
+
+
+def register_extensions(endpoints, **kwargs):
+    # Preprocessing hook in SPECTACULAR_SETTINGS: importing this module registers the extension above
+    # whenever a schema is generated, without importing drf_spectacular on startup
+    return endpoints
@@ -0,0 +1,187 @@
+import binascii
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from knox.auth import TokenAuthentication
+from knox.crypto import hash_token
+from knox.models import AuthToken
+from knox.settings import knox_settings
+from knox.signals import token_expired
+from rest_framework import exceptions
+from rest_framework.authentication import get_authorization_header
+
+from .cache import incr_counter
+from .models import User
+
+
+def token_cache_key(digest):
+    return f"rugs:auth:{digest}"
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Knox token authentication that keeps each verified token's user id and
+    expiry in the cache under the token's digest, so a repeat request skips
+    the token query and only loads the user. The user is read fresh each
+    time, so a deactivated user is refused at once and no password hash
+    ends up in the cache.
+
+    Entries live for `AUTH_TOKEN_CACHE_TIMEOUT` seconds at most and never past
+    the token's expiry. A signal drops them as soon as the token is deleted
+    (e.g. on logout, see rugs_app.signals); outside development the cache is
+    shared, so that reaches every process.
+
+    Async views authenticate with `aauthenticate`, which runs the same steps
+    over the async ORM.
+    """
+
+    def authenticate(self, request):
+        token = self.get_token(request)
+        return None if token is None else self.authenticate_credentials(token)
+
+    async def aauthenticate(self, request):
+        # authenticate() for async views (see rugs_app.async_views)
+        token = self.get_token(request)
+        return None if token is None else await self.aauthenticate_credentials(token)
+
+    def get_token(self, request):
+        # The token from the Authorization header, or None if the header is meant for another scheme
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != knox_settings.AUTH_HEADER_PREFIX.encode().lower():
+            return None
+        if len(auth) == 1:
+            raise exceptions.AuthenticationFailed(gettext_lazy("Invalid token header. No credentials provided."))
+        if len(auth) > 2:
+            raise exceptions.AuthenticationFailed(
+                gettext_lazy("Invalid token header. Token string should not contain spaces.")
+            )
+        return auth[1]
+
+    def authenticate_credentials(self, token):
+        digest = self.get_digest(token)
+        key = token_cache_key(digest)
+        auth_token = self.get_cached_token(key, digest)
+        if auth_token is not None:
+            incr_counter("auth_cache_hits")
+            if knox_settings.AUTO_REFRESH and auth_token.expiry:
+                self.renew_token(auth_token)
+                self.cache_token(key, auth_token)
+            return self.validate_user(auth_token)
+
+        incr_counter("auth_cache_misses")
+        # The digest is the primary key, so one query finds the token and its user. Knox also
+        # sweeps every other token of the user on each lookup; purge_expired_tokens does that instead
+        auth_token = AuthToken.objects.select_related("user").filter(digest=digest).first()
+        self.check_token(auth_token)
+        if knox_settings.AUTO_REFRESH and auth_token.expiry:
+            self.renew_token(auth_token)
+        user, auth_token = self.validate_user(auth_token)
+        self.cache_token(key, auth_token)
+        return user, auth_token
+
+    async def aauthenticate_credentials(self, token):
+        # authenticate_credentials() over the async ORM
+        digest = self.get_digest(token)
+        key = token_cache_key(digest)
+        auth_token = await self.aget_cached_token(key, digest)
+        if auth_token is not None:
+            await sync_to_async(incr_counter)("auth_cache_hits")
+            if knox_settings.AUTO_REFRESH and auth_token.expiry:
+                await sync_to_async(self.renew_token)(auth_token)
+                await sync_to_async(self.cache_token)(key, auth_token)
+            return self.validate_user(auth_token)
+
+        await sync_to_async(incr_counter)("auth_cache_misses")
+        auth_token = await AuthToken.objects.select_related("user").filter(digest=digest).afirst()
+        await sync_to_async(self.check_token)(auth_token)
+        if knox_settings.AUTO_REFRESH and auth_token.expiry:
+            await sync_to_async(self.renew_token)(auth_token)
+        user, auth_token = self.validate_user(auth_token)
+        await sync_to_async(self.cache_token)(key, auth_token)
+        return user, auth_token
+
+    def get_digest(self, token):
+        try:
+            return hash_token(token.decode("utf-8"))
+        except (TypeError, UnicodeDecodeError, binascii.Error):
+            raise exceptions.AuthenticationFailed(gettext_lazy("Invalid token."))
+
+    def check_token(self, auth_token):
+        # Refuses a token that doesn't exist, deleting it if it has expired
+        if auth_token is None:
+            raise exceptions.AuthenticationFailed(gettext_lazy("Invalid token."))
+        if auth_token.expiry is not None and auth_token.expiry < timezone.now():
+            auth_token.delete()
+            token_expired.send(sender=self.__class__, username=auth_token.user.get_username(), source="auth_token")
+            raise exceptions.AuthenticationFailed(gettext_lazy("Invalid token."))
+
+    def get_cached_token(self, key, digest):
+        # The cached token, with its user loaded, or None if it isn't cached or has expired
+        entry = cache.get(key)
+        if not self.is_current(entry):
+            return None
+        return self.build_token(digest, entry, User.objects.filter(pk=entry["user"]).first())
+
+    async def aget_cached_token(self, key, digest):
+        entry = await cache.aget(key)
+        if not self.is_current(entry):
+            return None
+        return self.build_token(digest, entry, await User.objects.filter(pk=entry["user"]).afirst())
+
+    def is_current(self, entry):
+        return entry is not None and (entry["expiry"] is None or entry["expiry"] > timezone.now())
+
+    def build_token(self, digest, entry, user):
+        if user is None:
+            return None
+        auth_token = AuthToken.from_db(
+            router.db_for_read(AuthToken), ["digest", "user_id", "expiry"], [digest, user.pk, entry["expiry"]]
+        )
+        auth_token.user = user
+        return auth_token
+
+    def cache_token(self, key, auth_token):
+        timeout = getattr(settings, "AUTH_TOKEN_CACHE_TIMEOUT", 300)
+        if auth_token.expiry is not None:
+            timeout = min(timeout, (auth_token.expiry - timezone.now()).total_seconds())
+        if timeout > 0:
+            cache.set(key, {"user": auth_token.user_id, "expiry": auth_token.expiry}, timeout)
+
+
+def create_token(user):
+    """
+    Creates a new token for `user`, deleting their oldest tokens beyond
+    `AUTH_TOKEN_LIMIT_PER_USER`. Returns the same `(instance, token)` pair as
+    `AuthToken.objects.create`.
+    """
+    instance, token = AuthToken.objects.create(user)
+    limit = getattr(settings, "AUTH_TOKEN_LIMIT_PER_USER", None)
+    if limit:
+        evicted = AuthToken.objects.filter(user=user).order_by("-created").values_list("digest", flat=True)[limit:]
+        AuthToken.objects.filter(digest__in=list(evicted)).delete()
+    return instance, token
+
+
+def refresh_token(auth_token):
+    if auth_token.expiry is not None:
+        auth_token.expiry = timezone.now() + knox_settings.TOKEN_TTL
+        auth_token.save(update_fields=["expiry"])
+
+
+def purge_expired_tokens(batch_size=1000):
+    """
+    Deletes expired tokens a batch at a time, so the table is never locked for
+    long, and returns how many were deleted.
+    """
+    deleted = 0
+    while True:
+        digests = list(
+            AuthToken.objects.filter(expiry__lt=timezone.now()).values_list("digest", flat=True)[:batch_size]
+        )
+        if not digests:
+            return deleted
+        deleted += AuthToken.objects.filter(digest__in=digests).delete()[0]
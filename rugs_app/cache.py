@@ -0,0 +1,175 @@
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from rest_framework.response import Response
+
+# Version namespaces; each is bumped whenever the data behind it changes
+CATALOG = "catalog"
+ORDERS = "orders"
+
+
+def user_orders_namespace(user_pk):
+    return f"orders:{user_pk}"
+
+
+def order_namespace(order_pk):
+    return f"order:{order_pk}"
+
+
+def cart_namespace(user_pk):
+    return f"cart:{user_pk}"
+
+
+def _version_key(namespace):
+    return f"rugs:version:{namespace}"
+
+
+def _modified_key(namespace):
+    return f"rugs:modified:{namespace}"
+
+
+def _initial_version():
+    # Seed from the clock so a version lost to cache eviction never repeats an old one
+    return time.time_ns() // 1000
+
+
+def get_version(namespace):
+    key = _version_key(namespace)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def get_validators(namespaces):
+    """
+    Returns the current version of each namespace and the time of the most
+    recent change to any of them, in as few cache round trips as possible.
+    """
+    keys = [_version_key(namespace) for namespace in namespaces]
+    modified_keys = [_modified_key(namespace) for namespace in namespaces]
+    values = cache.get_many(keys + modified_keys)
+
+    versions = []
+    for namespace, key in zip(namespaces, keys):
+        versions.append(values[key] if key in values else get_version(namespace))
+
+    now = time.time()
+    for key in modified_keys:
+        if key not in values:
+            # Unknown means "could have changed just now"
+            cache.add(key, now, timeout=None)
+    last_modified = max((values.get(key, now) for key in modified_keys), default=now)
+    return versions, last_modified
+
+
+def _bump(namespace):
+    key = _version_key(namespace)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, _initial_version(), timeout=None)
+    cache.set(_modified_key(namespace), time.time(), timeout=None)
+
+
+def bump_version(*namespaces):
+    def bump():
+        for namespace in namespaces:
+            _bump(namespace)
+
+    bump()
+    # Bump again once the transaction commits, so a response cached from a read
+    # that ran before the commit can't stay current
+    if connection.in_atomic_block:
+        transaction.on_commit(bump)
+
+
+def incr_counter(name):
+    key = f"rugs:counter:{name}"
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def get_counters(*names):
+    values = cache.get_many([f"rugs:counter:{name}" for name in names])
+    return {name: values.get(f"rugs:counter:{name}", 0) for name in names}
+
+
+class CatalogCacheMixin:
+    """
+    Caches GET responses of catalog views under the current catalog version, so
+    any change to a rug makes every cached page unreachable at once.
+    """
+    # Query parameters that change the response; everything else is ignored
+    cache_query_params = ("status", "search", "ordering", "page", "pagination", "cursor", "fields", "omit")
+
+    def get_cache_key(self, request):
+        params = sorted(
+            (name, value)
+            for name in self.cache_query_params
+            for value in request.query_params.getlist(name)
+        )
+        # Pagination links are absolute, so the host is part of the response
+        identity = "|".join([
+            request.build_absolute_uri(request.path),
+            urlencode(params),
+        ])
+        digest = hashlib.sha256(identity.encode("utf-8")).hexdigest()
+        return f"rugs:response:{get_version(CATALOG)}:{digest}"
+
+    def get_cached_response(self, request, build_response):
+        key, response = self.get_cached(request)
+        if response is None:
+            response = self.cache_response(key, build_response())
+        return response
+
+    async def aget_cached_response(self, request, build_response):
+        # get_cached_response for async views, where build_response returns a coroutine
+        key, response = await sync_to_async(self.get_cached)(request)
+        if response is None:
+            response = await sync_to_async(self.cache_response)(key, await build_response())
+        return response
+
+    def get_cached(self, request):
+        # The request's cache key, and its cached response or None
+        key = self.get_cache_key(request)
+        data = cache.get(key)
+        if data is None:
+            incr_counter("catalog_cache_misses")
+            return key, None
+
+        incr_counter("catalog_cache_hits")
+        response = Response(data)
+        response["X-Cache"] = "HIT"
+        return key, response
+
+    def cache_response(self, key, response):
+        if response.status_code == 200:
+            cache.set(key, response.data, getattr(settings, "RUG_CACHE_TIMEOUT", 300))
+        response["X-Cache"] = "MISS"
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(request, lambda: super(CatalogCacheMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(request, lambda: super(CatalogCacheMixin, self).retrieve(request, *args, **kwargs))
+
+    async def alist(self, request, *args, **kwargs):
+        return await self.aget_cached_response(
+            request, lambda: super(CatalogCacheMixin, self).alist(request, *args, **kwargs)
+        )
+
+    async def aretrieve(self, request, *args, **kwargs):
+        return await self.aget_cached_response(
+            request, lambda: super(CatalogCacheMixin, self).aretrieve(request, *args, **kwargs)
+        )
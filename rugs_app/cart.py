@@ -0,0 +1,303 @@
+import operator
+from datetime import timedelta
+from decimal import Decimal
+from functools import reduce
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, router, transaction
+from django.db.models import Count, Exists, F, OuterRef, Q, Sum
+from django.db.models.constants import OnConflict
+from django.utils import timezone
+
+from .cache import CATALOG, bump_version, cart_namespace, get_validators
+from .models import Rug, RugHold, User
+
+# Outcome of each rug in a cart update
+ADDED = "added"
+REMOVED = "removed"
+ALREADY_IN_CART = "already in cart"
+NOT_IN_CART = "not in cart"
+NOT_AVAILABLE = "not available"
+RESERVED = "reserved"
+NOT_FOUND = "not found"
+
+
+def _totals_key(user_pk):
+    return f"rugs:cart-totals:{user_pk}"
+
+
+def _versions(user_pk):
+    # A cart's total depends on what's in it and on the price of each rug
+    return get_validators([cart_namespace(user_pk), CATALOG])[0]
+
+
+def _bumped(versions):
+    # The versions after one bump of the cart's own version, if nothing else changed
+    return [versions[0] + 1, *versions[1:]]
+
+
+def _quantize(total):
+    # SQLite sums decimals as floats
+    return Decimal(total or 0).quantize(Decimal("0.01"))
+
+
+def _store(user_pk, versions, count, total):
+    cache.set(
+        _totals_key(user_pk),
+        {"versions": versions, "count": count, "total": total},
+        getattr(settings, "RUG_CACHE_TIMEOUT", 300)
+    )
+
+
+def get_cached_totals(user):
+    """
+    Returns the cart's current versions, and its cached `{"count", "total"}`
+    if they're still current (otherwise None). Taken before reading a cart to
+    change it, to carry the totals over with `update_cached_totals`.
+    """
+    versions = _versions(user.pk)
+    entry = cache.get(_totals_key(user.pk))
+    if entry is not None and entry["versions"] == versions:
+        return versions, entry
+    return versions, None
+
+
+def get_cart_totals(user):
+    """
+    Returns the number of rugs in the user's cart and their total price,
+    computed by a single aggregate query when the cached totals are stale.
+    """
+    # Read the versions first, so a change made while aggregating leaves the result stale
+    versions, entry = get_cached_totals(user)
+    if entry is not None:
+        return entry["count"], entry["total"]
+
+    totals = user.cart.aggregate(count=Count("pk"), total=Sum("price"))
+    count, total = totals["count"], _quantize(totals["total"])
+    _store(user.pk, versions, count, total)
+    return count, total
+
+
+async def aget_cart_totals(user):
+    # get_cart_totals over the async ORM
+    versions, entry = await sync_to_async(get_cached_totals)(user)
+    if entry is not None:
+        return entry["count"], entry["total"]
+
+    totals = await user.cart.aaggregate(count=Count("pk"), total=Sum("price"))
+    count, total = totals["count"], _quantize(totals["total"])
+    await sync_to_async(_store)(user.pk, versions, count, total)
+    return count, total
+
+
+def _store_if_unchanged(user_pk, bumped, count, total):
+    """
+    Caches totals for the versions a change left the cart at, `bumped` being
+    those read right after its bump_version, inside the transaction. If
+    anything else changed the cart or the catalog since, they're dropped
+    instead, to be recomputed.
+    """
+    # bump_version bumps again once the outermost transaction commits
+    versions = bumped if transaction.get_connection().in_atomic_block else _bumped(bumped)
+    if _versions(user_pk) == versions:
+        _store(user_pk, versions, count, total)
+    else:
+        cache.delete(_totals_key(user_pk))
+
+
+def update_cached_totals(user, versions, previous, bumped, count, total):
+    """
+    Applies a change of `count` rugs worth `total` to the totals cached
+    before the cart changed, so the next read doesn't need to aggregate.
+    `versions` and `previous` come from `get_cached_totals`, taken before the
+    change was worked out. If there were no totals, or another change to the
+    cart or the catalog got in between, the totals are left to be recomputed.
+    """
+    if previous is None or bumped != _bumped(versions):
+        cache.delete(_totals_key(user.pk))
+        return
+    _store_if_unchanged(user.pk, bumped, previous["count"] + count, _quantize(previous["total"] + total))
+
+
+def reset_cached_totals(user, bumped):
+    _store_if_unchanged(user.pk, bumped, 0, _quantize(0))
+
+
+def add_cart_rows(user, rug_pks):
+    """
+    Inserts the user's cart rows like bulk_create(ignore_conflicts=True),
+    but returns how many were actually inserted: rugs another request put in
+    the cart first are skipped.
+    """
+    if not rug_pks:
+        return 0
+    through = User.cart.through
+    connection = connections[router.db_for_write(through)]
+    ops = connection.ops
+    columns = ", ".join(ops.quote_name(through._meta.get_field(name).column) for name in ("user", "rug"))
+    sql = "{} {} ({}) VALUES {} {}".format(
+        ops.insert_statement(on_conflict=OnConflict.IGNORE),
+        ops.quote_name(through._meta.db_table),
+        columns,
+        ", ".join(["(%s, %s)"] * len(rug_pks)),
+        ops.on_conflict_suffix_sql(None, OnConflict.IGNORE, None, None),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [value for pk in rug_pks for value in (user.pk, pk)])
+        return cursor.rowcount
+
+
+def get_reservation_ttl():
+    # Seconds a rug added to a cart is held for its user; 0 turns reservations off
+    return getattr(settings, "CART_RESERVATION_TTL", 0)
+
+
+def hold_rugs(user, rug_pks):
+    """
+    Holds the given rugs for the user, taking over holds that have expired and
+    renewing the user's own. Returns the primary keys of the rugs now held.
+    """
+    now = timezone.now()
+    expires_at = now + timedelta(seconds=get_reservation_ttl())
+    RugHold.objects.filter(rug_id__in=rug_pks).filter(
+        Q(user_id=user.pk) | Q(expires_at__lte=now)
+    ).update(user_id=user.pk, expires_at=expires_at)
+    RugHold.objects.bulk_create(
+        [RugHold(rug_id=pk, user_id=user.pk, expires_at=expires_at) for pk in rug_pks], ignore_conflicts=True
+    )
+    # Whatever another user holds still has their expiry
+    return set(
+        RugHold.objects.filter(rug_id__in=rug_pks, user_id=user.pk, expires_at=expires_at).values_list("rug_id", flat=True)
+    )
+
+
+def remove_from_other_carts(user, rug_pks):
+    # A held rug belongs to one cart only
+    through = User.cart.through
+    others = through.objects.filter(rug_id__in=rug_pks).exclude(user_id=user.pk)
+    user_pks = set(others.values_list("user_id", flat=True))
+    if user_pks:
+        others.delete()
+        bump_version(*(cart_namespace(user_pk) for user_pk in user_pks))
+
+
+def update_cart(user, add=(), remove=()):
+    """
+    Adds and removes rugs from the user's cart in bulk, after checking every
+    rug in a single query. Returns the outcome for each rug as
+    `{"add": [{"rug", "result"}, ...], "remove": [...]}`.
+
+    With reservations on, added rugs are also held for the user, and a rug
+    someone else holds can't be added.
+    """
+    add, remove = list(dict.fromkeys(add)), list(dict.fromkeys(remove))
+    # Before reading the cart, so a change made from here on makes the cached totals stale
+    versions, previous = get_cached_totals(user)
+    reserve = bool(get_reservation_ttl())
+    through = User.cart.through
+    in_cart = through.objects.filter(user=user.pk, rug=OuterRef("pk"))
+    rugs = Rug.objects.filter(pk__in=add + remove).annotate(in_cart=Exists(in_cart))
+    fields = ["pk", "status", "price", "in_cart"]
+    if reserve:
+        rugs = rugs.annotate(hold_user=F("hold__user_id"), hold_expires_at=F("hold__expires_at"))
+        fields += ["hold_user", "hold_expires_at"]
+    rugs = {rug["pk"]: rug for rug in rugs.values(*fields)}
+
+    now = timezone.now()
+    add_results = {}
+    for pk in add:
+        rug = rugs.get(pk)
+        if rug is None:
+            add_results[pk] = NOT_FOUND
+        elif rug["status"] != Rug.RugStatus.AVAILABLE:
+            add_results[pk] = NOT_AVAILABLE
+        elif reserve and rug["hold_user"] not in (None, user.pk) and rug["hold_expires_at"] > now:
+            add_results[pk] = RESERVED
+        elif rug["in_cart"]:
+            add_results[pk] = ALREADY_IN_CART
+        else:
+            add_results[pk] = ADDED
+
+    if reserve:
+        # Adding a rug again renews its hold
+        candidates = [pk for pk, result in add_results.items() if result in (ADDED, ALREADY_IN_CART)]
+        held = hold_rugs(user, candidates) if candidates else set()
+        for pk in candidates:
+            if pk not in held:
+                add_results[pk] = RESERVED
+
+    results = {"add": [], "remove": []}
+    to_add, to_remove = [], []
+    count, total = 0, Decimal(0)
+    for pk in add:
+        if add_results[pk] == ADDED:
+            to_add.append(pk)
+            count, total = count + 1, total + rugs[pk]["price"]
+        results["add"].append({"rug": pk, "result": add_results[pk]})
+    for pk in remove:
+        rug = rugs.get(pk)
+        if rug is None:
+            result = NOT_FOUND
+        elif not rug["in_cart"]:
+            result = NOT_IN_CART
+        else:
+            result = REMOVED
+            to_remove.append(pk)
+            count, total = count - 1, total - rug["price"]
+        results["remove"].append({"rug": pk, "result": result})
+
+    if to_add or to_remove:
+        with transaction.atomic():
+            added = add_cart_rows(user, to_add)
+            removed, _ = through.objects.filter(user_id=user.pk, rug_id__in=to_remove).delete()
+            if reserve:
+                if to_add:
+                    remove_from_other_carts(user, to_add)
+                RugHold.objects.filter(user_id=user.pk, rug_id__in=to_remove).delete()
+            # Bulk operations on the through table don't send m2m_changed
+            bump_version(cart_namespace(user.pk))
+            bumped = _versions(user.pk)
+        if added != len(to_add) or removed != len(to_remove):
+            # Another request got to some of these rugs first, so the change isn't the one worked out above
+            previous = None
+        update_cached_totals(user, versions, previous, bumped, count, total)
+    return results
+
+
+def clear_cart(user):
+    with transaction.atomic():
+        User.cart.through.objects.filter(user_id=user.pk).delete()
+        if get_reservation_ttl():
+            RugHold.objects.filter(user_id=user.pk).delete()
+        bump_version(cart_namespace(user.pk))
+        bumped = _versions(user.pk)
+    reset_cached_totals(user, bumped)
+
+
+def release_expired_holds(batch_size=1000):
+    """
+    Releases expired holds a batch at a time, oldest first along the expiry
+    index, removing each rug from the cart it was held in. Returns how many
+    holds were released.
+    """
+    through = User.cart.through
+    released = 0
+    while True:
+        with transaction.atomic():
+            # Rows locked by a user renewing their hold are left for the next run
+            holds = list(
+                RugHold.objects.select_for_update(skip_locked=True)
+                .filter(expires_at__lte=timezone.now())
+                .order_by("expires_at")
+                .values_list("pk", "user_id", "rug_id")[:batch_size]
+            )
+            if not holds:
+                return released
+            RugHold.objects.filter(pk__in=[pk for pk, _, _ in holds]).delete()
+            through.objects.filter(
+                reduce(operator.or_, (Q(user_id=user_pk, rug_id=rug_pk) for _, user_pk, rug_pk in holds))
+            ).delete()
+            bump_version(*{cart_namespace(user_pk) for _, user_pk, _ in holds})
+        released += len(holds)
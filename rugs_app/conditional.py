@@ -0,0 +1,80 @@
+import hashlib
+
+from asgiref.sync import sync_to_async
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from .cache import get_validators
+from .replicas import changed_recently, read_from_primary
+
+
+class ConditionalGetMixin:
+    """
+    Answers `If-None-Match` / `If-Modified-Since` with a 304 before the queryset
+    is evaluated or serialized. Validators come from the cache versions named
+    by `get_version_namespaces`, so computing them never touches the database.
+    """
+    # Responses that differ per user must not be shared by caches across users
+    vary_on_user = False
+
+    def get_version_namespaces(self, request):
+        raise NotImplementedError
+
+    def get_validators(self, request):
+        versions, last_modified = get_validators(self.get_version_namespaces(request))
+        identity = "|".join([str(version) for version in versions] + [
+            request.get_full_path(),
+            str(request.user.pk) if self.vary_on_user else "",
+        ])
+        etag = quote_etag(hashlib.sha256(identity.encode("utf-8")).hexdigest())
+        return etag, int(last_modified)
+
+    def get_conditional_response(self, request, build_response):
+        etag, last_modified = self.get_validators(request)
+        response = self.check_validators(request, etag, last_modified)
+        if response is None:
+            response = build_response()
+        return self.add_validators(response, etag, last_modified)
+
+    async def aget_conditional_response(self, request, build_response):
+        # get_conditional_response for async views, where build_response returns a coroutine
+        etag, last_modified = await sync_to_async(self.get_validators)(request)
+        response = self.check_validators(request, etag, last_modified)
+        if response is None:
+            response = await build_response()
+        return self.add_validators(response, etag, last_modified)
+
+    def check_validators(self, request, etag, last_modified):
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None and changed_recently(last_modified):
+            # Don't build (and cache) a response under the new version from a replica that may be behind
+            read_from_primary()
+        return response
+
+    def add_validators(self, response, etag, last_modified):
+        if response.status_code in (200, 304):
+            response["ETag"] = etag
+            response["Last-Modified"] = http_date(last_modified)
+            if self.vary_on_user:
+                patch_vary_headers(response, ("Authorization",))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.get_conditional_response(
+            request, lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_conditional_response(
+            request, lambda: super(ConditionalGetMixin, self).retrieve(request, *args, **kwargs)
+        )
+
+    async def alist(self, request, *args, **kwargs):
+        return await self.aget_conditional_response(
+            request, lambda: super(ConditionalGetMixin, self).alist(request, *args, **kwargs)
+        )
+
+    async def aretrieve(self, request, *args, **kwargs):
+        return await self.aget_conditional_response(
+            request, lambda: super(ConditionalGetMixin, self).aretrieve(request, *args, **kwargs)
+        )
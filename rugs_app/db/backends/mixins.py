@@ -0,0 +1,57 @@
+import time
+
+from rugs_app.metrics import observe_connection_wait, record_health_check_failure, record_pool_overflow, \
+    record_pool_state, record_pool_timeout
+
+
+class ConnectionMetricsMixin:
+    """
+    DatabaseWrapper mixin that reports to rugs_app.metrics how long getting a
+    connection takes and, for pooled backends, how many of the pool's
+    connections are in use or idle and how often it overflows or times out.
+
+    With CONN_HEALTH_CHECKS set, Django checks a persistent connection before
+    its first use in each request and replaces it if the server dropped it
+    while the worker, or a frozen serverless instance, sat idle; each
+    replacement is counted too.
+    """
+    # Raised by the pool when no connection frees up within its TIMEOUT
+    pool_timeout_error = ()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool = None
+
+    def get_new_connection(self, conn_params):
+        start = time.perf_counter()
+        try:
+            connection = super().get_new_connection(conn_params)
+        except self.pool_timeout_error:
+            record_pool_timeout(self.alias)
+            raise
+        observe_connection_wait(self.alias, time.perf_counter() - start)
+
+        # SQLAlchemy's pooled connections know their pool
+        self.pool = getattr(connection, "_pool", None)
+        if self.pool is not None:
+            if self.pool.checkedout() > self.pool.size():
+                record_pool_overflow(self.alias)
+            self.record_pool_state()
+        return connection
+
+    def _close(self):
+        try:
+            super()._close()
+        finally:
+            # Closing a pooled connection returns it to the pool
+            if self.pool is not None:
+                self.record_pool_state()
+
+    def record_pool_state(self):
+        record_pool_state(self.alias, self.pool.checkedout(), self.pool.checkedin())
+
+    def close_if_health_check_failed(self):
+        connection = self.connection
+        super().close_if_health_check_failed()
+        if connection is not None and self.connection is None:
+            record_health_check_failure(self.alias)
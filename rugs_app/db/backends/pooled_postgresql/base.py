@@ -0,0 +1,8 @@
+from dj_db_conn_pool.backends.postgresql.base import DatabaseWrapper as PooledDatabaseWrapper
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from ..mixins import ConnectionMetricsMixin
+
+
+class DatabaseWrapper(ConnectionMetricsMixin, PooledDatabaseWrapper):
+    pool_timeout_error = PoolTimeoutError
@@ -0,0 +1,7 @@
+from django.db.backends.postgresql.base import DatabaseWrapper as PostgreSQLDatabaseWrapper
+
+from ..mixins import ConnectionMetricsMixin
+
+
+class DatabaseWrapper(ConnectionMetricsMixin, PostgreSQLDatabaseWrapper):
+    pass
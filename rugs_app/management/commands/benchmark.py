@@ -0,0 +1,217 @@
+import json
+import math
+import platform
+import time
+from contextlib import ExitStack
+
+import django
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, \
+    teardown_test_environment
+from django.utils import timezone
+
+from rugs_app.authentication import create_token
+from rugs_app.models import Rug, User
+from rugs_app.seeding import SEED_PASSWORD, seed_data
+
+
+def percentile(values, percent):
+    # Nearest-rank percentile
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = (
+        "Drives the API endpoints through the Django test client and reports latency percentiles, "
+        "queries per request and requests per second"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rugs", type=int, default=2000, help="Rugs to seed")
+        parser.add_argument("--users", type=int, default=100, help="Users to seed")
+        parser.add_argument("--orders", type=int, default=500, help="Orders to seed")
+        parser.add_argument("--cart-items", type=int, default=500, help="Cart entries to seed")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed for the generated data")
+        parser.add_argument("--iterations", type=int, default=50, help="Requests per scenario")
+        parser.add_argument("--scenario", action="append", help="Only run the named scenario (repeatable)")
+        parser.add_argument(
+            "--use-existing-db", action="store_true",
+            help="Run against the configured database instead of a temporary test database. "
+                 "Checkout and cart scenarios change its data"
+        )
+        parser.add_argument("--skip-seed", action="store_true", help="Don't seed any data, e.g. after seed_data")
+        parser.add_argument("--output", help="Write the results as JSON to this file")
+        parser.add_argument("--compare", help="Compare with the JSON results of an earlier run")
+        parser.add_argument(
+            "--fail-threshold", type=float,
+            help="With --compare, fail if any p95 latency grew by more than this percentage, "
+                 "or if queries per request grew"
+        )
+
+    def handle(self, *args, **options):
+        with ExitStack() as stack:
+            try:
+                setup_test_environment(debug=False)
+                stack.callback(teardown_test_environment)
+            except RuntimeError:
+                # Already running inside the test runner
+                pass
+            if not options["use_existing_db"]:
+                old_config = setup_databases(verbosity=0, interactive=False)
+                stack.callback(teardown_databases, old_config, verbosity=0)
+            results = self.run_benchmark(options)
+
+        self.report(results)
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(results, output, indent=2)
+        if options["compare"]:
+            self.compare(results, options["compare"], options["fail_threshold"])
+
+    def run_benchmark(self, options):
+        if not options["skip_seed"]:
+            start = time.perf_counter()
+            seed_data(
+                rugs=options["rugs"], users=options["users"], orders=options["orders"],
+                cart_items=options["cart_items"], seed=options["seed"]
+            )
+            self.stdout.write(f"Seeded data in {time.perf_counter() - start:.1f}s")
+
+        user, _ = User.objects.get_or_create(username="benchmark", defaults={"email": "benchmark@example.com"})
+        user.set_password(SEED_PASSWORD)
+        user.save()
+        self.client = Client(HTTP_AUTHORIZATION=f"Token {create_token(user)[1]}")
+        self.anonymous_client = Client()
+        self.user = user
+
+        first_title = Rug.objects.values_list("title", flat=True).first() or "rug"
+        self.search_term = first_title.split()[0]
+        # Looked up ahead of time so the lookups aren't measured
+        self.rug_pks = list(Rug.objects.values_list("pk", flat=True)[:100]) or [0]
+        self.available_pks = list(
+            Rug.objects.filter(status=Rug.RugStatus.AVAILABLE).order_by("pk")
+            .values_list("pk", flat=True)[:options["iterations"] * 2]
+        )
+        if len(self.available_pks) < options["iterations"] * 2:
+            raise CommandError("Not enough available rugs for the cart and checkout scenarios; seed more rugs")
+
+        scenarios = self.get_scenarios()
+        names = options["scenario"] or list(scenarios)
+        unknown = set(names) - set(scenarios)
+        if unknown:
+            raise CommandError(f"Unknown scenario(s): {', '.join(sorted(unknown))}")
+
+        results = {
+            "meta": {
+                "date": timezone.now().isoformat(),
+                "database": connection.vendor,
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "iterations": options["iterations"],
+                "rugs": Rug.objects.count(),
+                "users": User.objects.count(),
+            },
+            "scenarios": {},
+        }
+        for name in names:
+            cache.clear()
+            results["scenarios"][name] = self.run_scenario(scenarios[name], options["iterations"])
+        return results
+
+    def get_scenarios(self):
+        # Each scenario returns the response of the single request being measured;
+        # anything it does before that, e.g. filling a cart, goes in its setup function
+        return {
+            "rug_list": (None, lambda i: self.anonymous_client.get("/api/rug", {"page": i % 20 + 1})),
+            "rug_list_cursor": (None, lambda i: self.anonymous_client.get("/api/rug", {"pagination": "cursor"})),
+            "rug_search": (None, lambda i: self.anonymous_client.get("/api/rug", {"search": self.search_term})),
+            "rug_ordering": (None, lambda i: self.anonymous_client.get("/api/rug", {"ordering": "price", "page": i % 20 + 1})),
+            "rug_detail": (None, lambda i: self.anonymous_client.get(f"/api/rug/{self.rug_pks[i % len(self.rug_pks)]}")),
+            "order_list": (None, lambda i: self.client.get("/api/order")),
+            "cart_summary": (None, lambda i: self.client.get("/api/cart/summary")),
+            "cart_batch": (None, lambda i: self.client.post(
+                "/api/cart/batch",
+                {"add": [self.available_pks[i // 2]]} if i % 2 == 0 else {"remove": [self.available_pks[i // 2]]},
+                "application/json"
+            )),
+            "checkout": (
+                lambda i: self.client.post("/api/cart", {"rug": self.available_pks.pop()}, "application/json"),
+                lambda i: self.client.post("/api/order")
+            ),
+            "login": (None, lambda i: self.anonymous_client.post(
+                "/api/login", {"username": self.user.username, "password": SEED_PASSWORD}, "application/json"
+            )),
+        }
+
+    def run_scenario(self, scenario, iterations):
+        setup, request = scenario
+        durations, query_counts, errors = [], [], 0
+        total = 0
+        for i in range(iterations):
+            if setup is not None:
+                setup(i)
+            counter = QueryCounter()
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(counter))
+                start = time.perf_counter()
+                response = request(i)
+                duration = time.perf_counter() - start
+            total += duration
+            durations.append(duration * 1000)
+            query_counts.append(counter.count)
+            if response.status_code >= 400:
+                errors += 1
+
+        return {
+            "requests": iterations,
+            "errors": errors,
+            "p50_ms": round(percentile(durations, 50), 3),
+            "p95_ms": round(percentile(durations, 95), 3),
+            "p99_ms": round(percentile(durations, 99), 3),
+            "mean_ms": round(sum(durations) / len(durations), 3),
+            "queries_per_request": round(sum(query_counts) / len(query_counts), 2),
+            "max_queries": max(query_counts),
+            "rps": round(iterations / total, 1) if total else None,
+        }
+
+    def report(self, results):
+        header = f"{'scenario':<18}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>10}{'rps':>10}{'errors':>8}"
+        self.stdout.write(header)
+        for name, result in results["scenarios"].items():
+            self.stdout.write(
+                f"{name:<18}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}"
+                f"{result['queries_per_request']:>10.2f}{result['rps'] or 0:>10.1f}{result['errors']:>8}"
+            )
+
+    def compare(self, results, path, fail_threshold):
+        with open(path) as previous_file:
+            previous = json.load(previous_file)["scenarios"]
+
+        regressions = []
+        self.stdout.write(f"\nCompared with {path}:")
+        for name, result in results["scenarios"].items():
+            if name not in previous:
+                continue
+            before = previous[name]
+            change = (result["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100 if before["p95_ms"] else 0
+            query_change = result["queries_per_request"] - before["queries_per_request"]
+            self.stdout.write(f"{name:<18} p95 {change:+.1f}%  queries {query_change:+.2f}")
+            if fail_threshold is not None and (change > fail_threshold or query_change > 0):
+                regressions.append(name)
+
+        if regressions:
+            raise CommandError(f"Regressed: {', '.join(regressions)}")
@@ -0,0 +1,246 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from types import ModuleType
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import RequestFactory
+from django.test.utils import override_settings, setup_databases, setup_test_environment, \
+    teardown_databases, teardown_test_environment
+from django.urls import include, path
+
+from rugs_app.authentication import create_token
+from rugs_app.models import Rug, User
+from rugs_app.seeding import seed_data
+from rugs_app.urls import build_urlpatterns
+
+from .benchmark import percentile
+
+# Requests made by each client, in turn; the ones with a user send its token
+ENDPOINTS = {
+    "rug_list": ("/api/rug", lambda i: {"page": i % 5 + 1}, False),
+    "rug_detail": ("/api/rug/{pk}", lambda i: {}, False),
+    "cart": ("/api/cart", lambda i: {}, True),
+    "cart_price": ("/api/cart/price", lambda i: {}, True),
+    "order_list": ("/api/order", lambda i: {}, True),
+}
+
+# How the requests are served: by a fixed pool of WSGI worker threads, or by Django's ASGI handler
+# with the sync views or with ASYNC_VIEWS on
+MODES = {
+    "wsgi": False,
+    "asgi": False,
+    "asgi-async": True,
+}
+
+
+def build_urlconf(async_views):
+    with override_settings(ASYNC_VIEWS=async_views):
+        urlconf = ModuleType(f"benchmark_urls_{'async' if async_views else 'sync'}")
+        urlconf.urlpatterns = [path("api/", include(build_urlpatterns()))]
+    return urlconf
+
+
+class DatabaseLatency:
+    """
+    Adds a fixed delay to every query, on every connection opened while
+    active, to stand in for the network round trip to a database server.
+    """
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def __call__(self, execute, sql, params, many, context):
+        time.sleep(self.seconds)
+        return execute(sql, params, many, context)
+
+    def connection_created(self, sender, connection, **kwargs):
+        connection.execute_wrappers.append(self)
+
+    def __enter__(self):
+        connection_created.connect(self.connection_created)
+        for connection in connections.all():
+            connection.execute_wrappers.append(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        connection_created.disconnect(self.connection_created)
+        for connection in connections.all():
+            if self in connection.execute_wrappers:
+                connection.execute_wrappers.remove(self)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares throughput of the read endpoints under many concurrent slow clients when served by a "
+        "WSGI thread pool, by ASGI with the sync views and by ASGI with ASYNC_VIEWS on"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rugs", type=int, default=200, help="Rugs to seed")
+        parser.add_argument("--users", type=int, default=20, help="Users to seed")
+        parser.add_argument("--orders", type=int, default=40, help="Orders to seed")
+        parser.add_argument("--cart-items", type=int, default=40, help="Cart entries to seed")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed for the generated data")
+        parser.add_argument("--clients", type=int, default=100, help="Concurrent clients")
+        parser.add_argument("--requests", type=int, default=5, help="Requests per client")
+        parser.add_argument("--workers", type=int, default=8, help="Threads in the WSGI pool, as in gunicorn --threads")
+        parser.add_argument("--client-delay", type=float, default=50, help="Milliseconds a client takes to send "
+                                                                            "its request and again to read the response")
+        parser.add_argument("--db-latency", type=float, default=5, help="Milliseconds added to every query")
+        parser.add_argument("--mode", action="append", choices=list(MODES), help="Only run this mode (repeatable)")
+        parser.add_argument("--endpoint", action="append", choices=list(ENDPOINTS),
+                            help="Only request this endpoint (repeatable)")
+        parser.add_argument("--use-existing-db", action="store_true",
+                            help="Run against the configured database instead of a temporary test database")
+        parser.add_argument("--skip-seed", action="store_true", help="Don't seed any data, e.g. after seed_data")
+
+    def handle(self, *args, **options):
+        with ExitStack() as stack:
+            try:
+                setup_test_environment(debug=False)
+                stack.callback(teardown_test_environment)
+            except RuntimeError:
+                # Already running inside the test runner
+                pass
+            if not options["use_existing_db"]:
+                old_config = setup_databases(verbosity=0, interactive=False)
+                stack.callback(teardown_databases, old_config, verbosity=0)
+            results = self.run_benchmark(options)
+
+        self.report(results)
+
+    def run_benchmark(self, options):
+        if not options["skip_seed"]:
+            seed_data(
+                rugs=options["rugs"], users=options["users"], orders=options["orders"],
+                cart_items=options["cart_items"], seed=options["seed"]
+            )
+        user = User.objects.filter(cart__isnull=False).first() or User.objects.first()
+        rug_pk = Rug.objects.values_list("pk", flat=True).first()
+        if user is None or rug_pk is None:
+            raise CommandError("No users or rugs to request; seed some data")
+        token = create_token(user)[1]
+
+        endpoints = options["endpoint"] or list(ENDPOINTS)
+        requests = []
+        for i in range(options["clients"] * options["requests"]):
+            url, params, authenticated = ENDPOINTS[endpoints[i % len(endpoints)]]
+            headers = {"Authorization": f"Token {token}"} if authenticated else {}
+            requests.append((url.format(pk=rug_pk), urlencode(params(i)), headers))
+
+        results = {}
+        for mode in options["mode"] or list(MODES):
+            cache.clear()
+            with override_settings(ROOT_URLCONF=build_urlconf(MODES[mode])), \
+                    DatabaseLatency(options["db_latency"] / 1000):
+                start = time.perf_counter()
+                if mode == "wsgi":
+                    timings = self.run_wsgi(requests, options)
+                else:
+                    timings = asyncio.run(self.run_asgi(requests, options))
+                elapsed = time.perf_counter() - start
+            durations = [duration * 1000 for duration, _ in timings]
+            results[mode] = {
+                "requests": len(timings),
+                "errors": sum(1 for _, status in timings if status >= 400),
+                "p50_ms": percentile(durations, 50),
+                "p95_ms": percentile(durations, 95),
+                "rps": len(timings) / elapsed,
+            }
+        return results
+
+    def run_wsgi(self, requests, options):
+        # Each client is a thread; it holds one of the server's workers while it sends its request,
+        # while the view runs and while it reads the response
+        handler = WSGIHandler()
+        factory = RequestFactory()
+        workers = threading.BoundedSemaphore(options["workers"])
+        delay = options["client_delay"] / 1000
+
+        def client(requests):
+            timings = []
+            for url, query, headers in requests:
+                start = time.perf_counter()
+                with workers:
+                    environ = factory.get(url, QUERY_STRING=query, **{
+                        f"HTTP_{name.upper().replace('-', '_')}": value for name, value in headers.items()
+                    }).environ
+                    time.sleep(delay)
+                    status = []
+                    response = handler(environ, lambda status_line, headers: status.append(int(status_line[:3])))
+                    for _ in response:
+                        time.sleep(delay)
+                    response.close()
+                timings.append((time.perf_counter() - start, status[0]))
+            return timings
+
+        with ThreadPoolExecutor(options["clients"]) as pool:
+            batches = pool.map(client, self.split(requests, options["clients"]))
+            return [timing for batch in batches for timing in batch]
+
+    async def run_asgi(self, requests, options):
+        # Each client is a coroutine; the slow sending and reading happen on the event loop
+        application = ASGIHandler()
+        delay = options["client_delay"] / 1000
+
+        async def request(url, query, headers):
+            status = []
+
+            async def receive():
+                await asyncio.sleep(delay)
+                return {"type": "http.request", "body": b"", "more_body": False}
+
+            async def send(message):
+                if message["type"] == "http.response.start":
+                    status.append(message["status"])
+                elif message["body"]:
+                    await asyncio.sleep(delay)
+
+            scope = {
+                "type": "http",
+                "asgi": {"version": "3.0"},
+                "http_version": "1.1",
+                "method": "GET",
+                "scheme": "http",
+                "path": url,
+                "query_string": query.encode("ascii"),
+                "headers": [(b"host", b"testserver")] + [
+                    (name.lower().encode("ascii"), value.encode("latin1")) for name, value in headers.items()
+                ],
+                "client": ("127.0.0.1", 0),
+                "server": ("testserver", 80),
+            }
+            await application(scope, receive, send)
+            return status[0]
+
+        async def client(requests):
+            timings = []
+            for url, query, headers in requests:
+                start = time.perf_counter()
+                status = await request(url, query, headers)
+                timings.append((time.perf_counter() - start, status))
+            return timings
+
+        batches = await asyncio.gather(*(client(batch) for batch in self.split(requests, options["clients"])))
+        return [timing for batch in batches for timing in batch]
+
+    def split(self, requests, clients):
+        return [requests[i::clients] for i in range(clients)]
+
+    def report(self, results):
+        header = f"{'mode':<14}{'requests':>10}{'p50 ms':>10}{'p95 ms':>10}{'rps':>10}{'errors':>8}"
+        self.stdout.write(header)
+        for mode, result in results.items():
+            self.stdout.write(
+                f"{mode:<14}{result['requests']:>10}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}"
+                f"{result['rps']:>10.1f}{result['errors']:>8}"
+            )
@@ -0,0 +1,127 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter: imports the entry point, then optionally sends it one request.
+# A marker on stderr separates the imports of the two phases in the -X importtime output
+STARTUP_SCRIPT = """
+import io, json, sys, time
+start = time.perf_counter()
+module = __import__({module!r}, fromlist=["application"])
+imported = time.perf_counter()
+result = {{"import_ms": (imported - start) * 1000}}
+if {path!r}:
+    from django.conf import settings
+    sys.stderr.write("{marker}\\n")
+    sys.stderr.flush()
+    environ = {{
+        "REQUEST_METHOD": "GET", "PATH_INFO": {path!r}, "QUERY_STRING": "", "SERVER_NAME": "localhost",
+        "SERVER_PORT": "80", "HTTP_HOST": (settings.ALLOWED_HOSTS or ["localhost"])[0].lstrip("."),
+        "wsgi.input": io.BytesIO(), "wsgi.errors": io.StringIO(), "wsgi.url_scheme": "http",
+    }}
+    statuses = []
+    response = module.application(environ, lambda status, headers: statuses.append(int(status[:3])))
+    b"".join(response)
+    result["request_ms"] = (time.perf_counter() - imported) * 1000
+    result["status"] = statuses[0]
+print(json.dumps(result))
+"""
+REQUEST_MARKER = "benchmark_startup: first request"
+
+
+def parse_importtime(output):
+    """
+    Parses `python -X importtime` output into {phase: {module: (self_us, cumulative_us)}},
+    where the phase is "startup" or "request".
+    """
+    phases = {"startup": {}, "request": {}}
+    phase = "startup"
+    for line in output.splitlines():
+        if line == REQUEST_MARKER:
+            phase = "request"
+            continue
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        phases[phase][name.strip()] = (int(self_us), int(cumulative_us))
+    return phases
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures cold start: imports the WSGI entry point in fresh interpreters, optionally sends it one "
+        "request, and reports the time spent importing each package"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to start; medians are reported")
+        parser.add_argument("--module", default=settings.WSGI_APPLICATION.rsplit(".", 1)[0],
+                            help="Entry point module exposing `application`")
+        parser.add_argument("--path", help="Also time a first GET request to this path, e.g. /api/rug")
+        parser.add_argument("--top", type=int, default=20, help="Packages or modules to list")
+        parser.add_argument("--by-module", action="store_true", help="List modules instead of top-level packages")
+        parser.add_argument("--output", help="Write the results as JSON to this file")
+
+    def handle(self, *args, **options):
+        script = STARTUP_SCRIPT.format(module=options["module"], path=options["path"], marker=REQUEST_MARKER)
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": os.environ.get("DJANGO_SETTINGS_MODULE", "server.settings")}
+
+        runs = []
+        for _ in range(options["runs"]):
+            process = subprocess.run(
+                [sys.executable, "-X", "importtime", "-c", script],
+                capture_output=True, text=True, env=env, cwd=settings.BASE_DIR
+            )
+            if process.returncode:
+                raise CommandError(f"Starting {options['module']} failed:\n{process.stderr[-2000:]}")
+            runs.append((json.loads(process.stdout.splitlines()[-1]), parse_importtime(process.stderr)))
+
+        results = {
+            "module": options["module"],
+            "runs": options["runs"],
+            "import_ms": statistics.median(result["import_ms"] for result, _ in runs),
+            "phases": {},
+        }
+        if options["path"]:
+            results["path"] = options["path"]
+            results["status"] = runs[-1][0]["status"]
+            results["request_ms"] = statistics.median(result["request_ms"] for result, _ in runs)
+        for phase in ("startup", "request"):
+            results["phases"][phase] = self.summarize([imports[phase] for _, imports in runs], options["by_module"])
+
+        self.report(results, options["top"])
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(results, output, indent=2)
+
+    def summarize(self, runs, by_module):
+        # Median self time of each package (or module) across runs, in milliseconds
+        totals = defaultdict(list)
+        for imports in runs:
+            grouped = defaultdict(int)
+            for module, (self_us, _) in imports.items():
+                grouped[module if by_module else module.split(".")[0]] += self_us
+            for name, self_us in grouped.items():
+                totals[name].append(self_us)
+        summary = {name: statistics.median(values + [0] * (len(runs) - len(values))) / 1000
+                   for name, values in totals.items()}
+        return dict(sorted(summary.items(), key=lambda item: item[1], reverse=True))
+
+    def report(self, results, top):
+        line = f"{results['module']}: import {results['import_ms']:.1f}ms"
+        if "request_ms" in results:
+            line += f", first request to {results['path']} {results['request_ms']:.1f}ms ({results['status']})"
+        self.stdout.write(f"{line} (median of {results['runs']} runs)")
+        for phase, summary in results["phases"].items():
+            if not summary:
+                continue
+            self.stdout.write(f"\nImported during {phase}: {sum(summary.values()):.1f}ms")
+            self.stdout.write(f"{'':<4}{'name':<40}{'self ms':>10}")
+            for name, milliseconds in list(summary.items())[:top]:
+                self.stdout.write(f"{'':<4}{name:<40}{milliseconds:>10.1f}")
@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from rugs_app.schema import generate_schema
+
+
+class Command(BaseCommand):
+    help = "Generates the OpenAPI schema once, for /api/schema/ to serve with PREBUILT_SCHEMA on"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--file", default=settings.SCHEMA_FILE, help="Where to write the schema")
+        parser.add_argument("--check", action="store_true",
+                            help="Fail if the file differs from the generated schema instead of writing it")
+
+    def handle(self, *args, **options):
+        schema = generate_schema()
+        if options["check"]:
+            try:
+                with open(options["file"], "rb") as schema_file:
+                    current = schema_file.read()
+            except FileNotFoundError:
+                current = None
+            if current != schema:
+                raise CommandError(f"{options['file']} is out of date; run `manage.py build_schema`")
+            self.stdout.write(f"{options['file']} is up to date")
+            return
+
+        with open(options["file"], "wb") as schema_file:
+            schema_file.write(schema)
+        self.stdout.write(f"Wrote {options['file']} ({len(schema):,} bytes)")
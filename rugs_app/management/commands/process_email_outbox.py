@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from rugs_app.outbox import process_outbox
+
+
+class Command(BaseCommand):
+    help = "Sends the emails waiting in the outbox"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, help="Recipients per batch sent over the connection")
+        parser.add_argument("--limit", type=int, help="Maximum number of jobs to take per run")
+        parser.add_argument("--loop", action="store_true", help="Keep polling for new jobs")
+        parser.add_argument("--interval", type=float, default=10, help="Seconds between polls with --loop")
+
+    def handle(self, *args, **options):
+        while True:
+            sent = process_outbox(batch_size=options["batch_size"], limit=options["limit"])
+            if options["verbosity"] > 1 or (sent and options["verbosity"]):
+                self.stdout.write(f"Sent {sent} job(s)")
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
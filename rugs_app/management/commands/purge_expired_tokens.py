@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from rugs_app.authentication import purge_expired_tokens
+
+
+class Command(BaseCommand):
+    help = "Deletes expired auth tokens"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Tokens deleted per query")
+        parser.add_argument("--loop", action="store_true", help="Keep purging on an interval")
+        parser.add_argument("--interval", type=float, default=3600, help="Seconds between purges with --loop")
+
+    def handle(self, *args, **options):
+        while True:
+            deleted = purge_expired_tokens(batch_size=options["batch_size"])
+            if options["verbosity"]:
+                self.stdout.write(f"Deleted {deleted} expired token(s)")
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from rugs_app.cart import release_expired_holds
+
+
+class Command(BaseCommand):
+    help = "Releases expired cart reservations and removes their rugs from carts"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Holds released per transaction")
+        parser.add_argument("--loop", action="store_true", help="Keep releasing on an interval")
+        parser.add_argument("--interval", type=float, default=60, help="Seconds between runs with --loop")
+
+    def handle(self, *args, **options):
+        while True:
+            released = release_expired_holds(batch_size=options["batch_size"])
+            if options["verbosity"] > 1 or (released and options["verbosity"]):
+                self.stdout.write(f"Released {released} hold(s)")
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
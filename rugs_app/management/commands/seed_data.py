@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from rugs_app.seeding import SEED_PASSWORD, seed_data
+
+
+class Command(BaseCommand):
+    help = "Generates a large, deterministic catalog of rugs, users, orders and carts for benchmarking"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rugs", type=int, default=100000)
+        parser.add_argument("--users", type=int, default=10000)
+        parser.add_argument("--orders", type=int, default=20000)
+        parser.add_argument("--cart-items", type=int, default=10000)
+        parser.add_argument("--seed", type=int, default=0, help="Same seed, same data; usernames include it, so "
+                                                                "seeding the same database twice needs another seed")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Rows per insert and transaction")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        # Each phase starts when the previous one finishes
+        phase_start = [start]
+
+        def progress(phase, done, total):
+            now = time.perf_counter()
+            elapsed = now - phase_start[0]
+            rate = f" ({done / elapsed:,.0f}/s)" if elapsed else ""
+            self.stdout.write(f"\r{phase}: {done:,}/{total:,}{rate}", ending="")
+            if done >= total:
+                self.stdout.write("")
+                phase_start[0] = now
+
+        created = seed_data(
+            rugs=options["rugs"], users=options["users"], orders=options["orders"],
+            cart_items=options["cart_items"], seed=options["seed"], batch_size=options["batch_size"],
+            progress=progress if options["verbosity"] else None
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {created['rugs']:,} rugs, {created['users']:,} users, {created['orders']:,} orders "
+            f"({created['order_rugs']:,} ordered rugs) and {created['cart_items']:,} cart entries "
+            f"in {time.perf_counter() - start:.1f}s. Users log in with the password \"{SEED_PASSWORD}\""
+        ))
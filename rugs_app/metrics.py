@@ -0,0 +1,306 @@
+import atexit
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# name: (type, help, histogram buckets)
+METRICS = {
+    "rugs_http_requests_total": (
+        "counter", "Requests handled, by URL name, method and status code", None
+    ),
+    "rugs_http_request_duration_seconds": (
+        "histogram", "Request latency by URL name", DURATION_BUCKETS
+    ),
+    "rugs_db_queries_per_request": (
+        "histogram", "Database queries per request by URL name", QUERY_BUCKETS
+    ),
+    "rugs_checkout_total": (
+        "counter", "Checkouts by result", None
+    ),
+    "rugs_db_connection_wait_seconds": (
+        "histogram", "Time to get a database connection: a pool checkout, or connecting without a pool",
+        WAIT_BUCKETS
+    ),
+    "rugs_db_pool_connections": (
+        "gauge", "Connections of the pool by state (in_use or idle), summed over running processes", None
+    ),
+    "rugs_db_pool_overflow_total": (
+        "counter", "Checkouts that opened a connection beyond POOL_SIZE", None
+    ),
+    "rugs_db_pool_timeouts_total": (
+        "counter", "Checkouts that gave up after the pool's TIMEOUT", None
+    ),
+    "rugs_db_health_check_failures_total": (
+        "counter", "Persistent connections found unusable before a request and replaced", None
+    ),
+}
+
+
+def _labels_key(labels):
+    return tuple(sorted((str(name), str(value)) for name, value in labels.items()))
+
+
+def _add_snapshot(counters, histograms, snapshot):
+    # Adds a snapshot's counters and histograms to the given ones, in place
+    for name, labels, value in snapshot["counters"]:
+        key = (name, tuple(map(tuple, labels)))
+        counters[key] = counters.get(key, 0) + value
+    for name, labels, histogram in snapshot["histograms"]:
+        key = (name, tuple(map(tuple, labels)))
+        merged = histograms.setdefault(key, {"buckets": [0] * len(histogram["buckets"]), "sum": 0, "count": 0})
+        merged["buckets"] = [a + b for a, b in zip(merged["buckets"], histogram["buckets"])]
+        merged["sum"] += histogram["sum"]
+        merged["count"] += histogram["count"]
+
+
+def _process_alive(pid):
+    if os.name != "posix":
+        # os.kill can't probe a process on Windows (it terminates it), so every file counts as live there
+        return True
+    try:
+        # Signal 0 only checks that the process exists
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _file_pid(path):
+    # metrics-<pid>-<suffix>.json, see MetricsRegistry.reset
+    try:
+        return int(path.stem.split("-")[1])
+    except (IndexError, ValueError):
+        return None
+
+
+class MetricsRegistry:
+    """
+    Counters, gauges and histograms for the current process. With `METRICS_DIR` set,
+    each process also writes its values to its own file there (at most once
+    per `METRICS_FLUSH_INTERVAL` seconds), and `collect` adds up the files of
+    every process, so any worker can serve the totals.
+
+    The files of processes that have exited are taken over by the process
+    collecting: it adds their counters and histograms to its own and deletes
+    them, so totals survive worker restarts without the directory growing.
+    Their gauges are dropped, as the connections they counted are gone.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.pid = os.getpid()
+        # Unique per process start, so a new process never overwrites an old one's totals
+        self.process_id = f"{self.pid}-{uuid.uuid4().hex[:8]}"
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.last_flush = 0
+
+    def _check_fork(self):
+        # A forked worker starts over rather than re-reporting its parent's values
+        if os.getpid() != self.pid:
+            self.reset()
+
+    def inc(self, name, labels=None, value=1):
+        key = (name, _labels_key(labels or {}))
+        with self.lock:
+            self._check_fork()
+            self.counters[key] = self.counters.get(key, 0) + value
+        self.flush()
+
+    def set(self, name, value, labels=None):
+        key = (name, _labels_key(labels or {}))
+        with self.lock:
+            self._check_fork()
+            self.gauges[key] = value
+        self.flush()
+
+    def observe(self, name, value, labels=None):
+        buckets = METRICS[name][2]
+        key = (name, _labels_key(labels or {}))
+        with self.lock:
+            self._check_fork()
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {"buckets": [0] * (len(buckets) + 1), "sum": 0, "count": 0}
+            index = next((i for i, bound in enumerate(buckets) if value <= bound), len(buckets))
+            histogram["buckets"][index] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+        self.flush()
+
+    def merge(self, snapshot):
+        # Adds another process's counters and histograms to this one's
+        with self.lock:
+            self._check_fork()
+            _add_snapshot(self.counters, self.histograms, snapshot)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "counters": [[name, labels, value] for (name, labels), value in self.counters.items()],
+                "gauges": [[name, labels, value] for (name, labels), value in self.gauges.items()],
+                "histograms": [
+                    [name, labels, dict(histogram, buckets=list(histogram["buckets"]))]
+                    for (name, labels), histogram in self.histograms.items()
+                ],
+            }
+
+    def flush(self, force=False):
+        directory = getattr(settings, "METRICS_DIR", None)
+        if not directory:
+            return
+        now = time.monotonic()
+        if not force and now - self.last_flush < getattr(settings, "METRICS_FLUSH_INTERVAL", 1):
+            return
+        self.last_flush = now
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"metrics-{self.process_id}.json"
+        temporary = path.with_suffix(f".{threading.get_ident()}.tmp")
+        temporary.write_text(json.dumps(self.snapshot()))
+        # Readers only ever see a complete file
+        os.replace(temporary, path)
+
+    def take_over_exited(self, directory):
+        """
+        Merges the files of processes that have exited into this process's
+        values, to be written with its next flush, and deletes them.
+        """
+        for path in directory.glob("metrics-*.json"):
+            pid = _file_pid(path)
+            if pid is None or pid == self.pid or _process_alive(pid):
+                continue
+            # Renaming claims the file, so of two processes collecting at once only one takes it over
+            claimed = path.with_suffix(f".{self.process_id}.claimed")
+            try:
+                os.replace(path, claimed)
+            except OSError:
+                continue
+            try:
+                self.merge(json.loads(claimed.read_text()))
+            except (OSError, ValueError):
+                pass
+            claimed.unlink(missing_ok=True)
+
+    def collect(self):
+        """
+        Returns the counters, gauges and histograms of every process, merged.
+        Gauges only come from processes that are still running.
+        """
+        directory = getattr(settings, "METRICS_DIR", None)
+        if not directory:
+            snapshots = [self.snapshot()]
+        else:
+            directory = Path(directory)
+            if directory.is_dir():
+                self.take_over_exited(directory)
+            self.flush(force=True)
+            snapshots = []
+            for path in directory.glob("metrics-*.json"):
+                try:
+                    snapshots.append(json.loads(path.read_text()))
+                except (OSError, ValueError):
+                    continue
+
+        counters, gauges, histograms = {}, {}, {}
+        for snapshot in snapshots:
+            _add_snapshot(counters, histograms, snapshot)
+            # Each process reports its own connections, so they add up
+            for name, labels, value in snapshot.get("gauges", []):
+                key = (name, tuple(map(tuple, labels)))
+                gauges[key] = gauges.get(key, 0) + value
+        return counters, gauges, histograms
+
+
+registry = MetricsRegistry()
+atexit.register(lambda: registry.flush(force=True))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (name, value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_metrics():
+    """The merged metrics in the Prometheus text exposition format."""
+    counters, gauges, histograms = registry.collect()
+    lines = []
+    for name, (metric_type, description, buckets) in METRICS.items():
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        if metric_type in ("counter", "gauge"):
+            values = counters if metric_type == "counter" else gauges
+            for (metric, labels), value in sorted(values.items()):
+                if metric == name:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+            continue
+        for (metric, labels), histogram in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets + (math.inf,), histogram["buckets"]):
+                cumulative += count
+                bucket_labels = labels + (("le", _format_value(float(bound))),)
+                lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(histogram['sum'])}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def observe_request(view, method, status, duration, queries):
+    labels = {"view": view or "unmatched"}
+    registry.inc("rugs_http_requests_total", dict(labels, method=method, status=status))
+    registry.observe("rugs_http_request_duration_seconds", duration, labels)
+    registry.observe("rugs_db_queries_per_request", queries, labels)
+
+
+def record_checkout(result):
+    registry.inc("rugs_checkout_total", {"result": result})
+
+
+def observe_connection_wait(database, duration):
+    registry.observe("rugs_db_connection_wait_seconds", duration, {"database": database})
+
+
+def record_pool_state(database, in_use, idle):
+    registry.set("rugs_db_pool_connections", in_use, {"database": database, "state": "in_use"})
+    registry.set("rugs_db_pool_connections", idle, {"database": database, "state": "idle"})
+
+
+def record_pool_overflow(database):
+    registry.inc("rugs_db_pool_overflow_total", {"database": database})
+
+
+def record_pool_timeout(database):
+    registry.inc("rugs_db_pool_timeouts_total", {"database": database})
+
+
+def record_health_check_failure(database):
+    registry.inc("rugs_db_health_check_failures_total", {"database": database})
@@ -0,0 +1,202 @@
+import asyncio
+import json
+import logging
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework.permissions import SAFE_METHODS
+
+from . import replicas
+from .metrics import observe_request
+
+logger = logging.getLogger("rugs_app.performance")
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = []
+        # None until a serializer's data is produced (see record_serialization)
+        self.serialize_time = None
+        self.render_start = None
+        self.render_end = None
+
+    def record_query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - start))
+
+    @property
+    def db_time(self):
+        return sum(duration for _, duration in self.queries)
+
+    @property
+    def render_time(self):
+        if self.render_start is None or self.render_end is None:
+            return 0
+        return self.render_end - self.render_start
+
+
+# The metrics of the request being handled, for code that has no request at hand.
+# Views may run in a copy of this context (sync_to_async), so they change the object.
+_request_metrics = ContextVar("request_metrics", default=None)
+
+
+def record_serialization(duration):
+    """
+    Adds time spent turning objects into a serializer's `data`, including the
+    queries that makes, to the current request's metrics.
+    """
+    metrics = _request_metrics.get()
+    if metrics is not None:
+        metrics.serialize_time = (metrics.serialize_time or 0) + duration
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
+
+
+class PerformanceMiddleware:
+    """
+    Measures each request's total time, database queries and time,
+    serialization time (see TimedSerializerMixin), response rendering time
+    and response size, and reports them in a `Server-Timing` header and to
+    the metrics registry (see rugs_app.metrics). Requests slower than
+    `SLOW_REQUEST_THRESHOLD` milliseconds are logged to `rugs_app.performance`
+    with their SQL.
+
+    Enabled by `PERFORMANCE_METRICS`; otherwise Django drops it from the
+    middleware chain at startup.
+    """
+    # Most statements attached to a slow request's log line, slowest first
+    max_logged_queries = 20
+
+    def __init__(self, get_response):
+        if not getattr(settings, "PERFORMANCE_METRICS", False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.slow_request_threshold = getattr(settings, "SLOW_REQUEST_THRESHOLD", 500)
+
+    def __call__(self, request):
+        metrics = request.performance_metrics = RequestMetrics()
+        token = _request_metrics.set(metrics)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics.record_query))
+                response = self.get_response(request)
+        finally:
+            _request_metrics.reset(token)
+        total_time = time.perf_counter() - metrics.start
+
+        view = getattr(request.resolver_match, "url_name", None)
+        observe_request(view, request.method, response.status_code, total_time, len(metrics.queries))
+
+        size = None if response.streaming else len(response.content)
+        response["Server-Timing"] = self.get_server_timing(metrics, total_time, size)
+        if _ms(total_time) >= self.slow_request_threshold:
+            self.log_slow_request(request, response, metrics, total_time, size)
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered to bytes after the view returns; time it from here to the end of rendering
+        metrics = request.performance_metrics
+        metrics.render_start = time.perf_counter()
+
+        def rendered(response):
+            metrics.render_end = time.perf_counter()
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    def get_server_timing(self, metrics, total_time, size):
+        timings = [
+            f'total;dur={_ms(total_time)}',
+            f'db;dur={_ms(metrics.db_time)};desc="{len(metrics.queries)} queries"',
+        ]
+        if metrics.serialize_time is not None:
+            timings.append(f'serialize;dur={_ms(metrics.serialize_time)};desc="Serialization"')
+        if metrics.render_start is not None:
+            timings.append(f'render;dur={_ms(metrics.render_time)};desc="Rendering"')
+        if size is not None:
+            timings.append(f'size;desc="{size} bytes"')
+        return ", ".join(timings)
+
+    def log_slow_request(self, request, response, metrics, total_time, size):
+        slowest = sorted(metrics.queries, key=lambda query: query[1], reverse=True)[:self.max_logged_queries]
+        record = {
+            "event": "slow_request",
+            "method": request.method,
+            "path": request.get_full_path(),
+            "view": getattr(request.resolver_match, "url_name", None),
+            "status": response.status_code,
+            "duration_ms": _ms(total_time),
+            "db_ms": _ms(metrics.db_time),
+            "serialize_ms": _ms(metrics.serialize_time or 0),
+            "render_ms": _ms(metrics.render_time),
+            "queries": len(metrics.queries),
+            "size": size,
+            "sql": [{"sql": sql, "duration_ms": _ms(duration)} for sql, duration in slowest],
+        }
+        logger.warning(json.dumps(record), extra={"performance": record})
+
+
+class ReplicaMiddleware:
+    """
+    Sets up the routing state that lets views with ReplicaReadMixin read from
+    a replica (see rugs_app.replicas), and sends a user's reads to the
+    primary for REPLICA_STICKY_SECONDS after they make a write.
+
+    Runs in whichever mode the handler does, so under ASGI it doesn't move
+    requests to a thread. Used when DATABASE_REPLICAS is set; otherwise
+    Django drops it from the middleware chain at startup.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not replicas.get_replicas():
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Marks this instance as a coroutine function for Django's handler, like MiddlewareMixin does
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        token = replicas.begin_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            replicas.end_request(token)
+        if self.made_write(request, response):
+            self.stick_to_primary(request)
+        return response
+
+    async def __acall__(self, request):
+        token = replicas.begin_request()
+        try:
+            response = await self.get_response(request)
+        finally:
+            replicas.end_request(token)
+        if self.made_write(request, response):
+            # request.user may be a lazy session lookup, which can't run on the event loop
+            await sync_to_async(self.stick_to_primary)(request)
+        return response
+
+    def made_write(self, request, response):
+        return request.method not in SAFE_METHODS and response.status_code < 400
+
+    def stick_to_primary(self, request):
+        # Views set request.user once they have authenticated it
+        user = getattr(request, "user", None)
+        if user is not None and user.is_authenticated:
+            replicas.stick_to_primary(user.pk)
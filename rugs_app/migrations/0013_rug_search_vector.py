@@ -0,0 +1,77 @@
+# Generated by Django 4.0.6 on 2026-10-18 06:38
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+FTS_TABLE = "rugs_app_rug_fts"
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == "postgresql":
+        schema_editor.execute(
+            "UPDATE rugs_app_rug SET search_vector = "
+            "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(description, '')), 'B')"
+        )
+        schema_editor.execute(
+            "CREATE INDEX rugs_app_rug_search_vector_gin ON rugs_app_rug USING gin (search_vector)"
+        )
+    elif connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA compile_options")
+            if "ENABLE_FTS5" not in {row[0] for row in cursor.fetchall()}:
+                # Searching falls back to unindexed icontains matching
+                return
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+            "title, description, content='rugs_app_rug', content_rowid='id', "
+            "tokenize='unicode61 remove_diacritics 2')"
+        )
+        # Weight title matches above description matches
+        schema_editor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES('rank', 'bm25(10.0, 1.0)')")
+        schema_editor.execute(
+            f"CREATE TRIGGER rugs_app_rug_fts_insert AFTER INSERT ON rugs_app_rug BEGIN "
+            f"INSERT INTO {FTS_TABLE}(rowid, title, description) VALUES (new.id, new.title, new.description); "
+            f"END"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER rugs_app_rug_fts_delete AFTER DELETE ON rugs_app_rug BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description) "
+            f"VALUES ('delete', old.id, old.title, old.description); "
+            f"END"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER rugs_app_rug_fts_update AFTER UPDATE OF title, description ON rugs_app_rug BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description) "
+            f"VALUES ('delete', old.id, old.title, old.description); "
+            f"INSERT INTO {FTS_TABLE}(rowid, title, description) VALUES (new.id, new.title, new.description); "
+            f"END"
+        )
+        schema_editor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES('rebuild')")
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS rugs_app_rug_search_vector_gin")
+    elif connection.vendor == "sqlite":
+        for trigger in ("insert", "delete", "update"):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS rugs_app_rug_fts_{trigger}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rugs_app', '0012_alter_order_rug_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rug',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.0.6 on 2026-10-18 06:42
+
+from django.db import migrations, models
+
+import rugs_app.operations
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('rugs_app', '0013_rug_search_vector'),
+    ]
+
+    operations = [
+        rugs_app.operations.AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(fields=['user', '-date_placed'], name='order_user_placed_idx'),
+        ),
+        rugs_app.operations.AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(fields=['status', '-date_placed'], name='order_status_placed_idx'),
+        ),
+        rugs_app.operations.AddIndexConcurrently(
+            model_name='rug',
+            index=models.Index(fields=['-date_created', '-id'], name='rug_created_idx'),
+        ),
+        rugs_app.operations.AddIndexConcurrently(
+            model_name='rug',
+            index=models.Index(fields=['status', '-date_created', '-id'], name='rug_status_created_idx'),
+        ),
+        rugs_app.operations.AddIndexConcurrently(
+            model_name='rug',
+            index=models.Index(fields=['price'], name='rug_price_idx'),
+        ),
+        rugs_app.operations.AddIndexConcurrently(
+            model_name='rug',
+            index=models.Index(condition=models.Q(('status', 'av')), fields=['-date_created', '-id'], name='rug_available_created_idx'),
+        ),
+    ]
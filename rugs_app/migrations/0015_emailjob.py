@@ -0,0 +1,37 @@
+# Generated by Django 4.0.6 on 2026-10-18 06:48
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rugs_app', '0014_catalog_and_order_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_created', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('date_sent', models.DateTimeField(null=True)),
+                ('kind', models.CharField(choices=[('nr', 'New rug')], max_length=2)),
+                ('subject', models.CharField(max_length=256)),
+                ('body', models.TextField()),
+                ('status', models.CharField(choices=[('pe', 'Pending'), ('se', 'Sent'), ('fa', 'Failed')], default='pe', max_length=2)),
+                ('attempts', models.IntegerField(default=0)),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_recipient_id', models.BigIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+            ],
+            options={
+                'ordering': ['available_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='emailjob',
+            index=models.Index(fields=['status', 'available_at'], name='emailjob_due_idx'),
+        ),
+    ]
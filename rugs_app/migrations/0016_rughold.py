@@ -0,0 +1,28 @@
+# Generated by Django 4.0.6 on 2026-10-18 06:55
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rugs_app', '0015_emailjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RugHold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('expires_at', models.DateTimeField()),
+                ('rug', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='hold', to='rugs_app.rug')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holds', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='rughold',
+            index=models.Index(fields=['expires_at'], name='rughold_expires_idx'),
+        ),
+    ]
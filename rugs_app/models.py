@@ -1,13 +1,27 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, router
 from django.utils import timezone
 from django.utils.translation import gettext_lazy
 
+from .search import get_search_backend
+
 
 class Rug(models.Model):
 
     class Meta:
         ordering = ["-date_created"]
+        # The trailing id matches the tie-breaker used by cursor pagination
+        indexes = [
+            models.Index(fields=["-date_created", "-id"], name="rug_created_idx"),
+            models.Index(fields=["status", "-date_created", "-id"], name="rug_status_created_idx"),
+            models.Index(fields=["price"], name="rug_price_idx"),
+            models.Index(
+                fields=["-date_created", "-id"],
+                name="rug_available_created_idx",
+                condition=models.Q(status="av")
+            ),
+        ]
 
     class RugStatus(models.TextChoices):
         AVAILABLE = 'av', gettext_lazy('Available'),
@@ -23,6 +37,15 @@ class Rug(models.Model):
         choices=RugStatus.choices,
         default=RugStatus.AVAILABLE
     )
+    # Full-text index of title and description, only populated on PostgreSQL (see rugs_app.search)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or {"title", "description"} & set(update_fields):
+            using = kwargs.get("using") or router.db_for_write(Rug, instance=self)
+            get_search_backend(using).update_index(self, using)
 
 
 class User(AbstractUser):
@@ -35,6 +58,10 @@ class Order(models.Model):
 
     class Meta:
         ordering = ["-date_placed"]
+        indexes = [
+            models.Index(fields=["user", "-date_placed"], name="order_user_placed_idx"),
+            models.Index(fields=["status", "-date_placed"], name="order_status_placed_idx"),
+        ]
 
     class OrderStatus(models.TextChoices):
         PENDING = 'pe', gettext_lazy('Pending'),
@@ -54,3 +81,57 @@ class Order(models.Model):
         choices=OrderStatus.choices,
         default=OrderStatus.PENDING
     )
+
+
+class EmailJob(models.Model):
+    """
+    An announcement waiting in the outbox, sent by `manage.py process_email_outbox`.
+    Recipients are looked up when the job runs, in primary key order, and
+    `last_recipient_id` records how far sending got so a retry resumes there.
+    """
+
+    class Meta:
+        ordering = ["available_at"]
+        indexes = [
+            models.Index(fields=["status", "available_at"], name="emailjob_due_idx"),
+        ]
+
+    class JobKind(models.TextChoices):
+        NEW_RUG = 'nr', gettext_lazy('New rug')
+
+    class JobStatus(models.TextChoices):
+        PENDING = 'pe', gettext_lazy('Pending')
+        SENT = 'se', gettext_lazy('Sent')
+        FAILED = 'fa', gettext_lazy('Failed')
+
+    date_created = models.DateTimeField(default=timezone.now, editable=False)
+    date_sent = models.DateTimeField(null=True)
+    kind = models.CharField(max_length=2, choices=JobKind.choices)
+    subject = models.CharField(max_length=256)
+    body = models.TextField()
+    status = models.CharField(
+        max_length=2,
+        choices=JobStatus.choices,
+        default=JobStatus.PENDING
+    )
+    attempts = models.IntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    last_recipient_id = models.BigIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+
+class RugHold(models.Model):
+    """
+    Reserves a rug for the user whose cart it's in until `expires_at`. Only used
+    when `CART_RESERVATION_TTL` is set; expired holds are released by
+    `manage.py release_expired_holds`.
+    """
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["expires_at"], name="rughold_expires_idx"),
+        ]
+
+    rug = models.OneToOneField(Rug, on_delete=models.CASCADE, related_name="hold")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="holds")
+    expires_at = models.DateTimeField()
@@ -0,0 +1,22 @@
+from django.contrib.postgres import operations
+from django.db import migrations
+
+
+class AddIndexConcurrently(operations.AddIndexConcurrently):
+    """
+    Builds the index with CREATE INDEX CONCURRENTLY on PostgreSQL so the table
+    stays writable, and as a plain AddIndex on other databases (SQLite in
+    development mode). Migrations using it must set `atomic = False`.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+        else:
+            migrations.AddIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+        else:
+            migrations.AddIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
@@ -0,0 +1,103 @@
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+
+from .models import EmailJob, User
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def enqueue_new_rug_announcement(rug):
+    return EmailJob.objects.create(
+        kind=EmailJob.JobKind.NEW_RUG,
+        subject="New rug available!",
+        body=f"There is a new rug, \"{rug.title}\", available to purchase! To see this rug, visit "
+             f"{settings.CSRF_TRUSTED_ORIGINS[0]}/rug/{rug.id}",
+    )
+
+
+def get_recipients(job):
+    users = User.objects.exclude(email="")
+    if job.kind == EmailJob.JobKind.NEW_RUG:
+        users = users.filter(receive_emails_new_rugs=True)
+    return users.filter(pk__gt=job.last_recipient_id).order_by("pk").values_list("pk", "email")
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def send_job(job, connection, batch_size=None):
+    batch_size = batch_size or _setting("EMAIL_OUTBOX_BATCH_SIZE", 100)
+    # The recipients are streamed from the database in chunks rather than loaded at once
+    recipients = get_recipients(job).iterator(chunk_size=batch_size)
+    for batch in _batches(recipients, batch_size):
+        connection.send_messages([
+            EmailMessage(job.subject, job.body, settings.DEFAULT_FROM_EMAIL, [email], connection=connection)
+            for _, email in batch
+        ])
+        # Everyone up to here has their email, so a retry must not send it again
+        job.last_recipient_id = batch[-1][0]
+        EmailJob.objects.filter(pk=job.pk).update(last_recipient_id=job.last_recipient_id)
+
+
+def claim_job(job, now):
+    # Push the job back for the length of a lease; only one worker can win the update
+    lease = now + timedelta(seconds=_setting("EMAIL_OUTBOX_LEASE", 600))
+    claimed = EmailJob.objects.filter(
+        pk=job.pk, status=EmailJob.JobStatus.PENDING, available_at=job.available_at
+    ).update(available_at=lease)
+    job.available_at = lease
+    return claimed == 1
+
+
+def get_due_jobs(now, limit=None):
+    jobs = EmailJob.objects.filter(status=EmailJob.JobStatus.PENDING, available_at__lte=now).order_by("available_at")
+    return jobs[:limit] if limit else jobs
+
+
+def process_outbox(batch_size=None, limit=None):
+    """
+    Sends every due job over one reused connection and returns the number of
+    jobs sent. A failing job is retried later with exponential backoff, until
+    it runs out of attempts.
+    """
+    max_attempts = _setting("EMAIL_OUTBOX_MAX_ATTEMPTS", 5)
+    retry_delay = _setting("EMAIL_OUTBOX_RETRY_DELAY", 60)
+    sent = 0
+    now = timezone.now()
+    jobs = [job for job in get_due_jobs(now, limit) if claim_job(job, now)]
+    if not jobs:
+        return sent
+
+    connection = get_connection(fail_silently=False)
+    try:
+        for job in jobs:
+            try:
+                connection.open()
+                send_job(job, connection, batch_size)
+            except Exception as error:
+                job.attempts += 1
+                job.last_error = repr(error)
+                if job.attempts >= max_attempts:
+                    job.status = EmailJob.JobStatus.FAILED
+                else:
+                    job.available_at = timezone.now() + timedelta(seconds=retry_delay * 2 ** (job.attempts - 1))
+                job.save(update_fields=["attempts", "last_error", "status", "available_at"])
+                # Start over with a fresh connection for the next job
+                connection.close()
+            else:
+                job.status = EmailJob.JobStatus.SENT
+                job.date_sent = timezone.now()
+                job.save(update_fields=["status", "date_sent"])
+                sent += 1
+    finally:
+        connection.close()
+    return sent
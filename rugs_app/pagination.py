@@ -0,0 +1,240 @@
+import base64
+import binascii
+import json
+
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def _reverse_ordering(ordering):
+    return [field[1:] if field.startswith("-") else "-" + field for field in ordering]
+
+
+def _encode_value(value):
+    # Keep full precision for timestamps (DjangoJSONEncoder drops microseconds)
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if isinstance(value, (int, str)):
+        return value
+    return str(value)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Pages through a queryset by seeking past the last row seen instead of
+    counting and offsetting, so every page costs the same regardless of depth.
+
+    The position is made of every ordering field plus the primary key as a
+    tie-breaker, and is handed to the client as an opaque cursor.
+    """
+    cursor_query_param = "cursor"
+    page_size = api_settings.PAGE_SIZE
+    invalid_cursor_message = "Invalid cursor"
+
+    # Fields that may be used to build a position; anything else (e.g. a search
+    # rank annotation) falls back to the default ordering
+    ordering_fields = ("date_created", "title", "price", "id", "pk")
+    default_ordering = ("-date_created",)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.get_page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        return self.set_page([instance async for instance in self.get_page_queryset(queryset, request)])
+
+    def get_page_queryset(self, queryset, request):
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(queryset)
+
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor["reverse"]
+        ordering = _reverse_ordering(self.ordering) if reverse else self.ordering
+
+        queryset = queryset.order_by(*ordering)
+        if self.cursor is not None:
+            queryset = queryset.filter(self.get_position_filter(ordering, self.cursor["position"]))
+
+        # Fetch one extra row to find out whether there is a following page
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, results):
+        cursor = self.cursor
+        reverse = cursor is not None and cursor["reverse"]
+        self.page = results[:self.page_size]
+        has_following = len(results) > self.page_size
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = True
+            self.has_previous = has_following
+        else:
+            self.has_next = has_following
+            self.has_previous = cursor is not None
+        return self.page
+
+    def get_ordering(self, queryset):
+        ordering = list(queryset.query.order_by or queryset.model._meta.ordering or [])
+        names = [field.lstrip("-") for field in ordering if isinstance(field, str)]
+        if not names or len(names) != len(ordering) or any(name not in self.ordering_fields for name in names):
+            ordering = list(self.default_ordering)
+            names = [field.lstrip("-") for field in ordering]
+
+        # The primary key makes every position unique
+        if "id" not in names and "pk" not in names:
+            ordering.append("-id" if ordering[0].startswith("-") else "id")
+        return ordering
+
+    def get_position_filter(self, ordering, position):
+        # (a, b, id) > (x, y, z) expanded into a chain of field comparisons
+        position_filter = Q()
+        equal_so_far = Q()
+        for field, value in zip(ordering, position):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            position_filter |= equal_so_far & Q(**{f"{name}__{lookup}": value})
+            equal_so_far &= Q(**{name: value})
+        return position_filter
+
+    def get_position(self, instance):
+        return [_encode_value(getattr(instance, field.lstrip("-"))) for field in self.ordering]
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode("ascii")))
+            cursor = {
+                "ordering": list(cursor["o"]),
+                "position": list(cursor["p"]),
+                "reverse": bool(cursor["r"]),
+            }
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+
+        # A cursor is only meaningful for the ordering it was created with
+        if cursor["ordering"] != self.ordering or len(cursor["position"]) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def encode_cursor(self, position, reverse):
+        payload = json.dumps({"o": self.ordering, "p": position, "r": reverse}, separators=(",", ":"))
+        encoded = base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.get_position(self.page[-1]), reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.get_position(self.page[0]), reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [{
+            "name": self.cursor_query_param,
+            "required": False,
+            "in": "query",
+            "description": "The pagination cursor value.",
+            "schema": {"type": "string"},
+        }]
+
+
+class AsyncPageNumberPagination(PageNumberPagination):
+    """
+    PageNumberPagination that async views can page with too (see
+    rugs_app.async_views), counting and fetching the page with the async ORM.
+    """
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        # Paginator.count is a cached property, so counting here saves it the query
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+        self.page.object_list = [instance async for instance in self.page.object_list]
+
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        self.request = request
+        return list(self.page)
+
+
+class CatalogPagination(AsyncPageNumberPagination):
+    """
+    Page number pagination by default; `?pagination=cursor` (or any request
+    carrying a cursor) switches to keyset pagination, which skips the count
+    query and stays fast on deep pages.
+    """
+    mode_query_param = "pagination"
+    cursor_pagination_class = KeysetPagination
+    cursor = None
+
+    def use_cursor(self, request):
+        return (
+            request.query_params.get(self.mode_query_param) == "cursor"
+            or self.cursor_pagination_class.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_cursor(request):
+            self.cursor = self.cursor_pagination_class()
+            self.cursor.page_size = self.get_page_size(request)
+            return self.cursor.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        if self.use_cursor(request):
+            self.cursor = self.cursor_pagination_class()
+            self.cursor.page_size = self.get_page_size(request)
+            return await self.cursor.apaginate_queryset(queryset, request, view)
+        return await super().apaginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor is not None:
+            return self.cursor.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_schema_operation_parameters(self, view):
+        return super().get_schema_operation_parameters(view) + [{
+            "name": self.mode_query_param,
+            "required": False,
+            "in": "query",
+            "description": "Set to \"cursor\" to page with opaque cursors instead of page numbers.",
+            "schema": {"type": "string", "enum": ["page", "cursor"]},
+        }] + self.cursor_pagination_class().get_schema_operation_parameters(view)
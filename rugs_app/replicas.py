@@ -0,0 +1,165 @@
+import itertools
+import logging
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from rest_framework.permissions import SAFE_METHODS
+
+logger = logging.getLogger("rugs_app.replicas")
+
+# Apps whose reads always go to the primary: a token from a login has to work
+# on the next request, before it has reached the replicas
+PRIMARY_APPS = ("knox",)
+
+
+class ReplicaRead:
+    """
+    Per-request routing state. ReplicaMiddleware creates one for every request
+    and ReplicaReadMixin enables it; the replica is only picked (and connected
+    to) by the first query that needs it.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.alias = None
+
+
+_replica_read = ContextVar("replica_read", default=None)
+
+# Spreads requests across the replicas
+_next_replica = itertools.count()
+# Replica alias -> time.monotonic() before which it isn't tried again
+_unavailable = {}
+
+
+def get_replicas():
+    return getattr(settings, "DATABASE_REPLICAS", [])
+
+
+def get_replica():
+    """
+    Returns the alias of a replica that accepts connections, or None when none
+    does. A replica that fails to connect is skipped for REPLICA_RETRY_SECONDS.
+    """
+    replicas = get_replicas()
+    start = next(_next_replica)
+    for i in range(len(replicas)):
+        alias = replicas[(start + i) % len(replicas)]
+        if _unavailable.get(alias, 0) > time.monotonic():
+            continue
+        try:
+            connections[alias].ensure_connection()
+        except DatabaseError:
+            logger.warning("Replica %s is unavailable; reading from the primary", alias, exc_info=True)
+            _unavailable[alias] = time.monotonic() + getattr(settings, "REPLICA_RETRY_SECONDS", 30)
+            continue
+        _unavailable.pop(alias, None)
+        return alias
+    return None
+
+
+def begin_request():
+    # Views may run in a copy of this context (sync_to_async), so they change this object rather than
+    # setting the variable
+    return _replica_read.set(ReplicaRead())
+
+
+def end_request(token):
+    _replica_read.reset(token)
+
+
+def read_from_replica():
+    state = _replica_read.get()
+    if state is not None:
+        state.enabled = True
+
+
+def read_from_primary():
+    """
+    Sends the rest of the current request's reads to the primary.
+    """
+    state = _replica_read.get()
+    if state is not None:
+        state.enabled = False
+
+
+def changed_recently(last_modified):
+    # A replica may not have caught up with changes made within the window
+    return time.time() - last_modified < getattr(settings, "REPLICA_STICKY_SECONDS", 5)
+
+
+def _sticky_key(user_pk):
+    return f"rugs:replica:sticky:{user_pk}"
+
+
+def stick_to_primary(user_pk):
+    """
+    Sends the user's reads to the primary for the next
+    REPLICA_STICKY_SECONDS, so they see their own writes from any token.
+    """
+    timeout = getattr(settings, "REPLICA_STICKY_SECONDS", 5)
+    if timeout > 0:
+        cache.set(_sticky_key(user_pk), True, timeout)
+
+
+def is_sticky(user_pk):
+    return bool(cache.get(_sticky_key(user_pk)))
+
+
+class ReplicaReadMixin:
+    """
+    Lets a view's GET, HEAD and OPTIONS requests read from a replica, unless
+    the user made a write within the last REPLICA_STICKY_SECONDS. Enabled
+    after authentication, so the token and its user are always read from
+    the primary.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.can_read_from_replica(request):
+            read_from_replica()
+
+    async def ainitial(self, request, *args, **kwargs):
+        await super().ainitial(request, *args, **kwargs)
+        if await sync_to_async(self.can_read_from_replica)(request):
+            read_from_replica()
+
+    def can_read_from_replica(self, request):
+        if request.method not in SAFE_METHODS:
+            return False
+        return not request.user.is_authenticated or not is_sticky(request.user.pk)
+
+
+class ReplicaRouter:
+    """
+    Routes reads to a replica while the current request allows it (see
+    ReplicaMiddleware), and everything else to the primary. The replicas are
+    copies of the primary, so nothing is migrated on them.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _replica_read.get()
+        if state is None or not state.enabled or model._meta.app_label in PRIMARY_APPS:
+            return None
+        if state.alias is None:
+            state.alias = get_replica() or DEFAULT_DB_ALIAS
+        return state.alias
+
+    def db_for_write(self, model, **hints):
+        # Even for instances that were read from a replica
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in get_replicas():
+            return False
+        return None
@@ -0,0 +1,91 @@
+import gzip
+import hashlib
+import json
+import re
+from functools import lru_cache
+
+import yaml
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
+from django.views import View
+from drf_spectacular.renderers import OpenApiYamlRenderer
+from drf_spectacular.settings import spectacular_settings
+
+accepts_gzip = re.compile(r"\bgzip\b")
+
+# Content types SpectacularAPIView serves each format with
+CONTENT_TYPES = {
+    "yaml": "application/vnd.oai.openapi; charset=utf-8",
+    "json": "application/vnd.oai.openapi+json; charset=utf-8",
+}
+
+
+def generate_schema():
+    """
+    Generates the schema the way `manage.py spectacular` does, as YAML.
+    """
+    generator = spectacular_settings.DEFAULT_GENERATOR_CLASS()
+    schema = generator.get_schema(request=None, public=True)
+    return OpenApiYamlRenderer().render(schema, renderer_context={})
+
+
+class PrebuiltSchema:
+    """
+    A schema file from `manage.py build_schema`, in YAML and JSON, each with
+    a content hash ETag and compressed once up front.
+    """
+
+    def __init__(self, content):
+        self.variants = {
+            "yaml": content,
+            "json": json.dumps(yaml.safe_load(content), indent=2).encode("utf-8"),
+        }
+        self.etags = {}
+        self.compressed = {}
+        for schema_format, body in self.variants.items():
+            digest = hashlib.sha256(body).hexdigest()
+            self.etags[schema_format, False] = quote_etag(digest)
+            self.etags[schema_format, True] = quote_etag(f"{digest}-gzip")
+            # No timestamp, so the compressed bytes only change with the content
+            self.compressed[schema_format] = gzip.compress(body, mtime=0)
+
+    def get(self, schema_format, compressed):
+        body = self.compressed[schema_format] if compressed else self.variants[schema_format]
+        return body, self.etags[schema_format, compressed]
+
+
+@lru_cache
+def load_schema(path):
+    with open(path, "rb") as schema_file:
+        return PrebuiltSchema(schema_file.read())
+
+
+class PrebuiltSchemaView(View):
+    """
+    Serves settings.SCHEMA_FILE instead of introspecting every view on each
+    request like SpectacularAPIView. The file is read once per process.
+    """
+    http_method_names = ["get", "head", "options"]
+
+    def get(self, request, *args, **kwargs):
+        schema = load_schema(settings.SCHEMA_FILE)
+        schema_format = "json" if self.wants_json(request) else "yaml"
+        compressed = bool(accepts_gzip.search(request.headers.get("Accept-Encoding", "")))
+        body, etag = schema.get(schema_format, compressed)
+
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(body, content_type=CONTENT_TYPES[schema_format])
+            if compressed:
+                response["Content-Encoding"] = "gzip"
+        response["ETag"] = etag
+        patch_vary_headers(response, ("Accept", "Accept-Encoding"))
+        return response
+
+    def wants_json(self, request):
+        if "format" in request.GET:
+            return request.GET["format"] == "json"
+        # Covers application/vnd.oai.openapi+json and the application/json Swagger UI asks for
+        return "json" in request.headers.get("Accept", "")
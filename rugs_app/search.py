@@ -0,0 +1,124 @@
+import operator
+import re
+from functools import reduce
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connections
+from django.db.models import F, Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+from rest_framework.filters import SearchFilter
+
+FTS_TABLE = "rugs_app_rug_fts"
+
+
+def _words(terms):
+    # Only keep word characters so user input can never break the query syntax
+    return [word for term in terms for word in re.findall(r"\w+", term)]
+
+
+class ContainsSearchBackend:
+    """
+    Unindexed `icontains` matching, the same as DRF's SearchFilter. Used when
+    no full-text index is available for the database.
+    """
+    fields = ("title", "description")
+
+    def search(self, queryset, terms):
+        conditions = [
+            reduce(operator.or_, (Q(**{f"{field}__icontains": term}) for field in self.fields))
+            for term in terms
+        ]
+        return queryset.filter(reduce(operator.and_, conditions))
+
+    def update_index(self, rug, using):
+        pass
+
+    def refresh_index(self, queryset):
+        # For rows written without Rug.save, e.g. by bulk_create
+        pass
+
+
+class PostgresSearchBackend(ContainsSearchBackend):
+    """
+    Matches against the GIN-indexed `Rug.search_vector` column, ranking title
+    matches above description matches.
+    """
+    config = "english"
+
+    def get_vector(self):
+        return (
+            SearchVector("title", weight="A", config=self.config)
+            + SearchVector("description", weight="B", config=self.config)
+        )
+
+    def search(self, queryset, terms):
+        words = _words(terms)
+        if not words:
+            return queryset.none()
+        # Prefix matching so results update as the user types
+        query = SearchQuery(" & ".join(f"{word}:*" for word in words), search_type="raw", config=self.config)
+        return queryset.filter(search_vector=query).annotate(
+            rank=SearchRank(F("search_vector"), query)
+        ).order_by("-rank", "-date_created")
+
+    def update_index(self, rug, using):
+        type(rug).objects.using(using).filter(pk=rug.pk).update(search_vector=self.get_vector())
+
+    def refresh_index(self, queryset):
+        queryset.update(search_vector=self.get_vector())
+
+
+class SQLiteSearchBackend(ContainsSearchBackend):
+    """
+    Matches against an FTS5 table that triggers keep in sync with `Rug`, for
+    development mode.
+    """
+
+    def search(self, queryset, terms):
+        words = _words(terms)
+        if not words:
+            return queryset.none()
+        match = " ".join('"{}"*'.format(word) for word in words)
+        table = queryset.model._meta.db_table
+        # FTS5's rank is bm25, where lower is a better match
+        return queryset.filter(
+            id__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match])
+        ).annotate(
+            rank=RawSQL(f"SELECT -rank FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id", [match])
+        ).order_by("-rank", "-date_created")
+
+
+_backends = {}
+
+
+def get_search_backend(using="default"):
+    backend_path = getattr(settings, "RUG_SEARCH_BACKEND", None)
+    key = (using, backend_path)
+    if key not in _backends:
+        connection = connections[using]
+        if backend_path:
+            backend = import_string(backend_path)()
+        elif connection.vendor == "postgresql":
+            backend = PostgresSearchBackend()
+        elif connection.vendor == "sqlite" and FTS_TABLE in connection.introspection.table_names():
+            backend = SQLiteSearchBackend()
+        else:
+            backend = ContainsSearchBackend()
+        _backends[key] = backend
+    return _backends[key]
+
+
+class RugSearchFilter(SearchFilter):
+    """
+    Drop-in replacement for SearchFilter on `?search=` that goes through the
+    configured search backend. Results are ranked by relevance unless an
+    explicit `?ordering=` is given.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        return get_search_backend(queryset.db).search(queryset, terms)
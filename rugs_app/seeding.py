@@ -0,0 +1,194 @@
+import random
+from array import array
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.db import connections, transaction
+from django.db.models import Max
+
+from .cache import CATALOG, ORDERS, bump_version
+from .models import Order, Rug, User
+from .search import get_search_backend
+
+# Every seeded user can log in with this password
+SEED_PASSWORD = "benchmark"
+
+# Generated dates count back from here, so they don't depend on when seeding runs
+SEED_EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+SEED_HISTORY_SECONDS = 3 * 365 * 24 * 60 * 60
+
+COLORS = ["red", "blue", "ivory", "green", "gold", "grey", "navy", "rust", "beige", "teal", "charcoal", "terracotta"]
+STYLES = ["persian", "kilim", "shag", "moroccan", "oriental", "modern", "vintage", "braided", "tribal", "geometric",
+          "floral", "abstract"]
+MATERIALS = ["wool", "silk", "cotton", "jute", "sisal", "viscose", "bamboo silk", "hemp"]
+ORIGINS = ["Tabriz", "Isfahan", "Kashan", "Heriz", "Kazak", "Anatolian", "Berber", "Afghan", "Nepalese", "Indian"]
+PATTERNS = ["medallion", "border", "diamond", "trellis", "botanical", "striped", "distressed", "herati"]
+ROOMS = ["living room", "bedroom", "hallway", "dining room", "entryway", "study", "nursery"]
+SIZES = [(2, 3), (3, 5), (4, 6), (5, 8), (6, 9), (8, 10), (9, 12), (2, 8), (2, 10)]
+NAMES = ["alex", "sam", "jordan", "taylor", "morgan", "casey", "riley", "jamie", "avery", "quinn"]
+
+# Share of users subscribed to new-rug emails
+SUBSCRIBER_RATE = 0.2
+# Rugs set aside per requested order, so most orders can be filled with one to three rugs
+RUGS_PER_ORDER = 2.2
+ORDER_STATUSES = [Order.OrderStatus.COMPLETE, Order.OrderStatus.READY_FOR_PICKUP, Order.OrderStatus.PENDING]
+ORDER_STATUS_WEIGHTS = [70, 10, 20]
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def _insert(model, objects):
+    """Bulk-inserts one batch and returns the new primary keys, in order."""
+    if connections[model.objects.db].features.can_return_rows_from_bulk_insert:
+        return [obj.pk for obj in model.objects.bulk_create(objects)]
+    last_pk = model.objects.aggregate(last=Max("pk"))["last"] or 0
+    model.objects.bulk_create(objects)
+    return list(model.objects.filter(pk__gt=last_pk).order_by("pk").values_list("pk", flat=True))
+
+
+def _date(rng):
+    return SEED_EPOCH - timedelta(seconds=rng.randrange(SEED_HISTORY_SECONDS))
+
+
+def _price(rng):
+    # Log-normal around $250, like a catalog of mostly mid-range rugs with a long tail of expensive ones
+    price = min(max(rng.lognormvariate(5.5, 0.8), 15), 9999.99)
+    return Decimal(f"{price:.2f}")
+
+
+def generate_rug(rng, i):
+    color, style, material, origin = rng.choice(COLORS), rng.choice(STYLES), rng.choice(MATERIALS), rng.choice(ORIGINS)
+    width, length = rng.choice(SIZES)
+    sentences = [
+        f"A {width}' x {length}' {style} rug, hand-{rng.choice(['knotted', 'woven', 'tufted'])} in {origin} from {material}.",
+        f"Its {color} field carries a {rng.choice(PATTERNS)} pattern framed by a {rng.choice(COLORS)} border.",
+        f"Suits a {rng.choice(ROOMS)} or {rng.choice(ROOMS)}.",
+    ]
+    if rng.random() < 0.3:
+        sentences.append(f"Some wear consistent with age; {rng.randint(10, 90)} years old.")
+    return Rug(
+        title=f"{color.title()} {origin} {style} {material} rug #{i}"[:64],
+        description=" ".join(sentences),
+        price=_price(rng),
+        image_url=f"https://images.example.com/rugs/{i}.jpg" if rng.random() < 0.8 else None,
+        date_created=_date(rng),
+    )
+
+
+def generate_user(rng, seed, i, password):
+    name = f"{rng.choice(NAMES)}{i}"
+    return User(
+        username=f"seed{seed}-{name}",
+        email=f"{name}@example.com",
+        password=password,
+        receive_emails_new_rugs=rng.random() < SUBSCRIBER_RATE,
+        date_joined=_date(rng),
+    )
+
+
+def generate_order(rng, user_pk, rugs):
+    status = rng.choices(ORDER_STATUSES, ORDER_STATUS_WEIGHTS)[0]
+    placed = max(date for _, _, date in rugs) + timedelta(hours=rng.randint(1, 24 * 60))
+    ready = placed + timedelta(hours=rng.randint(2, 72)) if status != Order.OrderStatus.PENDING else None
+    completed = ready + timedelta(hours=rng.randint(1, 240)) if status == Order.OrderStatus.COMPLETE else None
+    return Order(
+        user_id=user_pk,
+        rug_count=len(rugs),
+        price=min(sum(price for _, price, _ in rugs), Decimal("9999.99")),
+        status=status,
+        date_placed=placed,
+        date_ready=ready,
+        date_completed=completed,
+    )
+
+
+def seed_data(rugs=0, users=0, orders=0, cart_items=0, seed=0, batch_size=5000, progress=None):
+    """
+    Bulk-creates users, rugs, orders of those rugs and cart entries, one
+    transaction per batch. The same seed always generates the same data.
+
+    `progress(phase, done, total)` is called after every batch. Returns the
+    number of rows created by kind.
+    """
+    # A separate generator per kind keeps each independent of the batch size
+    user_rng, rug_rng, order_rng, cart_rng = (random.Random(f"{seed}-{kind}") for kind in ("users", "rugs", "orders", "carts"))
+    report = progress or (lambda phase, done, total: None)
+    # Hashing once instead of per user keeps seeding fast; the fixed salt keeps it deterministic
+    password = make_password(SEED_PASSWORD, salt=f"seed{seed}salt")
+    created = {"users": 0, "rugs": 0, "orders": 0, "order_rugs": 0, "cart_items": 0}
+
+    user_pks = array("q")
+    for batch in _batches((generate_user(user_rng, seed, i, password) for i in range(users)), batch_size):
+        with transaction.atomic():
+            user_pks.extend(_insert(User, batch))
+        report("users", len(user_pks), users)
+    created["users"] = len(user_pks)
+
+    # Some rugs are set aside as they're created and grouped into orders; the rest stay available
+    sold_rate = min(1.0, orders * RUGS_PER_ORDER / rugs) if rugs and user_pks else 0
+    available = array("q")
+    sold = []
+    next_order_size = order_rng.randint(1, 3)
+    search_backend = get_search_backend(Rug.objects.db)
+
+    def place_orders(final=False):
+        nonlocal next_order_size
+        batch = []
+        while created["orders"] + len(batch) < orders and sold and (len(sold) >= next_order_size or final):
+            order_rugs, sold[:] = sold[:next_order_size], sold[next_order_size:]
+            batch.append((generate_order(order_rng, order_rng.choice(user_pks), order_rugs), order_rugs))
+            next_order_size = order_rng.randint(1, 3)
+        if not batch:
+            return
+        order_pks = _insert(Order, [order for order, _ in batch])
+        Order.rugs.through.objects.bulk_create([
+            Order.rugs.through(order_id=order_pk, rug_id=rug_pk)
+            for order_pk, (_, order_rugs) in zip(order_pks, batch) for rug_pk, _, _ in order_rugs
+        ], batch_size=batch_size)
+        Rug.objects.filter(
+            pk__in=[rug_pk for _, order_rugs in batch for rug_pk, _, _ in order_rugs]
+        ).update(status=Rug.RugStatus.NOT_AVAILABLE)
+        created["orders"] += len(order_pks)
+        created["order_rugs"] += sum(len(order_rugs) for _, order_rugs in batch)
+
+    generated = ((generate_rug(rug_rng, i), rug_rng.random() < sold_rate) for i in range(rugs))
+    for batch in _batches(generated, batch_size):
+        with transaction.atomic():
+            pks = _insert(Rug, [rug for rug, _ in batch])
+            # bulk_create skips Rug.save, which normally keeps the search index up to date
+            search_backend.refresh_index(Rug.objects.filter(pk__in=pks))
+            for pk, (rug, is_sold) in zip(pks, batch):
+                if is_sold:
+                    sold.append((pk, rug.price, rug.date_created))
+                else:
+                    available.append(pk)
+            place_orders()
+        created["rugs"] += len(pks)
+        report("rugs", created["rugs"], rugs)
+    with transaction.atomic():
+        place_orders(final=True)
+    # Set aside but never ordered
+    available.extend(pk for pk, _, _ in sold)
+    report("orders", created["orders"], orders)
+
+    cart_items = min(cart_items, len(user_pks) * len(available))
+    cart = set()
+    while len(cart) < cart_items:
+        cart.add((cart_rng.choice(user_pks), cart_rng.choice(available)))
+    for batch in _batches(sorted(cart), batch_size):
+        with transaction.atomic():
+            User.cart.through.objects.bulk_create(
+                [User.cart.through(user_id=user_pk, rug_id=rug_pk) for user_pk, rug_pk in batch]
+            )
+        created["cart_items"] += len(batch)
+        report("cart items", created["cart_items"], cart_items)
+
+    # Bulk writes don't send the signals that normally invalidate cached responses
+    bump_version(CATALOG, ORDERS)
+    return created
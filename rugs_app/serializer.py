@@ -1,10 +1,28 @@
-from django.conf import settings
-from django.core.mail import send_mass_mail
+import time
+
+from django.db import transaction
 from rest_framework import serializers
+from .middleware import record_serialization
 from .models import User, Rug, Order
+from .outbox import enqueue_new_rug_announcement
+
+
+class TimedSerializerMixin:
+    # Records producing `data` on the request's performance metrics; nested serializers are part of their parent's time
+    @property
+    def data(self):
+        start = time.perf_counter()
+        try:
+            return super().data
+        finally:
+            record_serialization(time.perf_counter() - start)
 
 
-class UserSerializer(serializers.ModelSerializer):
+class TimedListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    pass
+
+
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     orders = serializers.PrimaryKeyRelatedField(many=True, queryset=Order.objects.all())
 
     class Meta:
@@ -35,11 +53,11 @@ class RegisterSerializer(serializers.ModelSerializer):
             })
 
         # Ensure that username and email are not already taken
-        if len(User.objects.filter(email=attrs["email"])) > 0:
+        if User.objects.filter(email=attrs["email"]).exists():
             raise serializers.ValidationError({
                 "email": "Email already taken"
             })
-        if len(User.objects.filter(username=attrs["username"])) > 0:
+        if User.objects.filter(username=attrs["username"]).exists():
             raise serializers.ValidationError({
                 "username": "Username already taken"
             })
@@ -47,44 +65,57 @@ class RegisterSerializer(serializers.ModelSerializer):
         return attrs
 
     def create(self, validated_data):
-        user = User.objects.create(
+        # create_user hashes the password before the insert, so the user is saved only once
+        preferences = {
+            field: validated_data[field]
+            for field in ("receive_emails_order_updates", "receive_emails_new_rugs")
+            if field in validated_data
+        }
+        return User.objects.create_user(
             username=validated_data["username"],
-            email=validated_data["email"]
+            email=validated_data["email"],
+            password=validated_data["password"],
+            **preferences
         )
 
-        # Must use set_password method to hash password
-        user.set_password(validated_data["password"])
-
-        if "receive_emails_order_updates" in validated_data:
-            user.receive_emails_order_updates = validated_data["receive_emails_order_updates"]
 
-        if "receive_emails_new_rugs" in validated_data:
-            user.receive_emails_new_rugs = validated_data["receive_emails_new_rugs"]
+class DynamicFieldsModelSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    # Takes an optional `fields` argument restricting which fields are serialized
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop("fields", None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
 
-        user.save()
-        return user
 
+class RugSerializer(DynamicFieldsModelSerializer):
+    # Compact representation used by default on list endpoints
+    card_fields = ["id", "title", "price", "image_url", "status"]
 
-class RugSerializer(serializers.ModelSerializer):
     class Meta:
         model = Rug
-        fields = "__all__"
+        exclude = ["search_vector"]
+        list_serializer_class = TimedListSerializer
 
     def create(self, validated_data):
-        rug = super().create(validated_data)
-        email_messages = ((
-            "New rug available!",
-            f"There is a new rug, \"{validated_data['title']}\", available to purchase! To see this rug, visit "
-            f"{settings.CSRF_TRUSTED_ORIGINS[0]}/rug/{rug.id}", settings.DEFAULT_FROM_EMAIL, [user.email])
-            for user in User.objects.all() if user.receive_emails_new_rugs)
-        send_mass_mail(email_messages, fail_silently=False)
+        # The announcement is sent later by the outbox worker (manage.py process_email_outbox)
+        with transaction.atomic():
+            rug = super().create(validated_data)
+            enqueue_new_rug_announcement(rug)
         return rug
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Order
         fields = "__all__"
+        list_serializer_class = TimedListSerializer
+
+
+class ExpandedOrderSerializer(OrderSerializer):
+    # Embeds a card of each rug instead of its ID
+    rugs = RugSerializer(many=True, read_only=True, fields=RugSerializer.card_fields)
 
 
 class VerifyPassword:
@@ -92,7 +123,7 @@ class VerifyPassword:
         self.valid = valid
 
 
-class VerifyPasswordSerializer(serializers.Serializer):
+class VerifyPasswordSerializer(TimedSerializerMixin, serializers.Serializer):
     valid = serializers.BooleanField()
 
 
@@ -105,5 +136,40 @@ class CartPrice:
         self.price = price
 
 
-class CartPriceSerializer(serializers.Serializer):
-    price = serializers.DecimalField(max_digits=6, decimal_places=2)
\ No newline at end of file
+class CartPriceSerializer(TimedSerializerMixin, serializers.Serializer):
+    price = serializers.DecimalField(max_digits=6, decimal_places=2)
+
+
+class CartSummary:
+    def __init__(self, items, count, total):
+        self.items = items
+        self.count = count
+        self.total = total
+
+
+class CartSummarySerializer(TimedSerializerMixin, serializers.Serializer):
+    items = RugSerializer(many=True, fields=RugSerializer.card_fields)
+    count = serializers.IntegerField()
+    total = serializers.DecimalField(max_digits=8, decimal_places=2)
+
+
+class CartBatchRequestSerializer(serializers.Serializer):
+    add = serializers.ListField(child=serializers.IntegerField(), required=False, max_length=100)
+    remove = serializers.ListField(child=serializers.IntegerField(), required=False, max_length=100)
+
+    def validate(self, attrs):
+        if set(attrs.get("add", [])) & set(attrs.get("remove", [])):
+            raise serializers.ValidationError({
+                "error": "a rug cannot be both added and removed"
+            })
+        return attrs
+
+
+class CartBatchResultSerializer(serializers.Serializer):
+    rug = serializers.IntegerField()
+    result = serializers.CharField()
+
+
+class CartBatchSerializer(TimedSerializerMixin, serializers.Serializer):
+    add = CartBatchResultSerializer(many=True)
+    remove = CartBatchResultSerializer(many=True)
@@ -0,0 +1,68 @@
+from django.core.cache import cache
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from knox.models import AuthToken
+
+from .authentication import token_cache_key
+from .cache import CATALOG, ORDERS, bump_version, cart_namespace, order_namespace, user_orders_namespace
+from .models import Order, Rug, User
+
+
+def _changed_pks(instance, action, reverse, pk_set, related_pks):
+    """
+    Primary keys on the far side of an m2m change whose related data changed.
+    A reverse clear doesn't report them, so they're looked up before it happens.
+    """
+    if not reverse:
+        return [instance.pk]
+    if action == "pre_clear":
+        instance._cleared_pks = list(related_pks())
+    if action == "post_clear":
+        return getattr(instance, "_cleared_pks", [])
+    return pk_set or []
+
+
+@receiver(post_save, sender=Rug)
+@receiver(post_delete, sender=Rug)
+def invalidate_catalog(sender, **kwargs):
+    bump_version(CATALOG)
+
+
+@receiver(pre_delete, sender=Rug)
+def invalidate_rug_orders(sender, instance, **kwargs):
+    # Deleting a rug takes it out of its orders by a cascade, which doesn't send m2m_changed
+    orders = Order.objects.filter(rugs=instance).only("pk", "user_id")
+    namespaces = {ORDERS}
+    for order in orders:
+        namespaces.update((user_orders_namespace(order.user_id), order_namespace(order.pk)))
+    bump_version(*namespaces)
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def invalidate_order(sender, instance, **kwargs):
+    bump_version(ORDERS, user_orders_namespace(instance.user_id), order_namespace(instance.pk))
+
+
+@receiver(m2m_changed, sender=Order.rugs.through)
+def invalidate_order_rugs(sender, instance, action, reverse, pk_set, **kwargs):
+    order_pks = _changed_pks(instance, action, reverse, pk_set, lambda: instance.order.values_list("pk", flat=True))
+    if not action.startswith("post_"):
+        return
+    orders = [instance] if not reverse else Order.objects.filter(pk__in=order_pks).only("pk", "user_id")
+    for changed_order in orders:
+        bump_version(ORDERS, user_orders_namespace(changed_order.user_id), order_namespace(changed_order.pk))
+
+
+@receiver(m2m_changed, sender=User.cart.through)
+def invalidate_cart(sender, instance, action, reverse, pk_set, **kwargs):
+    user_pks = _changed_pks(instance, action, reverse, pk_set, lambda: instance.user.values_list("pk", flat=True))
+    if not action.startswith("post_"):
+        return
+    bump_version(*(cart_namespace(user_pk) for user_pk in user_pks))
+
+
+@receiver(post_save, sender=AuthToken)
+@receiver(post_delete, sender=AuthToken)
+def invalidate_cached_token(sender, instance, **kwargs):
+    cache.delete(token_cache_key(instance.digest))
@@ -0,0 +1,67 @@
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+ALL_FIELDS = "__all__"
+
+
+class SparseFieldsMixin:
+    """
+    Lets clients pick the fields of a read with `?fields=a,b` or `?omit=c`
+    (`?fields=__all__` for everything). The selection narrows both the
+    serializer and the columns loaded from the database.
+    """
+    fields_query_param = "fields"
+    omit_query_param = "omit"
+    # Fields returned when the client doesn't ask for any; None for all of them
+    default_fields = None
+
+    def get_requested_fields(self):
+        if hasattr(self, "_requested_fields"):
+            return self._requested_fields
+
+        available = list(self.get_serializer_class()().fields)
+        requested = self.request.query_params.get(self.fields_query_param)
+        omitted = self.request.query_params.get(self.omit_query_param)
+
+        if requested and requested != ALL_FIELDS:
+            fields = [field for field in requested.split(",") if field]
+        elif requested == ALL_FIELDS or omitted or self.default_fields is None:
+            fields = available
+        else:
+            fields = list(self.default_fields)
+        if omitted:
+            fields = [field for field in fields if field not in omitted.split(",")]
+
+        unknown = [field for field in fields if field not in available]
+        if unknown:
+            raise serializers.ValidationError({
+                self.fields_query_param: f"Unknown field(s): {', '.join(unknown)}"
+            })
+        self._requested_fields = fields
+        return fields
+
+    def get_serializer(self, *args, **kwargs):
+        if self.request.method in SAFE_METHODS:
+            kwargs.setdefault("fields", self.get_requested_fields())
+        return super().get_serializer(*args, **kwargs)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.request.method not in SAFE_METHODS:
+            return queryset
+
+        # Ordering columns are kept too, since cursor pagination reads them from the last row
+        ordering = queryset.query.order_by or queryset.model._meta.ordering
+        names = self.get_requested_fields() + [
+            field.lstrip("-") for field in ordering if isinstance(field, str)
+        ]
+        columns = []
+        for name in names:
+            try:
+                field = queryset.model._meta.get_field(name)
+            except FieldDoesNotExist:
+                continue
+            if field.concrete and not field.many_to_many and field.name not in columns:
+                columns.append(field.name)
+        return queryset.only(*columns) if columns else queryset
@@ -0,0 +1,168 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import timedelta
+from types import ModuleType
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path
+from django.utils import timezone
+from knox.models import AuthToken
+
+from .. import views
+from ..authentication import create_token
+from ..cache import get_counters
+from ..models import Order, Rug, User
+from ..urls import build_urlpatterns
+
+# The API with ASYNC_VIEWS on; a query made from the event loop instead of through the async ORM
+# raises SynchronousOnlyOperation, which these tests would see as a 500
+async_urls = ModuleType("async_urls")
+with override_settings(ASYNC_VIEWS=True):
+    async_urls.urlpatterns = [path("api/", include(build_urlpatterns()))]
+
+
+@asynccontextmanager
+async def capture_queries(using=DEFAULT_DB_ALIAS):
+    # CaptureQueriesContext for async tests. The queries run on the connection sync_to_async
+    # reaches, not on the event loop's
+    context = await sync_to_async(lambda: CaptureQueriesContext(connections[using]))()
+    queries = []
+    await sync_to_async(context.__enter__)()
+    try:
+        yield queries
+    finally:
+        await sync_to_async(context.__exit__)(None, None, None)
+        queries.extend(await sync_to_async(lambda: context.captured_queries)())
+
+
+ASYNC_VIEWS = (views.RugsListView, views.RugsDetailView, views.OrderListView, views.CartListView, views.CartPriceView)
+
+
+class AsyncViewsSettingTest(TestCase):
+
+    def test_setting(self):
+        for view_class in ASYNC_VIEWS:
+            self.assertFalse(asyncio.iscoroutinefunction(view_class.as_view()), view_class)
+            with override_settings(ASYNC_VIEWS=True):
+                self.assertTrue(asyncio.iscoroutinefunction(view_class.as_view()), view_class)
+
+
+@override_settings(ROOT_URLCONF=async_urls)
+class AsyncViewsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.rugs = [
+            Rug.objects.create(title="Test1", description="Testing1", price=4.99),
+            Rug.objects.create(title="Test2", description="Testing2", price=5.99),
+            Rug.objects.create(title="Test3", description="Testing3", price=7.99, status=Rug.RugStatus.NOT_AVAILABLE),
+        ]
+        cls.user = User.objects.create_user(username="test1", email="test1@gmail.com", password="test")
+        cls.user.cart.add(cls.rugs[0], cls.rugs[1])
+        cls.order = Order.objects.create(user=cls.user, rug_count=1, price=cls.rugs[2].price)
+        cls.order.rugs.add(cls.rugs[2])
+        cls.token = create_token(cls.user)[1]
+
+    def setUp(self):
+        cache.clear()
+        # The async client takes headers by their HTTP name
+        self.auth = {"Authorization": f"Token {self.token}"}
+
+    async def test_get_rugs(self):
+        async with capture_queries() as queries:
+            response = await self.async_client.get("/api/rug")
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["count"], 3)
+        self.assertEqual(response["X-Cache"], "MISS")
+
+        async with capture_queries() as queries:
+            response = await self.async_client.get("/api/rug")
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(response["X-Cache"], "HIT")
+        response = await self.async_client.get("/api/rug", **{"If-None-Match": response["ETag"]})
+        self.assertEqual(response.status_code, 304)
+
+    async def test_get_rugs_matches_sync_view(self):
+        for query in ("?ordering=price", "?status=Available", "?search=Test2", "?fields=title,price",
+                      "?pagination=cursor", "?page=9"):
+            response = await self.async_client.get("/api/rug" + query)
+            with override_settings(ROOT_URLCONF="server.urls"):
+                expected = await sync_to_async(self.client.get)("/api/rug" + query)
+            self.assertEqual(response.status_code, expected.status_code, query)
+            self.assertEqual(response.json(), expected.json(), query)
+
+    @override_settings(PERFORMANCE_METRICS=True)
+    def test_sync_middleware(self):
+        # PerformanceMiddleware is sync only, so the views run in an event loop of their own, as under WSGI
+        response = self.client.get("/api/rug")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["count"], 3)
+        self.assertIn('desc="2 queries"', response["Server-Timing"])
+
+    async def test_cursor_pagination(self):
+        await Rug.objects.abulk_create(Rug(title=f"Bulk{i}", description="Bulk", price=1) for i in range(8))
+        response = await self.async_client.get("/api/rug", {"pagination": "cursor"})
+        self.assertEqual(len(response.json()["results"]), 8)
+        response = await self.async_client.get(response.json()["next"])
+        self.assertEqual(len(response.json()["results"]), 3)
+        self.assertIsNone(response.json()["next"])
+        response = await self.async_client.get(response.json()["previous"])
+        self.assertEqual(len(response.json()["results"]), 8)
+
+    async def test_get_rug(self):
+        response = await self.async_client.get(f"/api/rug/{self.rugs[0].pk}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["title"], "Test1")
+        response = await self.async_client.get("/api/rug/0")
+        self.assertEqual(response.status_code, 404)
+
+    async def test_cart(self):
+        response = await self.async_client.get("/api/cart", **self.auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({rug["id"] for rug in response.json()["results"]}, {self.rugs[0].pk, self.rugs[1].pk})
+        response = await self.async_client.get("/api/cart/price", **self.auth)
+        self.assertEqual(response.json()["price"], "10.98")
+        # From the cached totals the second time
+        async with capture_queries() as queries:
+            response = await self.async_client.get("/api/cart/price", **self.auth)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(response.json()["price"], "10.98")
+
+        response = await self.async_client.get("/api/cart")
+        self.assertEqual(response.status_code, 401)
+        response = await self.async_client.get("/api/cart", Authorization="Token nope")
+        self.assertEqual(response.status_code, 401)
+
+    async def test_orders(self):
+        response = await self.async_client.get("/api/order", {"expand": "rugs"}, **self.auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"][0]["id"], self.order.pk)
+        self.assertEqual(response.json()["results"][0]["rugs"][0]["title"], "Test3")
+
+        # Writes go through the sync view
+        response = await self.async_client.post("/api/order", **self.auth)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(await self.user.orders.acount(), 2)
+
+    async def test_token_cache(self):
+        await self.async_client.get("/api/cart", **self.auth)
+        # Once the token is cached, only the user is loaded before the cart's count and page
+        async with capture_queries() as queries:
+            response = await self.async_client.get("/api/cart", **self.auth)
+        self.assertEqual(len(queries), 3)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(await sync_to_async(get_counters)("auth_cache_hits", "auth_cache_misses"), {
+            "auth_cache_hits": 1,
+            "auth_cache_misses": 1,
+        })
+
+    async def test_expired_token(self):
+        await AuthToken.objects.filter(user=self.user).aupdate(expiry=timezone.now() - timedelta(seconds=1))
+        response = await self.async_client.get("/api/cart", **self.auth)
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(await AuthToken.objects.filter(user=self.user).aexists())
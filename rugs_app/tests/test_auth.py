@@ -1,5 +1,17 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
 
+from django.core.cache import cache
+from django.db import connection
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from knox.models import AuthToken
+from knox.signals import token_expired
+
+from ..authentication import token_cache_key
+from ..cache import get_counters
 from ..models import User
 
 
@@ -10,6 +22,23 @@ class AuthenticationViewTest(TestCase):
         user.set_password("password")
         user.save()
 
+    def setUp(self):
+        cache.clear()
+
+    def login(self, username="takenUsername", password="password", **headers):
+        response = self.client.post(
+            "/api/login",
+            {"username": username, "password": password},
+            "application/json",
+            **headers
+        )
+        return response.json()["token"]
+
+    def authenticated_queries(self, token):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/authenticated", HTTP_AUTHORIZATION=f"Token {token}")
+        return response, [query["sql"] for query in queries.captured_queries]
+
     def test_valid_register(self):
         response = self.client.post(
             "/api/register",
@@ -23,6 +52,10 @@ class AuthenticationViewTest(TestCase):
             "application/json"
         )
         self.assertEqual(response.status_code, 200)
+        user = User.objects.get(username="newUsername")
+        self.assertTrue(user.check_password("password"))
+        self.assertFalse(user.receive_emails_order_updates)
+        self.assertTrue(user.receive_emails_new_rugs)
 
         self.assertContains(response, "token")
         token = response.json()["token"]
@@ -185,3 +218,112 @@ class AuthenticationViewTest(TestCase):
         )
         self.assertEqual(response.status_code, 400)
         self.assertEqual(response.json()["valid"], 'False')
+
+    def test_cached_token_authentication(self):
+        token = self.login()
+
+        response, queries = self.authenticated_queries(token)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(any("knox_authtoken" in query for query in queries))
+
+        response, queries = self.authenticated_queries(token)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any("knox_authtoken" in query for query in queries))
+        # Only the user's id and the token's expiry are cached; the user is read fresh
+        auth_token = AuthToken.objects.get()
+        self.assertEqual(cache.get(token_cache_key(auth_token.digest)),
+                         {"user": auth_token.user_id, "expiry": auth_token.expiry})
+        self.assertEqual(get_counters("auth_cache_hits", "auth_cache_misses"),
+                         {"auth_cache_hits": 1, "auth_cache_misses": 1})
+
+    def test_token_lookup(self):
+        token = self.login()
+
+        # The token comes with its user, and the user's other tokens aren't swept on every lookup
+        response, queries = self.authenticated_queries(token)
+        self.assertEqual(response.status_code, 200)
+        queries = [query for query in queries if "knox_authtoken" in query]
+        self.assertEqual(len(queries), 1)
+        self.assertIn("rugs_app_user", queries[0])
+
+    def test_expired_token_deleted(self):
+        token = self.login()
+        AuthToken.objects.update(expiry=timezone.now() - timedelta(seconds=1))
+
+        handler = mock.Mock()
+        token_expired.connect(handler)
+        self.addCleanup(token_expired.disconnect, handler)
+        self.assertEqual(self.authenticated_queries(token)[0].status_code, 401)
+        self.assertFalse(AuthToken.objects.exists())
+        self.assertEqual(handler.call_args.kwargs["username"], "takenUsername")
+
+    def test_cached_token_invalidated_on_logout(self):
+        token = self.login()
+        self.authenticated_queries(token)
+
+        self.assertEqual(self.client.post("/api/logout", HTTP_AUTHORIZATION=f"Token {token}").status_code, 204)
+        self.assertEqual(self.authenticated_queries(token)[0].status_code, 401)
+
+    def test_cached_token_invalidated_on_delete(self):
+        token = self.login()
+        self.authenticated_queries(token)
+
+        AuthToken.objects.all().delete()
+        self.assertEqual(self.authenticated_queries(token)[0].status_code, 401)
+
+    def test_cached_token_invalidated_on_user_change(self):
+        token = self.login()
+        self.authenticated_queries(token)
+
+        user = User.objects.get(username="takenUsername")
+        user.is_active = False
+        user.save()
+        self.assertEqual(self.authenticated_queries(token)[0].status_code, 401)
+
+    def test_cached_token_expires(self):
+        token = self.login()
+        self.authenticated_queries(token)
+
+        later = timezone.now() + timedelta(days=1)
+        with mock.patch("django.utils.timezone.now", return_value=later):
+            self.assertEqual(self.authenticated_queries(token)[0].status_code, 401)
+        self.assertFalse(AuthToken.objects.exists())
+
+    def test_login_reuses_current_token(self):
+        token = self.login()
+        AuthToken.objects.update(expiry=timezone.now() + timedelta(minutes=1))
+
+        self.assertEqual(self.login(HTTP_AUTHORIZATION=f"Token {token}"), token)
+        self.assertEqual(AuthToken.objects.count(), 1)
+        self.assertGreater(AuthToken.objects.get().expiry, timezone.now() + timedelta(hours=1))
+        self.assertEqual(self.authenticated_queries(token)[0].status_code, 200)
+
+    def test_login_with_other_users_token(self):
+        User.objects.create_user(username="other", password="password")
+        other_token = self.login(username="other")
+
+        token = self.login(HTTP_AUTHORIZATION=f"Token {other_token}")
+        self.assertNotEqual(token, other_token)
+        self.assertEqual(self.authenticated_queries(token)[0].json()["username"], "takenUsername")
+
+    def test_login_with_invalid_token(self):
+        token = self.login(HTTP_AUTHORIZATION="Token 1234")
+        self.assertEqual(self.authenticated_queries(token)[0].status_code, 200)
+
+    @override_settings(AUTH_TOKEN_LIMIT_PER_USER=2)
+    def test_token_limit_per_user(self):
+        tokens = [self.login() for _ in range(3)]
+        self.assertEqual(AuthToken.objects.count(), 2)
+        self.assertEqual(self.authenticated_queries(tokens[0])[0].status_code, 401)
+        self.assertEqual(self.authenticated_queries(tokens[2])[0].status_code, 200)
+
+    def test_purge_expired_tokens(self):
+        for _ in range(5):
+            self.login()
+        AuthToken.objects.filter(
+            digest__in=AuthToken.objects.values_list("digest", flat=True)[:3]
+        ).update(expiry=timezone.now() - timedelta(seconds=1))
+
+        call_command("purge_expired_tokens", batch_size=2, verbosity=0)
+        self.assertEqual(AuthToken.objects.count(), 2)
+        self.assertFalse(AuthToken.objects.filter(expiry__lt=timezone.now()).exists())
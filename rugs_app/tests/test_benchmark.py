@@ -0,0 +1,138 @@
+import json
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+
+from ..management.commands.benchmark_startup import REQUEST_MARKER, parse_importtime
+from ..models import Order, Rug, User
+from ..seeding import seed_data
+
+
+class SeedDataTest(TestCase):
+
+    def test_seed_data(self):
+        created = seed_data(rugs=200, users=10, orders=40, cart_items=30, seed=1, batch_size=32)
+        self.assertEqual(created["rugs"], Rug.objects.count())
+        self.assertEqual(Rug.objects.count(), 200)
+        self.assertEqual(User.objects.count(), 10)
+        self.assertEqual(Order.objects.count(), 40)
+        self.assertEqual(User.cart.through.objects.count(), 30)
+        self.assertEqual(Order.rugs.through.objects.count(), created["order_rugs"])
+
+        for order in Order.objects.prefetch_related("rugs"):
+            self.assertEqual(order.rug_count, len(order.rugs.all()))
+            self.assertEqual(order.price, sum(rug.price for rug in order.rugs.all()))
+            self.assertTrue(all(rug.status == Rug.RugStatus.NOT_AVAILABLE for rug in order.rugs.all()))
+        # Ordered rugs aren't in carts
+        self.assertFalse(User.cart.through.objects.filter(rug__status=Rug.RugStatus.NOT_AVAILABLE).exists())
+        self.assertEqual(Rug.objects.filter(status=Rug.RugStatus.NOT_AVAILABLE).count(), created["order_rugs"])
+
+        username = User.objects.values_list("username", flat=True).first()
+        self.assertTrue(self.client.post(
+            "/api/login", {"username": username, "password": "benchmark"}, "application/json"
+        ).json()["token"])
+
+    def get_seeded_data(self):
+        return (
+            list(Rug.objects.order_by("pk").values_list("title", "description", "price", "status", "date_created")),
+            list(User.objects.order_by("pk").values_list("username", "password")),
+            list(Order.objects.order_by("pk").values_list("user__username", "price", "status", "date_placed")),
+        )
+
+    def test_seed_data_is_deterministic(self):
+        seed_data(rugs=100, users=5, orders=20, cart_items=10, seed=7, batch_size=10)
+        first = self.get_seeded_data()
+        Order.objects.all().delete()
+        Rug.objects.all().delete()
+        User.objects.all().delete()
+        # The batch size doesn't change the data either
+        seed_data(rugs=100, users=5, orders=20, cart_items=10, seed=7, batch_size=33)
+        self.assertEqual(self.get_seeded_data(), first)
+
+    def test_seed_data_command(self):
+        output = StringIO()
+        call_command("seed_data", "--rugs=50", "--users=5", "--orders=10", "--cart-items=5", stdout=output)
+        self.assertEqual(Rug.objects.count(), 50)
+        self.assertIn("Created 50 rugs, 5 users, 10 orders", output.getvalue())
+
+
+class BenchmarkCommandTest(TestCase):
+
+    def run_benchmark(self, *args):
+        call_command(
+            "benchmark", "--use-existing-db", "--rugs=60", "--users=5", "--orders=5", "--cart-items=5",
+            "--iterations=4", *args, stdout=StringIO()
+        )
+
+    def test_benchmark(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = Path(directory) / "results.json"
+            self.run_benchmark(f"--output={output}")
+            results = json.loads(output.read_text())
+
+            self.assertEqual(results["meta"]["iterations"], 4)
+            self.assertIn("checkout", results["scenarios"])
+            for name, result in results["scenarios"].items():
+                self.assertEqual(result["errors"], 0, name)
+                self.assertLessEqual(result["p50_ms"], result["p95_ms"])
+                self.assertLessEqual(result["p95_ms"], result["p99_ms"])
+                self.assertGreater(result["rps"], 0)
+            self.assertEqual(results["scenarios"]["rug_list"]["max_queries"], 2)
+
+            # Queries per request can't go up against the same data
+            results["scenarios"]["rug_list"]["queries_per_request"] = 0
+            output.write_text(json.dumps(results))
+            with self.assertRaisesMessage(CommandError, "rug_list"):
+                self.run_benchmark("--skip-seed", "--scenario=rug_list", f"--compare={output}", "--fail-threshold=1000")
+
+    def test_unknown_scenario(self):
+        with self.assertRaises(CommandError):
+            self.run_benchmark("--scenario=nope")
+
+
+class ConcurrencyBenchmarkCommandTest(TransactionTestCase):
+    # The WSGI and ASGI runs query from other threads, which can only see committed data
+
+    def test_benchmark_concurrency(self):
+        output = StringIO()
+        call_command(
+            "benchmark_concurrency", "--use-existing-db", "--rugs=20", "--users=3", "--orders=3", "--cart-items=3",
+            "--clients=4", "--requests=5", "--workers=2", "--client-delay=0", "--db-latency=0", stdout=output
+        )
+        rows = {line.split()[0]: line.split() for line in output.getvalue().splitlines()[1:]}
+        self.assertEqual(set(rows), {"wsgi", "asgi", "asgi-async"})
+        for mode, row in rows.items():
+            # 20 requests, no errors
+            self.assertEqual(row[1], "20", mode)
+            self.assertEqual(row[-1], "0", mode)
+
+
+class StartupBenchmarkCommandTest(SimpleTestCase):
+
+    def test_parse_importtime(self):
+        output = "\n".join([
+            "import time: self [us] | cumulative | imported package",
+            "import time:       120 |        120 |   django.utils",
+            "import time:       300 |        420 | django",
+            REQUEST_MARKER,
+            "import time:        50 |         50 | rugs_app.views",
+        ])
+        self.assertEqual(parse_importtime(output), {
+            "startup": {"django.utils": (120, 120), "django": (300, 420)},
+            "request": {"rugs_app.views": (50, 50)},
+        })
+
+    def test_benchmark_startup(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = Path(directory) / "results.json"
+            call_command("benchmark_startup", "--runs=1", "--by-module", f"--output={output}", stdout=StringIO())
+            results = json.loads(output.read_text())
+
+        self.assertEqual(results["module"], "server.wsgi")
+        self.assertGreater(results["import_ms"], 0)
+        self.assertIn("django.core.wsgi", results["phases"]["startup"])
+        # The schema and docs views are only imported when their URLs are hit
+        self.assertNotIn("drf_spectacular.views", results["phases"]["startup"])
@@ -0,0 +1,176 @@
+import sqlite3
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from dj_db_conn_pool.core import pool_container
+from django.db import connections
+from django.db.backends.sqlite3.base import DatabaseWrapper as SQLiteDatabaseWrapper
+from django.test import SimpleTestCase
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from ..db.backends.mixins import ConnectionMetricsMixin
+from ..db.backends.pooled_postgresql.base import DatabaseWrapper as PooledPostgreSQLDatabaseWrapper
+from ..metrics import registry, render_metrics
+
+
+class DatabaseWrapper(ConnectionMetricsMixin, SQLiteDatabaseWrapper):
+    pool_timeout_error = TimeoutError
+
+
+class TestPool:
+    """
+    Stands in for SQLAlchemy's QueuePool, with the counts the mixin reads,
+    for connections made by PooledConnection.
+    """
+
+    def __init__(self, size, max_overflow):
+        self.pool_size = size
+        self.max_overflow = max_overflow
+        self.in_use = 0
+        self.idle = 0
+
+    def size(self):
+        return self.pool_size
+
+    def checkedout(self):
+        return self.in_use
+
+    def checkedin(self):
+        return self.idle
+
+
+class PooledConnection(sqlite3.Connection):
+    _pool = None
+
+    def __init__(self, *args, **kwargs):
+        if self._pool.in_use >= self._pool.pool_size + self._pool.max_overflow:
+            raise TimeoutError("pool exhausted")
+        super().__init__(*args, **kwargs)
+        self._pool.in_use += 1
+        self._pool.idle = max(self._pool.idle - 1, 0)
+
+    def close(self):
+        self._pool.in_use -= 1
+        self._pool.idle += 1
+        super().close()
+
+
+def get_metric(name, **labels):
+    counters, gauges, histograms = registry.collect()
+    key = (name, tuple(sorted(labels.items())))
+    return histograms[key]["count"] if key in histograms else counters.get(key, gauges.get(key))
+
+
+class ConnectionMetricsTest(SimpleTestCase):
+
+    def setUp(self):
+        registry.reset()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.name = str(Path(directory.name) / "db.sqlite3")
+
+    def create_wrapper(self, **settings):
+        wrapper = DatabaseWrapper({**connections["default"].settings_dict, "NAME": self.name, **settings}, "test")
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def test_connection_wait(self):
+        wrapper = self.create_wrapper()
+        wrapper.ensure_connection()
+        wrapper.ensure_connection()
+        self.assertEqual(get_metric("rugs_db_connection_wait_seconds", database="test"), 1)
+        # No pool, no pool metrics
+        self.assertIsNone(get_metric("rugs_db_pool_connections", database="test", state="in_use"))
+
+    def test_health_check(self):
+        wrapper = self.create_wrapper(CONN_MAX_AGE=None, CONN_HEALTH_CHECKS=True)
+        wrapper.cursor().close()
+        connection = wrapper.connection
+
+        # Only checked once a request starts
+        wrapper.is_usable = lambda: False
+        wrapper.cursor().close()
+        self.assertIs(wrapper.connection, connection)
+
+        wrapper.close_if_unusable_or_obsolete()
+        wrapper.cursor().close()
+        self.assertIsNot(wrapper.connection, connection)
+        self.assertEqual(get_metric("rugs_db_health_check_failures_total", database="test"), 1)
+        # Once per request
+        connection = wrapper.connection
+        wrapper.cursor().close()
+        self.assertIs(wrapper.connection, connection)
+
+    def test_health_check_disabled(self):
+        wrapper = self.create_wrapper(CONN_MAX_AGE=None)
+        wrapper.cursor().close()
+        connection = wrapper.connection
+        wrapper.is_usable = lambda: False
+        wrapper.close_if_unusable_or_obsolete()
+        wrapper.cursor().close()
+        self.assertIs(wrapper.connection, connection)
+        self.assertIsNone(get_metric("rugs_db_health_check_failures_total", database="test"))
+
+    def test_pool_metrics(self):
+        pool = TestPool(size=1, max_overflow=1)
+        connection_class = type("TestPooledConnection", (PooledConnection,), {"_pool": pool})
+        wrappers = [self.create_wrapper(OPTIONS={"factory": connection_class}) for _ in range(3)]
+
+        wrappers[0].ensure_connection()
+        self.assertEqual(get_metric("rugs_db_pool_connections", database="test", state="in_use"), 1)
+        self.assertIsNone(get_metric("rugs_db_pool_overflow_total", database="test"))
+
+        wrappers[1].ensure_connection()
+        self.assertEqual(get_metric("rugs_db_pool_overflow_total", database="test"), 1)
+        with self.assertRaises(TimeoutError):
+            wrappers[2].ensure_connection()
+        self.assertEqual(get_metric("rugs_db_pool_timeouts_total", database="test"), 1)
+
+        wrappers[1].close()
+        self.assertEqual(get_metric("rugs_db_pool_connections", database="test", state="in_use"), 1)
+        self.assertEqual(get_metric("rugs_db_pool_connections", database="test", state="idle"), 1)
+        self.assertIn('rugs_db_pool_connections{database="test",state="idle"} 1', render_metrics())
+        self.assertIn("# TYPE rugs_db_pool_connections gauge", render_metrics())
+
+
+class PooledPostgreSQLTest(SimpleTestCase):
+    """
+    Runs the production backend against SQLAlchemy's real pool, with stand-in
+    psycopg2 connections, as there's no PostgreSQL server to test against.
+    """
+    alias = "pooled_test"
+
+    def setUp(self):
+        registry.reset()
+        self.addCleanup(self.dispose_pool)
+
+    def dispose_pool(self):
+        pool = pool_container.pop(self.alias, None)
+        if pool is not None:
+            pool.dispose()
+
+    def create_wrapper(self):
+        settings = {
+            **connections["default"].settings_dict,
+            "ENGINE": "rugs_app.db.backends.pooled_postgresql",
+            "NAME": "rugs",
+            "POOL_OPTIONS": {"POOL_SIZE": 1, "MAX_OVERFLOW": 0, "TIMEOUT": 0.01},
+        }
+        wrapper = PooledPostgreSQLDatabaseWrapper(settings, self.alias)
+        # In place of psycopg2.connect
+        wrapper._get_new_connection = lambda conn_params: mock.MagicMock()
+        return wrapper
+
+    def test_pool_metrics(self):
+        wrappers = [self.create_wrapper(), self.create_wrapper()]
+        connection = wrappers[0].get_new_connection({})
+        self.assertEqual(get_metric("rugs_db_pool_connections", database=self.alias, state="in_use"), 1)
+
+        with self.assertRaises(PoolTimeoutError):
+            wrappers[1].get_new_connection({})
+        self.assertEqual(get_metric("rugs_db_pool_timeouts_total", database=self.alias), 1)
+
+        wrappers[0].connection = connection
+        wrappers[0]._close()
+        self.assertEqual(get_metric("rugs_db_pool_connections", database=self.alias, state="idle"), 1)
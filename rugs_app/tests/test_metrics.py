@@ -0,0 +1,113 @@
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from ..metrics import MetricsRegistry, registry
+from ..models import Rug, User
+
+
+@override_settings(PERFORMANCE_METRICS=True, SLOW_REQUEST_THRESHOLD=60000, METRICS_TOKEN="scrape")
+class MetricsViewTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.superuser = User.objects.create_superuser(username="admin", email="admin@gmail.com", password="admin")
+        cls.regular_user = User.objects.create_user(username="test", email="test@gmail.com", password="test")
+        cls.rug = Rug.objects.create(title="Test1", description="Testing1", price=4.99)
+
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+        self.client = APIClient()
+
+    def get_metrics(self, user=None, token="scrape"):
+        if user is not None:
+            self.client.force_authenticate(user)
+            return self.client.get("/api/metrics")
+        return self.client.get("/api/metrics", HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def test_metrics_restricted(self):
+        # Not even from localhost, which is where requests behind a reverse proxy come from
+        self.assertEqual(self.client.get("/api/metrics", REMOTE_ADDR="127.0.0.1").status_code, 401)
+        self.assertEqual(self.get_metrics(token="wrong").status_code, 401)
+        self.assertEqual(self.get_metrics(self.regular_user).status_code, 403)
+        self.assertEqual(self.get_metrics(self.superuser).status_code, 200)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.get_metrics().status_code, 200)
+
+        with override_settings(METRICS_TOKEN=None):
+            self.assertEqual(self.get_metrics().status_code, 401)
+            self.assertEqual(self.get_metrics(token="").status_code, 401)
+
+    def test_request_metrics(self):
+        self.client.get("/api/rug")
+        self.client.get("/api/rug")
+        self.client.get("/api/rug/12345")
+
+        response = self.get_metrics()
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        text = response.content.decode()
+        self.assertIn("# TYPE rugs_http_requests_total counter", text)
+        self.assertIn('rugs_http_requests_total{method="GET",status="200",view="all_rugs"} 2', text)
+        self.assertIn('rugs_http_requests_total{method="GET",status="404",view="rug_detail"} 1', text)
+        self.assertIn('rugs_http_request_duration_seconds_bucket{view="all_rugs",le="+Inf"} 2', text)
+        self.assertIn('rugs_http_request_duration_seconds_count{view="all_rugs"} 2', text)
+        # The first request runs the count and page queries, the second is a cache hit
+        self.assertIn('rugs_db_queries_per_request_bucket{view="all_rugs",le="0.0"} 1', text)
+        self.assertIn('rugs_db_queries_per_request_bucket{view="all_rugs",le="2.0"} 2', text)
+        self.assertIn('rugs_db_queries_per_request_sum{view="all_rugs"} 2', text)
+
+    def test_checkout_metrics(self):
+        self.client.force_authenticate(self.regular_user)
+        self.client.post("/api/order")
+        self.client.post("/api/cart", {"rug": self.rug.pk}, format="json")
+        self.client.post("/api/order")
+
+        text = self.get_metrics().content.decode()
+        self.assertIn('rugs_checkout_total{result="failure"} 1', text)
+        self.assertIn('rugs_checkout_total{result="success"} 1', text)
+
+    def test_metrics_merged_across_processes(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            other_process = MetricsRegistry()
+            other_process.inc("rugs_checkout_total", {"result": "success"}, 2)
+            other_process.observe("rugs_db_queries_per_request", 4, {"view": "cart"})
+            other_process.flush(force=True)
+
+            registry.inc("rugs_checkout_total", {"result": "success"})
+            registry.observe("rugs_db_queries_per_request", 1, {"view": "cart"})
+
+            text = self.get_metrics().content.decode()
+        self.assertIn('rugs_checkout_total{result="success"} 3', text)
+        self.assertIn('rugs_db_queries_per_request_count{view="cart"} 2', text)
+        self.assertIn('rugs_db_queries_per_request_bucket{view="cart",le="1.0"} 1', text)
+        self.assertIn('rugs_db_queries_per_request_bucket{view="cart",le="5.0"} 2', text)
+
+    def test_exited_processes_taken_over(self):
+        exited = subprocess.Popen([sys.executable, "-c", ""])
+        exited.wait()
+        # Recorded as if by the exited process, which wrote its file before exiting
+        other_process = MetricsRegistry()
+        other_process.inc("rugs_checkout_total", {"result": "success"}, 2)
+        other_process.observe("rugs_db_queries_per_request", 4, {"view": "cart"})
+        other_process.set("rugs_db_pool_connections", 3, {"database": "default", "state": "idle"})
+        other_process.pid = exited.pid
+        other_process.process_id = f"{exited.pid}-exited"
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            other_process.flush(force=True)
+
+            registry.inc("rugs_checkout_total", {"result": "success"})
+            registry.set("rugs_db_pool_connections", 1, {"database": "default", "state": "idle"})
+
+            for _ in range(2):
+                text = self.get_metrics().content.decode()
+                self.assertIn('rugs_checkout_total{result="success"} 3', text)
+                self.assertIn('rugs_db_queries_per_request_count{view="cart"} 1', text)
+                # The exited process's connections are gone
+                self.assertIn('rugs_db_pool_connections{database="default",state="idle"} 1', text)
+                self.assertEqual(os.listdir(directory), [f"metrics-{registry.process_id}.json"])
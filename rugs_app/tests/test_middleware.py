@@ -0,0 +1,67 @@
+import json
+import re
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from ..models import Rug
+from ..serializer import RugSerializer
+
+to_representation = RugSerializer.to_representation
+
+
+def slow_representation(serializer, instance):
+    time.sleep(0.05)
+    return to_representation(serializer, instance)
+
+
+class PerformanceMiddlewareTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Rug.objects.create(title="Test1", description="Testing1", price=4.99)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_disabled(self):
+        self.assertNotIn("Server-Timing", self.client.get("/api/rug"))
+
+    @override_settings(PERFORMANCE_METRICS=True, SLOW_REQUEST_THRESHOLD=60000)
+    def test_server_timing(self):
+        response = self.client.get("/api/rug")
+        timing = response["Server-Timing"]
+        self.assertRegex(timing, r"total;dur=[\d.]+")
+        self.assertRegex(timing, r'serialize;dur=[\d.]+;desc="Serialization"')
+        self.assertRegex(timing, r'render;dur=[\d.]+;desc="Rendering"')
+        self.assertIn(f'size;desc="{len(response.content)} bytes"', timing)
+        # Count and page
+        self.assertIn('desc="2 queries"', timing)
+
+        # Served from the response cache, so nothing is serialized
+        timing = self.client.get("/api/rug")["Server-Timing"]
+        self.assertIn('desc="0 queries"', timing)
+        self.assertNotIn("serialize;", timing)
+
+    @override_settings(PERFORMANCE_METRICS=True, SLOW_REQUEST_THRESHOLD=60000)
+    def test_serialization_timed(self):
+        # The serializer's queries run inside the view, before the response is rendered
+        with mock.patch.object(RugSerializer, "to_representation", slow_representation):
+            timing = self.client.get(f"/api/rug/{Rug.objects.get().pk}")["Server-Timing"]
+        serialize_ms = float(re.search(r"serialize;dur=([\d.]+)", timing).group(1))
+        render_ms = float(re.search(r"render;dur=([\d.]+)", timing).group(1))
+        self.assertGreaterEqual(serialize_ms, 50)
+        self.assertLess(render_ms, 50)
+
+    @override_settings(PERFORMANCE_METRICS=True, SLOW_REQUEST_THRESHOLD=0)
+    def test_slow_request_logged(self):
+        with self.assertLogs("rugs_app.performance", "WARNING") as logs:
+            self.client.get("/api/rug?status=av")
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["event"], "slow_request")
+        self.assertEqual(record["view"], "all_rugs")
+        self.assertEqual(record["status"], 200)
+        self.assertEqual(record["queries"], 2)
+        self.assertTrue(all(re.match(r"\s*SELECT", query["sql"]) for query in record["sql"]))
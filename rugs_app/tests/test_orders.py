@@ -1,6 +1,17 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
 
-from ..models import Rug, User, Order
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .. import cart
+from ..models import Rug, RugHold, User, Order
+from ..serializer import RugSerializer
 
 
 class RugsViewTest(TestCase):
@@ -25,6 +36,9 @@ class RugsViewTest(TestCase):
         cls.orders[0].rugs.add(cls.rugs[1])
         cls.orders[1].rugs.add(cls.rugs[3])
 
+    def setUp(self):
+        cache.clear()
+
     def login_as_user(self, username, password):
         response = self.client.post(
             "/api/login",
@@ -131,6 +145,10 @@ class RugsViewTest(TestCase):
 
         self.assertEqual(cart_response.status_code, 200)
         self.assertEqual(len(cart_response.json()["results"]), 1)
+        self.assertNotIn("description", cart_response.json()["results"][0])
+
+        full_cart_response = self.client.get("/api/cart?fields=id,description", HTTP_AUTHORIZATION=f"Token {token}")
+        self.assertEqual(full_cart_response.json()["results"], [{"id": self.rugs[0].pk, "description": "Testing1"}])
 
         cart_price_response = self.client.get("/api/cart/price", HTTP_AUTHORIZATION=f"Token {token}")
         self.assertEqual(float(cart_price_response.json()["price"]), self.rugs[0].price)
@@ -256,6 +274,7 @@ class RugsViewTest(TestCase):
             HTTP_AUTHORIZATION=f"Token {token}"
         )
         self.assertEqual(modify_order_response.status_code, 403)
+        self.assertIsNone(Order.objects.get(pk=self.orders[0].pk).date_completed)
 
     def test_modify_order_correct_user(self):
         token = self.login_as_user(username=self.regular_user1.username, password="test")
@@ -289,6 +308,18 @@ class RugsViewTest(TestCase):
         self.assertEqual(orders_response.json()["status"], Order.OrderStatus.READY_FOR_PICKUP)
         self.assertIsNotNone(orders_response.json()["date_ready"])
 
+    def test_replace_order_keeps_dates(self):
+        # Only a PATCH stamps the date of a status change; a PUT sets the dates it's given
+        token = self.login_as_user(username=self.superuser.username, password="admin")
+        order = self.client.get(f"/api/order/{self.orders[0].pk}", HTTP_AUTHORIZATION=f"Token {token}").json()
+        order["status"] = Order.OrderStatus.COMPLETE
+        response = self.client.put(
+            f"/api/order/{self.orders[0].pk}", order, "application/json", HTTP_AUTHORIZATION=f"Token {token}"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["status"], Order.OrderStatus.COMPLETE)
+        self.assertIsNone(response.json()["date_completed"])
+
     def test_delete_order_not_authenticated(self):
         delete_order_response = self.client.delete(f"/api/order/{self.orders[0].pk}")
         self.assertEqual(delete_order_response.status_code, 401)
@@ -315,3 +346,454 @@ class RugsViewTest(TestCase):
 
         orders_response = self.client.get(f"/api/order/{self.orders[0].pk}", HTTP_AUTHORIZATION=f"Token {token}")
         self.assertEqual(orders_response.status_code, 404)
+
+    def test_place_order_invalidates_rug_cache(self):
+        token = self.login_as_user(username=self.regular_user1.username, password="test")
+        self.assertEqual(self.client.get("/api/rug?status=av").json()["count"], 2)
+
+        self.client.post(
+            "/api/cart",
+            {"rug": self.rugs[0].pk},
+            "application/json",
+            HTTP_AUTHORIZATION=f"Token {token}"
+        )
+        place_order_response = self.client.post("/api/order", HTTP_AUTHORIZATION=f"Token {token}")
+        self.assertEqual(place_order_response.status_code, 201)
+
+        self.assertEqual(self.client.get("/api/rug?status=av").json()["count"], 1)
+        self.assertEqual(self.client.get(f"/api/rug/{self.rugs[0].pk}").json()["status"], Rug.RugStatus.NOT_AVAILABLE)
+
+    def test_conditional_get_orders(self):
+        token = self.login_as_user(username=self.regular_user1.username, password="test")
+
+        orders_response = self.client.get("/api/order", HTTP_AUTHORIZATION=f"Token {token}")
+        self.assertIn("Authorization", orders_response["Vary"])
+        not_modified_response = self.client.get(
+            "/api/order", HTTP_AUTHORIZATION=f"Token {token}", HTTP_IF_NONE_MATCH=orders_response["ETag"]
+        )
+        self.assertEqual(not_modified_response.status_code, 304)
+
+        order_response = self.client.get(f"/api/order/{self.orders[0].pk}", HTTP_AUTHORIZATION=f"Token {token}")
+        self.assertEqual(self.client.get(
+            f"/api/order/{self.orders[0].pk}",
+            HTTP_AUTHORIZATION=f"Token {token}",
+            HTTP_IF_NONE_MATCH=order_response["ETag"]
+        ).status_code, 304)
+
+        self.client.patch(
+            f"/api/order/{self.orders[0].pk}",
+            {"status": Order.OrderStatus.COMPLETE},
+            "application/json",
+            HTTP_AUTHORIZATION=f"Token {token}"
+        )
+        self.assertEqual(self.client.get(
+            "/api/order", HTTP_AUTHORIZATION=f"Token {token}", HTTP_IF_NONE_MATCH=orders_response["ETag"]
+        ).status_code, 200)
+        self.assertEqual(self.client.get(
+            f"/api/order/{self.orders[0].pk}",
+            HTTP_AUTHORIZATION=f"Token {token}",
+            HTTP_IF_NONE_MATCH=order_response["ETag"]
+        ).status_code, 200)
+
+    def test_conditional_get_orders_rug_deleted(self):
+        token = self.login_as_user(username=self.regular_user1.username, password="test")
+        orders_response = self.client.get("/api/order", HTTP_AUTHORIZATION=f"Token {token}")
+        order_response = self.client.get(f"/api/order/{self.orders[0].pk}", HTTP_AUTHORIZATION=f"Token {token}")
+
+        self.rugs[1].delete()
+        self.assertEqual(self.client.get(
+            "/api/order", HTTP_AUTHORIZATION=f"Token {token}", HTTP_IF_NONE_MATCH=orders_response["ETag"]
+        ).status_code, 200)
+        order_response = self.client.get(
+            f"/api/order/{self.orders[0].pk}",
+            HTTP_AUTHORIZATION=f"Token {token}",
+            HTTP_IF_NONE_MATCH=order_response["ETag"]
+        )
+        self.assertEqual(order_response.status_code, 200)
+        self.assertEqual(order_response.json()["rugs"], [])
+
+    def test_conditional_get_order_wrong_user(self):
+        token = self.login_as_user(username=self.regular_user2.username, password="test")
+
+        order_response = self.client.get(
+            f"/api/order/{self.orders[0].pk}",
+            HTTP_AUTHORIZATION=f"Token {token}",
+            HTTP_IF_MODIFIED_SINCE="Fri, 01 Jan 2100 00:00:00 GMT"
+        )
+        self.assertEqual(order_response.status_code, 403)
+        self.assertFalse(order_response.has_header("ETag"))
+
+    def test_conditional_get_cart(self):
+        token = self.login_as_user(username=self.regular_user1.username, password="test")
+
+        cart_response = self.client.get("/api/cart", HTTP_AUTHORIZATION=f"Token {token}")
+        self.assertEqual(self.client.get(
+            "/api/cart", HTTP_AUTHORIZATION=f"Token {token}", HTTP_IF_NONE_MATCH=cart_response["ETag"]
+        ).status_code, 304)
+
+        self.client.post(
+            "/api/cart",
+            {"rug": self.rugs[0].pk},
+            "application/json",
+            HTTP_AUTHORIZATION=f"Token {token}"
+        )
+        modified_response = self.client.get(
+            "/api/cart", HTTP_AUTHORIZATION=f"Token {token}", HTTP_IF_NONE_MATCH=cart_response["ETag"]
+        )
+        self.assertEqual(modified_response.status_code, 200)
+        self.assertEqual(len(modified_response.json()["results"]), 1)
+
+        other_token = self.login_as_user(username=self.regular_user2.username, password="test")
+        self.assertEqual(self.client.get(
+            "/api/cart", HTTP_AUTHORIZATION=f"Token {other_token}", HTTP_IF_NONE_MATCH=modified_response["ETag"]
+        ).status_code, 200)
+
+    def place_order_with_rugs(self, token, rugs):
+        for rug in rugs:
+            self.client.post("/api/cart", {"rug": rug.pk}, "application/json", HTTP_AUTHORIZATION=f"Token {token}")
+        with CaptureQueriesContext(connection) as queries:
+            place_order_response = self.client.post("/api/order", HTTP_AUTHORIZATION=f"Token {token}")
+        return place_order_response, len(queries)
+
+    def test_place_order_constant_queries(self):
+        token = self.login_as_user(username=self.regular_user1.username, password="test")
+        extra_rugs = [Rug.objects.create(title=f"Extra{i}", description="Extra", price=1) for i in range(5)]
+
+        small_order_response, small_order_queries = self.place_order_with_rugs(token, [self.rugs[0]])
+        large_order_response, large_order_queries = self.place_order_with_rugs(token, extra_rugs)
+
+        self.assertEqual(small_order_response.status_code, 201)
+        self.assertEqual(large_order_response.status_code, 201)
+        self.assertEqual(small_order_queries, large_order_queries)
+
+        self.assertEqual(large_order_response.json()["rug_count"], 5)
+        self.assertEqual(float(large_order_response.json()["price"]), 5)
+        self.assertEqual(sorted(large_order_response.json()["rugs"]), [rug.pk for rug in extra_rugs])
+        self.assertFalse(Rug.objects.filter(pk__in=[rug.pk for rug in extra_rugs], status=Rug.RugStatus.AVAILABLE).exists())
+        self.assertFalse(self.regular_user1.cart.exists())
+
+    def test_place_order_rug_already_ordered(self):
+        token1 = self.login_as_user(username=self.regular_user1.username, password="test")
+        token2 = self.login_as_user(username=self.regular_user2.username, password="test")
+        for token in (token1, token2):
+            self.client.post("/api/cart", {"rug": self.rugs[0].pk}, "application/json", HTTP_AUTHORIZATION=f"Token {token}")
+        self.client.post("/api/cart", {"rug": self.rugs[2].pk}, "application/json", HTTP_AUTHORIZATION=f"Token {token2}")
+
+        self.assertEqual(self.client.post("/api/order", HTTP_AUTHORIZATION=f"Token {token1}").status_code, 201)
+        self.assertEqual(self.client.post("/api/order", HTTP_AUTHORIZATION=f"Token {token2}").status_code, 400)
+
+        # The failed checkout changes nothing
+        self.assertEqual(Order.objects.filter(user=self.regular_user2).count(), 1)
+        self.assertEqual(Rug.objects.get(pk=self.rugs[2].pk).status, Rug.RugStatus.AVAILABLE)
+        self.assertEqual(self.regular_user2.cart.count(), 2)
+
+    def test_place_order_price_too_large(self):
+        token = self.login_as_user(username=self.regular_user1.username, password="test")
+        expensive_rugs = [Rug.objects.create(title=f"Expensive{i}", description="Extra", price=9000) for i in range(2)]
+
+        place_order_response, _ = self.place_order_with_rugs(token, expensive_rugs)
+        self.assertEqual(place_order_response.status_code, 400)
+        self.assertIn("price", place_order_response.json())
+        self.assertTrue(Rug.objects.filter(pk=expensive_rugs[0].pk, status=Rug.RugStatus.AVAILABLE).exists())
+
+
+class OrderListQueriesTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.superuser = User.objects.create_superuser(username="admin", email="admin@gmail.com", password="admin")
+        cls.regular_user = User.objects.create_user(username="test", email="test@gmail.com", password="test")
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def create_orders(self, count, rugs_per_order):
+        for i in range(count):
+            rugs = [
+                Rug.objects.create(title=f"Test{i}-{j}", description="Testing", price=1, status=Rug.RugStatus.NOT_AVAILABLE)
+                for j in range(rugs_per_order)
+            ]
+            order = Order.objects.create(user=self.regular_user, rug_count=len(rugs), price=len(rugs))
+            order.rugs.add(*rugs)
+
+    def test_get_orders_queries(self):
+        self.client.force_authenticate(self.superuser)
+        self.create_orders(1, 1)
+        # Count, orders, and one prefetch of every order's rugs
+        with self.assertNumQueries(3):
+            self.assertEqual(self.client.get("/api/order").status_code, 200)
+
+        self.create_orders(7, 3)
+        with self.assertNumQueries(3):
+            orders_response = self.client.get("/api/order")
+        self.assertEqual(len(orders_response.json()["results"]), 8)
+        self.assertEqual(len(orders_response.json()["results"][0]["rugs"]), 3)
+
+        self.client.force_authenticate(self.regular_user)
+        with self.assertNumQueries(3):
+            self.assertEqual(self.client.get("/api/order").json()["count"], 8)
+
+    def test_get_orders_expand_rugs(self):
+        self.client.force_authenticate(self.regular_user)
+        self.create_orders(5, 2)
+
+        with CaptureQueriesContext(connection) as queries:
+            orders_response = self.client.get("/api/order?expand=rugs")
+        self.assertEqual(len(queries), 3)
+        self.assertFalse(any("description" in query["sql"] for query in queries.captured_queries))
+
+        order = Order.objects.get(pk=orders_response.json()["results"][0]["id"])
+        embedded_rugs = orders_response.json()["results"][0]["rugs"]
+        self.assertEqual({rug["id"] for rug in embedded_rugs}, set(order.rugs.values_list("pk", flat=True)))
+        self.assertEqual(set(embedded_rugs[0]), {"id", "title", "price", "image_url", "status"})
+
+    def test_conditional_get_orders_expand_rugs(self):
+        self.client.force_authenticate(self.regular_user)
+        self.create_orders(1, 1)
+        orders_response = self.client.get("/api/order?expand=rugs")
+        self.assertEqual(self.client.get(
+            "/api/order?expand=rugs", HTTP_IF_NONE_MATCH=orders_response["ETag"]
+        ).status_code, 304)
+
+        rug = Rug.objects.get()
+        rug.title = "Renamed"
+        rug.save()
+        orders_response = self.client.get("/api/order?expand=rugs", HTTP_IF_NONE_MATCH=orders_response["ETag"])
+        self.assertEqual(orders_response.status_code, 200)
+        self.assertEqual(orders_response.json()["results"][0]["rugs"][0]["title"], "Renamed")
+
+    def test_get_rugs_by_order_queries(self):
+        self.create_orders(1, 1)
+        order = Order.objects.get()
+
+        self.client.force_authenticate(self.regular_user)
+        with self.assertNumQueries(2):
+            self.assertEqual(len(self.client.get(f"/api/rug/by-order/{order.pk}").json()["results"]), 1)
+
+        self.client.force_authenticate(self.superuser)
+        with self.assertNumQueries(2):
+            self.assertEqual(len(self.client.get(f"/api/rug/by-order/{order.pk}").json()["results"]), 1)
+
+    def test_get_rugs_by_order_paginated(self):
+        self.create_orders(1, 12)
+        order = Order.objects.get()
+        self.client.force_authenticate(self.regular_user)
+
+        first_page = self.client.get(f"/api/rug/by-order/{order.pk}?pagination=cursor").json()
+        second_page = self.client.get(first_page["next"]).json()
+        self.assertEqual(len(first_page["results"]), 8)
+        self.assertEqual(len(second_page["results"]), 4)
+        self.assertIsNone(second_page["next"])
+
+    def test_get_rugs_by_missing_order(self):
+        self.client.force_authenticate(self.regular_user)
+        self.assertEqual(self.client.get("/api/rug/by-order/12345").status_code, 404)
+
+
+class CartSummaryTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="test", email="test@gmail.com", password="test")
+        cls.rugs = [Rug.objects.create(title=f"Test{i}", description="Testing", price=f"{i}.25") for i in range(1, 4)]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_get_cart_summary(self):
+        for rug in self.rugs:
+            self.client.post("/api/cart", {"rug": rug.pk}, format="json")
+
+        # Items, and the totals in one aggregate
+        with self.assertNumQueries(2):
+            summary = self.client.get("/api/cart/summary").json()
+        self.assertEqual(summary["count"], 3)
+        self.assertEqual(summary["total"], "6.75")
+        self.assertEqual(len(summary["items"]), 3)
+        self.assertEqual(set(summary["items"][0]), set(RugSerializer.card_fields))
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get("/api/cart/summary").json()["total"], "6.75")
+
+    def test_cart_totals_updated_incrementally(self):
+        self.client.get("/api/cart/price")
+
+        self.client.post("/api/cart", {"rug": self.rugs[0].pk}, format="json")
+        self.client.post("/api/cart", {"rug": self.rugs[0].pk}, format="json")
+        self.client.post("/api/cart", {"rug": self.rugs[1].pk}, format="json")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get("/api/cart/price").json()["price"], "3.50")
+
+        self.client.delete(f"/api/cart/{self.rugs[0].pk}")
+        self.client.delete(f"/api/cart/{self.rugs[2].pk}")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get("/api/cart/price").json()["price"], "2.25")
+
+        self.client.delete("/api/cart")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get("/api/cart/price").json()["price"], "0.00")
+
+    def concurrently(self, *rugs):
+        # Another request adds the rugs after this one has read the cart, but before it writes
+        add_cart_rows = cart.add_cart_rows
+
+        def add_after_other_request(user, rug_pks):
+            with mock.patch.object(cart, "add_cart_rows", add_cart_rows):
+                cart.update_cart(user, add=[rug.pk for rug in rugs])
+            return add_cart_rows(user, rug_pks)
+
+        return mock.patch.object(cart, "add_cart_rows", add_after_other_request)
+
+    def test_cart_totals_with_concurrent_add(self):
+        self.client.get("/api/cart/price")
+        with self.concurrently(self.rugs[0]):
+            self.client.post("/api/cart", {"rug": self.rugs[0].pk}, format="json")
+        self.assertEqual(self.client.get("/api/cart/summary").json()["count"], 1)
+        self.assertEqual(self.client.get("/api/cart/price").json()["price"], "1.25")
+
+        # Rows that were inserted, but over a change the totals didn't account for
+        with self.concurrently(self.rugs[1]):
+            self.client.post("/api/cart", {"rug": self.rugs[2].pk}, format="json")
+        self.assertEqual(self.client.get("/api/cart/summary").json()["count"], 3)
+        self.assertEqual(self.client.get("/api/cart/price").json()["price"], "6.75")
+
+    def test_cart_totals_follow_price_changes(self):
+        self.client.post("/api/cart", {"rug": self.rugs[0].pk}, format="json")
+        self.assertEqual(self.client.get("/api/cart/price").json()["price"], "1.25")
+
+        self.rugs[0].price = 10
+        self.rugs[0].save()
+        self.assertEqual(self.client.get("/api/cart/summary").json()["total"], "10.00")
+
+
+class CartBatchTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="test", email="test@gmail.com", password="test")
+        cls.rugs = [Rug.objects.create(title=f"Test{i}", description="Testing", price=1) for i in range(4)]
+        cls.sold_rug = Rug.objects.create(title="Sold", description="Testing", price=1, status=Rug.RugStatus.NOT_AVAILABLE)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_batch_update_cart(self):
+        self.user.cart.add(self.rugs[0], self.rugs[1])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post("/api/cart/batch", {
+                "add": [self.rugs[2].pk, self.rugs[3].pk, self.rugs[0].pk, self.sold_rug.pk, 12345],
+                "remove": [self.rugs[1].pk, 54321],
+            }, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            "add": [
+                {"rug": self.rugs[2].pk, "result": "added"},
+                {"rug": self.rugs[3].pk, "result": "added"},
+                {"rug": self.rugs[0].pk, "result": "already in cart"},
+                {"rug": self.sold_rug.pk, "result": "not available"},
+                {"rug": 12345, "result": "not found"},
+            ],
+            "remove": [
+                {"rug": self.rugs[1].pk, "result": "removed"},
+                {"rug": 54321, "result": "not found"},
+            ],
+        })
+        self.assertEqual(set(self.user.cart.values_list("pk", flat=True)), {self.rugs[0].pk, self.rugs[2].pk, self.rugs[3].pk})
+
+        # One validation query, one insert and one delete, and no write to the user row
+        statements = [query["sql"] for query in queries.captured_queries if "SAVEPOINT" not in query["sql"]]
+        self.assertEqual(len(statements), 3)
+        self.assertFalse(any("rugs_app_user\" SET" in statement for statement in statements))
+
+        self.assertEqual(self.client.get("/api/cart/summary").json()["count"], 3)
+
+    def test_batch_update_cart_invalid(self):
+        response = self.client.post("/api/cart/batch", {"add": [self.rugs[0].pk], "remove": [self.rugs[0].pk]}, format="json")
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post("/api/cart/batch", {"add": ["rug"]}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(self.user.cart.exists())
+
+    def test_missing_rug(self):
+        self.assertEqual(self.client.post("/api/cart", {"rug": 12345}, format="json").status_code, 400)
+        self.assertEqual(self.client.post("/api/cart", {}, format="json").status_code, 400)
+        self.assertEqual(self.client.delete("/api/cart/12345").status_code, 400)
+
+
+@override_settings(CART_RESERVATION_TTL=600)
+class CartReservationTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user1 = User.objects.create_user(username="test1", email="test1@gmail.com", password="test")
+        cls.user2 = User.objects.create_user(username="test2", email="test2@gmail.com", password="test")
+        cls.rugs = [Rug.objects.create(title=f"Test{i}", description="Testing", price=1) for i in range(3)]
+
+    def setUp(self):
+        cache.clear()
+        self.client1 = APIClient()
+        self.client1.force_authenticate(self.user1)
+        self.client2 = APIClient()
+        self.client2.force_authenticate(self.user2)
+
+    def expire_holds(self):
+        RugHold.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+    def test_add_to_cart_holds_rug(self):
+        self.assertEqual(self.client1.post("/api/cart", {"rug": self.rugs[0].pk}, format="json").status_code, 201)
+        hold = RugHold.objects.get()
+        self.assertEqual((hold.rug, hold.user), (self.rugs[0], self.user1))
+        self.assertGreater(hold.expires_at, timezone.now() + timedelta(seconds=590))
+
+        response = self.client2.post("/api/cart", {"rug": self.rugs[0].pk}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["error"], "rug is reserved")
+        response = self.client2.post("/api/cart/batch", {"add": [self.rugs[0].pk, self.rugs[1].pk]}, format="json")
+        self.assertEqual(
+            [result["result"] for result in response.json()["add"]],
+            ["reserved", "added"]
+        )
+        self.assertEqual(list(self.user2.cart.all()), [self.rugs[1]])
+
+    def test_expired_hold_can_be_taken_over(self):
+        self.client1.post("/api/cart", {"rug": self.rugs[0].pk}, format="json")
+        self.expire_holds()
+
+        self.assertEqual(self.client2.post("/api/cart", {"rug": self.rugs[0].pk}, format="json").status_code, 201)
+        self.assertEqual(RugHold.objects.get().user, self.user2)
+        self.assertFalse(self.user1.cart.exists())
+
+    def test_remove_from_cart_releases_hold(self):
+        self.client1.post("/api/cart/batch", {"add": [rug.pk for rug in self.rugs]}, format="json")
+        self.client1.delete(f"/api/cart/{self.rugs[0].pk}")
+        self.assertEqual(RugHold.objects.count(), 2)
+        self.client1.delete("/api/cart")
+        self.assertFalse(RugHold.objects.exists())
+
+    def test_checkout_with_reserved_rug(self):
+        # Added before reservations were turned on
+        self.user2.cart.add(self.rugs[0])
+        self.client1.post("/api/cart", {"rug": self.rugs[0].pk}, format="json")
+        self.assertFalse(self.user2.cart.exists())
+
+        self.user2.cart.add(self.rugs[0])
+        self.assertEqual(self.client2.post("/api/order").status_code, 400)
+        self.assertEqual(self.client1.post("/api/order").status_code, 201)
+        self.assertFalse(RugHold.objects.exists())
+
+    def test_release_expired_holds(self):
+        self.client1.post("/api/cart/batch", {"add": [self.rugs[0].pk, self.rugs[1].pk]}, format="json")
+        self.expire_holds()
+        self.client2.post("/api/cart", {"rug": self.rugs[2].pk}, format="json")
+
+        call_command("release_expired_holds", batch_size=1, verbosity=0)
+        self.assertEqual(list(RugHold.objects.values_list("rug", flat=True)), [self.rugs[2].pk])
+        self.assertFalse(self.user1.cart.exists())
+        self.assertEqual(list(self.user2.cart.all()), [self.rugs[2]])
+        self.assertEqual(self.client1.get("/api/cart/summary").json()["count"], 0)
@@ -0,0 +1,101 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ..models import EmailJob, Rug, User
+from ..outbox import process_outbox
+
+
+class FlakyEmailBackend(EmailBackend):
+    # Fails on the second batch it is given
+    calls = 0
+
+    def send_messages(self, messages):
+        FlakyEmailBackend.calls += 1
+        if FlakyEmailBackend.calls == 2:
+            raise ConnectionError("SMTP connection lost")
+        return super().send_messages(messages)
+
+
+class EmailOutboxTest(TestCase):
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.superuser = User.objects.create_superuser(username="admin", email="admin@gmail.com", password="admin")
+        cls.subscribers = [
+            User.objects.create_user(username=f"test{i}", email=f"test{i}@gmail.com", password="test",
+                                     receive_emails_new_rugs=True)
+            for i in range(5)
+        ]
+        User.objects.create_user(username="unsubscribed", email="unsubscribed@gmail.com", password="test")
+
+    def create_rug(self):
+        self.client.force_authenticate(self.superuser)
+        response = self.client.post(
+            "/api/rug",
+            {"title": "Test", "description": "Testing", "price": "3.99"},
+            format="json"
+        )
+        self.assertEqual(response.status_code, 201)
+        return Rug.objects.get(pk=response.json()["id"])
+
+    def test_create_rug_enqueues_announcement(self):
+        self.create_rug()
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(EmailJob.objects.filter(status=EmailJob.JobStatus.PENDING).count(), 1)
+
+    def test_process_outbox(self):
+        rug = self.create_rug()
+        with self.assertNumQueries(6):
+            # Jobs, claim, two recipient batches with their progress, and the result
+            self.assertEqual(process_outbox(batch_size=3), 1)
+
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), [user.email for user in self.subscribers])
+        self.assertIn(f"/rug/{rug.id}", mail.outbox[0].body)
+        job = EmailJob.objects.get()
+        self.assertEqual(job.status, EmailJob.JobStatus.SENT)
+        self.assertEqual(job.last_recipient_id, self.subscribers[-1].pk)
+
+        # Nothing is sent twice
+        self.assertEqual(process_outbox(), 0)
+        self.assertEqual(len(mail.outbox), len(self.subscribers))
+
+    @override_settings(EMAIL_BACKEND="rugs_app.tests.test_outbox.FlakyEmailBackend", EMAIL_OUTBOX_RETRY_DELAY=60)
+    def test_failed_job_resumes_after_backoff(self):
+        FlakyEmailBackend.calls = 0
+        self.create_rug()
+        self.assertEqual(process_outbox(batch_size=2), 0)
+
+        job = EmailJob.objects.get()
+        self.assertEqual(job.status, EmailJob.JobStatus.PENDING)
+        self.assertEqual(job.attempts, 1)
+        self.assertIn("SMTP connection lost", job.last_error)
+        self.assertGreater(job.available_at, timezone.now() + timedelta(seconds=50))
+        self.assertEqual(len(mail.outbox), 2)
+
+        # Not due yet
+        self.assertEqual(process_outbox(batch_size=2), 0)
+
+        with mock.patch("rugs_app.outbox.timezone.now", return_value=timezone.now() + timedelta(minutes=2)):
+            self.assertEqual(process_outbox(batch_size=2), 1)
+        # The first batch isn't sent again
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), [user.email for user in self.subscribers])
+
+    @override_settings(EMAIL_BACKEND="rugs_app.tests.test_outbox.FlakyEmailBackend", EMAIL_OUTBOX_MAX_ATTEMPTS=1)
+    def test_job_fails_after_max_attempts(self):
+        FlakyEmailBackend.calls = 0
+        self.create_rug()
+        process_outbox(batch_size=2)
+        self.assertEqual(EmailJob.objects.get().status, EmailJob.JobStatus.FAILED)
+
+    def test_process_email_outbox_command(self):
+        self.create_rug()
+        call_command("process_email_outbox", verbosity=0)
+        self.assertEqual(len(mail.outbox), len(self.subscribers))
@@ -0,0 +1,156 @@
+from collections import namedtuple
+from types import SimpleNamespace
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+from rest_framework.test import APIClient
+
+from .. import urls
+from ..authentication import create_token
+from ..models import Order, Rug, User
+
+# One request per URL name and method, with the most queries it may make. Budgets
+# must not depend on the amount of data: each request runs against datasets of
+# every size in DATASET_SIZES and has to make the same number of queries in all of
+# them. `user` is "user", "staff" or None for an anonymous request; `kwargs` and
+# `data` build the URL arguments and request body from the dataset.
+Endpoint = namedtuple("Endpoint", "name method budget user kwargs data query", defaults=("user", None, None, ""))
+
+QUERY_BUDGETS = [
+    # Authentication
+    Endpoint("register", "post", 6, user=None, data=lambda d: {
+        "username": "newuser", "email": "newuser@gmail.com", "password": "test", "confirmation": "test"
+    }),
+    Endpoint("login", "post", 3, user=None, data=lambda d: {"username": d.user.username, "password": "test"}),
+    Endpoint("logout", "post", 2),
+    Endpoint("verify-password", "post", 2, data=lambda d: {"password": "test"}),
+    Endpoint("authenticated", "get", 2),
+    Endpoint("user", "patch", 3, data=lambda d: {"receive_emails_new_rugs": True}),
+    Endpoint("admin", "get", 2, user="staff"),
+
+    # Rugs
+    Endpoint("all_rugs", "get", 2, user=None),
+    Endpoint("all_rugs", "get", 1, user=None, query="pagination=cursor"),
+    Endpoint("all_rugs", "get", 2, user=None, query="search=Test&ordering=-price"),
+    Endpoint("all_rugs", "post", 3, user="staff", data=lambda d: {
+        "title": "New", "description": "New rug", "price": "9.99"
+    }),
+    Endpoint("rug_detail", "get", 1, user=None, kwargs=lambda d: {"pk": d.available[0].pk}),
+    Endpoint("rug_detail", "patch", 3, user="staff", kwargs=lambda d: {"pk": d.available[0].pk},
+             data=lambda d: {"price": "12.99"}),
+    Endpoint("rug_detail", "delete", 7, user="staff", kwargs=lambda d: {"pk": d.cart[0].pk}),
+    Endpoint("rugs_by_order", "get", 3, kwargs=lambda d: {"pk": d.orders[0].pk}),
+    Endpoint("rugs_by_order", "get", 3, user="staff", kwargs=lambda d: {"pk": d.orders[0].pk}),
+
+    # Orders
+    Endpoint("all_orders", "get", 4),
+    Endpoint("all_orders", "get", 4, query="expand=rugs"),
+    Endpoint("all_orders", "get", 4, user="staff"),
+    Endpoint("all_orders", "post", 8),
+    Endpoint("order_detail", "get", 3, kwargs=lambda d: {"pk": d.orders[0].pk}),
+    Endpoint("order_detail", "patch", 5, kwargs=lambda d: {"pk": d.orders[0].pk},
+             data=lambda d: {"status": Order.OrderStatus.READY_FOR_PICKUP}),
+    Endpoint("order_detail", "delete", 4, kwargs=lambda d: {"pk": d.orders[0].pk}),
+
+    # Cart
+    Endpoint("cart", "get", 3),
+    Endpoint("cart", "post", 3, data=lambda d: {"rug": d.available[0].pk}),
+    Endpoint("cart", "delete", 2),
+    Endpoint("cart_detail", "get", 2, kwargs=lambda d: {"pk": d.cart[0].pk}),
+    Endpoint("cart_detail", "delete", 3, kwargs=lambda d: {"pk": d.cart[0].pk}),
+    Endpoint("cart_price", "get", 2),
+    Endpoint("cart_summary", "get", 3),
+    Endpoint("cart_batch", "post", 4, data=lambda d: {
+        "add": [rug.pk for rug in d.available], "remove": [rug.pk for rug in d.cart]
+    }),
+
+    # Metrics
+    Endpoint("metrics", "get", 1, user="staff"),
+
+    # Swagger
+    Endpoint("schema", "get", 0, user=None),
+    Endpoint("swagger-ui", "get", 0, user=None),
+]
+
+# Kept below the page size, so every listed row is also serialized
+DATASET_SIZES = (2, 6)
+
+
+class QueryBudgetTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.password = make_password("test")
+
+    def setUp(self):
+        cache.clear()
+
+    def create_dataset(self, n):
+        """
+        Creates `n` of everything: available rugs, cart entries, orders for the
+        user and for someone else, and rugs per order.
+        """
+        users = User.objects.bulk_create([
+            User(username=f"user{n}", email=f"user{n}@gmail.com", password=self.password),
+            User(username=f"other{n}", email=f"other{n}@gmail.com", password=self.password),
+            User(username=f"staff{n}", email=f"staff{n}@gmail.com", password=self.password, is_staff=True),
+        ])
+        user, other, staff = User.objects.filter(pk__in=[u.pk for u in users]).order_by("pk")
+        rugs = Rug.objects.bulk_create(
+            Rug(title=f"Test{i}", description=f"Testing{i}", price=i + 0.99) for i in range(2 * n)
+        )
+        dataset = SimpleNamespace(user=user, staff=staff, cart=rugs[:n], available=rugs[n:], orders=[])
+        user.cart.add(*dataset.cart)
+        other.cart.add(*dataset.cart)
+
+        for owner in (user, other):
+            for i in range(n):
+                sold = Rug.objects.bulk_create(
+                    Rug(title=f"Sold{i}", description=f"Sold{i}", price=1, status=Rug.RugStatus.NOT_AVAILABLE)
+                    for _ in range(n)
+                )
+                order = Order.objects.create(user=owner, rug_count=n, price=n)
+                order.rugs.add(*sold)
+                if owner == user:
+                    dataset.orders.append(order)
+
+        dataset.tokens = {"user": create_token(user)[1], "staff": create_token(staff)[1]}
+        return dataset
+
+    def count_queries(self, endpoint, n):
+        with transaction.atomic():
+            dataset = self.create_dataset(n)
+            client = APIClient()
+            if endpoint.user:
+                client.credentials(HTTP_AUTHORIZATION=f"Token {dataset.tokens[endpoint.user]}")
+            url = reverse(endpoint.name, kwargs=endpoint.kwargs(dataset) if endpoint.kwargs else None)
+            if endpoint.query:
+                url = f"{url}?{endpoint.query}"
+            data = endpoint.data(dataset) if endpoint.data else None
+            # Measure the uncached path
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = getattr(client, endpoint.method)(url, data, format="json")
+            transaction.set_rollback(True)
+        self.assertLess(response.status_code, 400, f"{response.status_code} {response.content[:500]}")
+        # The test wraps each request in a transaction, which turns the view's own transactions into
+        # savepoints; outside tests those are a BEGIN and COMMIT that don't show up as queries
+        return sum(1 for query in queries if not query["sql"].startswith(("SAVEPOINT", "RELEASE SAVEPOINT")))
+
+    def test_every_url_has_a_budget(self):
+        names = {pattern.name for pattern in urls.urlpatterns if isinstance(pattern, URLPattern)}
+        self.assertEqual(names, {endpoint.name for endpoint in QUERY_BUDGETS})
+
+    def test_query_budgets(self):
+        for endpoint in QUERY_BUDGETS:
+            label = f"{endpoint.method.upper()} {endpoint.name}" + (f"?{endpoint.query}" if endpoint.query else "")
+            with self.subTest(label, user=endpoint.user):
+                # Once beforehand for per-process setup, like detecting the search backend
+                self.count_queries(endpoint, DATASET_SIZES[0])
+                counts = {n: self.count_queries(endpoint, n) for n in DATASET_SIZES}
+                self.assertEqual(len(set(counts.values())), 1, f"query count depends on the data: {counts}")
+                self.assertLessEqual(max(counts.values()), endpoint.budget, f"over budget: {counts}")
@@ -0,0 +1,142 @@
+import asyncio
+import tempfile
+from pathlib import Path
+
+from django.core.cache import cache
+from django.db import connections
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from .. import replicas
+from ..authentication import create_token
+from ..middleware import ReplicaMiddleware
+from ..models import Rug, User
+from .test_async_views import async_urls, capture_queries
+
+REPLICA = "replica_test"
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA], REPLICA_STICKY_SECONDS=0)
+class ReplicaRoutingTest(TransactionTestCase):
+    # Data has to be committed to be copied to the replica, which is a second SQLite database
+
+    def setUp(self):
+        cache.clear()
+        replicas._unavailable.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.add_replica(Path(directory.name) / "replica.sqlite3")
+
+        self.rug = Rug.objects.create(title="Test1", description="Testing1", price=4.99)
+        self.user = User.objects.create_user(username="test1", email="test1@gmail.com", password="test")
+        self.replicate()
+        # bulk_create skips the signals that bump the catalog version: a change the replica hasn't caught up with
+        self.unreplicated = Rug.objects.bulk_create([Rug(title="Test2", description="Testing2", price=5.99)])[0]
+        self.token = create_token(self.user)[1]
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token}")
+
+    def add_replica(self, name):
+        connections.settings[REPLICA] = {**connections["default"].settings_dict, "NAME": str(name)}
+
+        def remove():
+            connections[REPLICA].close()
+            del connections[REPLICA]
+            del connections.settings[REPLICA]
+
+        self.addCleanup(remove)
+
+    def replicate(self):
+        connections["default"].ensure_connection()
+        connections[REPLICA].ensure_connection()
+        connections["default"].connection.backup(connections[REPLICA].connection)
+
+    def rug_titles(self):
+        return {rug["title"] for rug in self.client.get("/api/rug").json()["results"]}
+
+    def test_reads_from_replica(self):
+        with CaptureQueriesContext(connections[REPLICA]) as queries:
+            self.assertEqual(self.rug_titles(), {"Test1"})
+        self.assertTrue(queries)
+
+        # Only for views that opt in
+        with CaptureQueriesContext(connections[REPLICA]) as queries:
+            self.assertEqual(self.client.get("/api/authenticated").status_code, 200)
+        self.assertFalse(queries)
+
+    def test_writes_go_to_primary(self):
+        with CaptureQueriesContext(connections[REPLICA]) as queries:
+            response = self.client.post("/api/cart", {"rug": self.unreplicated.pk}, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(queries)
+        self.assertEqual(list(self.user.cart.all()), [self.unreplicated])
+
+    @override_settings(REPLICA_STICKY_SECONDS=60)
+    def test_reads_own_writes(self):
+        # A token created after the copy still authenticates; cart reads come from the replica until a write
+        url = f"/api/cart/{self.rug.pk}"
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.client.post("/api/cart", {"rug": self.rug.pk}, format="json")
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        # Whichever token the user reads with
+        other = APIClient()
+        other.credentials(HTTP_AUTHORIZATION=f"Token {create_token(self.user)[1]}")
+        self.assertEqual(other.get(url).status_code, 200)
+
+        # Only the user who wrote sticks to the primary
+        other_user = User.objects.create_user(username="test2", email="test2@gmail.com", password="test")
+        other.credentials(HTTP_AUTHORIZATION=f"Token {create_token(other_user)[1]}")
+        self.assertEqual(other.get("/api/cart").json()["results"], [])
+        self.assertEqual(self.rug_titles(), {"Test1", "Test2"})
+
+    @override_settings(REPLICA_STICKY_SECONDS=60)
+    def test_recent_change_reads_primary(self):
+        # Anything the response depends on changed within the window
+        Rug.objects.create(title="Test3", description="Testing3", price=6.99)
+        self.assertEqual(self.rug_titles(), {"Test1", "Test2", "Test3"})
+
+    async def test_asgi(self):
+        async def get_response(request):
+            pass
+
+        # Runs on the event loop instead of being adapted to a thread
+        self.assertTrue(asyncio.iscoroutinefunction(ReplicaMiddleware(get_response)))
+
+        response = await self.async_client.get("/api/rug")
+        self.assertEqual({rug["title"] for rug in response.json()["results"]}, {"Test1"})
+
+        headers = {"authorization": f"Token {self.token}"}
+        url = f"/api/cart/{self.rug.pk}"
+        with override_settings(REPLICA_STICKY_SECONDS=60):
+            await self.async_client.post("/api/cart", {"rug": self.rug.pk}, content_type="application/json", **headers)
+            self.assertEqual((await self.async_client.get(url, **headers)).status_code, 200)
+
+    @override_settings(ROOT_URLCONF=async_urls)
+    async def test_async_views(self):
+        async with capture_queries(REPLICA) as queries:
+            response = await self.async_client.get("/api/rug")
+        self.assertEqual({rug["title"] for rug in response.json()["results"]}, {"Test1"})
+        self.assertTrue(queries)
+
+        # The write goes through the sync view to the primary; the cart is read from the replica
+        headers = {"authorization": f"Token {self.token}"}
+        await self.async_client.post("/api/cart", {"rug": self.rug.pk}, content_type="application/json", **headers)
+        self.assertEqual((await self.async_client.get("/api/cart", **headers)).json()["results"], [])
+        with override_settings(REPLICA_STICKY_SECONDS=60):
+            await self.async_client.post(
+                "/api/cart", {"rug": self.unreplicated.pk}, content_type="application/json", **headers
+            )
+            response = await self.async_client.get("/api/cart", **headers)
+        self.assertEqual({rug["title"] for rug in response.json()["results"]}, {"Test1", "Test2"})
+
+    def test_falls_back_to_primary(self):
+        connections[REPLICA].close()
+        connections[REPLICA].settings_dict["NAME"] = "/nonexistent/replica.sqlite3"
+        with self.assertLogs("rugs_app.replicas", "WARNING"):
+            self.assertEqual(self.rug_titles(), {"Test1", "Test2"})
+        # Not tried again for a while
+        cache.clear()
+        self.assertEqual(self.rug_titles(), {"Test1", "Test2"})
+        self.assertIn(REPLICA, replicas._unavailable)
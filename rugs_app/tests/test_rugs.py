@@ -1,8 +1,12 @@
 from datetime import datetime
 
-from django.test import TestCase
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework.parsers import JSONParser
 
+from ..cache import get_counters
 from ..models import Rug, User
 
 
@@ -20,6 +24,9 @@ class RugsViewTest(TestCase):
         cls.superuser = User.objects.create_superuser(username="admin", email="admin@gmail.com", password="admin")
         cls.regular_user = User.objects.create_user(username="test", email="test@gmail.com", password="test")
 
+    def setUp(self):
+        cache.clear()
+
     def login_as_user(self, username, password):
         response = self.client.post(
             "/api/login",
@@ -166,3 +173,174 @@ class RugsViewTest(TestCase):
         all_rugs_response = self.client.get("/api/rug", HTTP_AUTHORIZATION=f"Token {token}")
         self.assertEqual(all_rugs_response.status_code, 200)
         self.assertEqual(all_rugs_response.json()["count"], 3)
+
+    def test_get_rugs_cursor_pagination(self):
+        for i in range(10):
+            Rug.objects.create(title=f"Extra{i}", description="Extra", price=10 + i)
+
+        seen = []
+        url = "/api/rug?pagination=cursor"
+        while url is not None:
+            with CaptureQueriesContext(connection) as queries:
+                rugs_response = self.client.get(url)
+            self.assertEqual(rugs_response.status_code, 200)
+            self.assertNotIn("count", rugs_response.json())
+            self.assertFalse(any("COUNT(" in query["sql"] for query in queries.captured_queries))
+            seen.extend(rug["id"] for rug in rugs_response.json()["results"])
+            url = rugs_response.json()["next"]
+
+        self.assertEqual(seen, list(Rug.objects.order_by("-date_created", "-id").values_list("id", flat=True)))
+
+    def test_get_rugs_cursor_pagination_ordering(self):
+        for i in range(10):
+            Rug.objects.create(title=f"Extra{i}", description="Extra", price=5.99)
+
+        first_page = self.client.get("/api/rug?pagination=cursor&ordering=-price").json()
+        second_page = self.client.get(first_page["next"]).json()
+        self.assertIsNone(second_page["next"])
+
+        prices = [float(rug["price"]) for rug in first_page["results"] + second_page["results"]]
+        self.assertEqual(len(prices), 14)
+        self.assertEqual(prices, sorted(prices, reverse=True))
+
+        previous_page = self.client.get(second_page["previous"]).json()
+        self.assertEqual(previous_page["results"], first_page["results"])
+        self.assertIsNone(previous_page["previous"])
+
+    def test_get_rugs_invalid_cursor(self):
+        rugs_response = self.client.get("/api/rug?cursor=notacursor")
+        self.assertEqual(rugs_response.status_code, 404)
+
+    def test_search_rugs(self):
+        Rug.objects.create(title="Persian wool", description="A hand-knotted rug", price=99.99)
+        Rug.objects.create(title="Kilim", description="Flat woven, persian style", price=49.99)
+
+        search_response = self.client.get("/api/rug?search=persian")
+        self.assertEqual(search_response.status_code, 200)
+        self.assertEqual(search_response.json()["count"], 2)
+        # Title matches rank above description matches
+        self.assertEqual([rug["title"] for rug in search_response.json()["results"]], ["Persian wool", "Kilim"])
+
+        prefix_response = self.client.get("/api/rug?search=pers wov")
+        self.assertEqual([rug["title"] for rug in prefix_response.json()["results"]], ["Kilim"])
+
+        ordered_response = self.client.get("/api/rug?search=persian&ordering=price")
+        self.assertEqual([rug["title"] for rug in ordered_response.json()["results"]], ["Kilim", "Persian wool"])
+
+        filtered_response = self.client.get("/api/rug?search=testing&status=na")
+        self.assertEqual(filtered_response.json()["count"], 2)
+
+        self.assertEqual(self.client.get("/api/rug?search=\"*").json()["count"], 0)
+
+    def test_search_index_follows_rug_changes(self):
+        token = self.login_as_user(username=self.superuser.username, password="admin")
+
+        self.client.patch(
+            f"/api/rug/{self.rugs[0].pk}",
+            {"title": "Moroccan"},
+            "application/json",
+            HTTP_AUTHORIZATION=f"Token {token}"
+        )
+        search_response = self.client.get("/api/rug?search=moroccan")
+        self.assertEqual([rug["id"] for rug in search_response.json()["results"]], [self.rugs[0].pk])
+
+        self.client.delete(f"/api/rug/{self.rugs[0].pk}", HTTP_AUTHORIZATION=f"Token {token}")
+        self.assertEqual(self.client.get("/api/rug?search=moroccan").json()["count"], 0)
+
+    @override_settings(RUG_SEARCH_BACKEND="rugs_app.search.ContainsSearchBackend")
+    def test_search_rugs_contains_backend(self):
+        search_response = self.client.get("/api/rug?search=esting3")
+        self.assertEqual([rug["id"] for rug in search_response.json()["results"]], [self.rugs[2].pk])
+
+    def test_rug_responses_cached(self):
+        first_response = self.client.get("/api/rug?status=av")
+        self.assertEqual(first_response["X-Cache"], "MISS")
+
+        with self.assertNumQueries(0):
+            second_response = self.client.get("/api/rug?status=av&unrelated=1")
+        self.assertEqual(second_response["X-Cache"], "HIT")
+        self.assertEqual(second_response.json(), first_response.json())
+
+        self.assertEqual(self.client.get("/api/rug?status=na")["X-Cache"], "MISS")
+        self.assertEqual(self.client.get(f"/api/rug/{self.rugs[0].pk}")["X-Cache"], "MISS")
+        self.assertEqual(self.client.get(f"/api/rug/{self.rugs[0].pk}")["X-Cache"], "HIT")
+        self.assertEqual(get_counters("catalog_cache_hits", "catalog_cache_misses"), {
+            "catalog_cache_hits": 2,
+            "catalog_cache_misses": 3,
+        })
+
+    def test_rug_changes_invalidate_cache(self):
+        token = self.login_as_user(username=self.superuser.username, password="admin")
+        self.client.get("/api/rug")
+        self.client.get(f"/api/rug/{self.rugs[0].pk}")
+
+        self.client.patch(
+            f"/api/rug/{self.rugs[0].pk}",
+            {"title": "NewTitle"},
+            "application/json",
+            HTTP_AUTHORIZATION=f"Token {token}"
+        )
+        rug_response = self.client.get(f"/api/rug/{self.rugs[0].pk}")
+        self.assertEqual(rug_response["X-Cache"], "MISS")
+        self.assertEqual(rug_response.json()["title"], "NewTitle")
+
+        self.client.post(
+            "/api/rug",
+            {"title": "Test5", "description": "Testing5", "price": "3.99"},
+            "application/json",
+            HTTP_AUTHORIZATION=f"Token {token}"
+        )
+        self.assertEqual(self.client.get("/api/rug").json()["count"], 5)
+
+        self.client.delete(f"/api/rug/{self.rugs[1].pk}", HTTP_AUTHORIZATION=f"Token {token}")
+        self.assertEqual(self.client.get("/api/rug").json()["count"], 4)
+
+    def test_conditional_get_rugs(self):
+        rugs_response = self.client.get("/api/rug")
+        etag = rugs_response["ETag"]
+        self.assertTrue(etag.startswith('"'))
+
+        with self.assertNumQueries(0):
+            not_modified_response = self.client.get("/api/rug", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified_response.status_code, 304)
+        self.assertEqual(not_modified_response["ETag"], etag)
+
+        self.assertEqual(self.client.get("/api/rug?ordering=price", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertEqual(
+            self.client.get("/api/rug", HTTP_IF_MODIFIED_SINCE=rugs_response["Last-Modified"]).status_code, 304
+        )
+
+        rug_response = self.client.get(f"/api/rug/{self.rugs[0].pk}")
+        self.assertEqual(
+            self.client.get(f"/api/rug/{self.rugs[0].pk}", HTTP_IF_NONE_MATCH=rug_response["ETag"]).status_code, 304
+        )
+
+        Rug.objects.create(title="Test5", description="Testing5", price=3.99)
+        self.assertEqual(self.client.get("/api/rug", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertEqual(
+            self.client.get(f"/api/rug/{self.rugs[0].pk}", HTTP_IF_NONE_MATCH=rug_response["ETag"]).status_code, 200
+        )
+
+    def test_get_rugs_card_fields(self):
+        with CaptureQueriesContext(connection) as queries:
+            rugs_response = self.client.get("/api/rug")
+        self.assertEqual(set(rugs_response.json()["results"][0]), {"id", "title", "price", "image_url", "status"})
+        self.assertFalse(any("description" in query["sql"] for query in queries.captured_queries))
+
+        all_fields_response = self.client.get("/api/rug?fields=__all__")
+        self.assertEqual(all_fields_response.json()["results"][0]["description"], self.rugs[-1].description)
+
+    def test_get_rugs_sparse_fields(self):
+        with CaptureQueriesContext(connection) as queries:
+            rugs_response = self.client.get("/api/rug?fields=id,title&pagination=cursor&ordering=-price")
+        self.assertEqual(rugs_response.json()["results"][0], {"id": self.rugs[3].pk, "title": "Test4"})
+        self.assertFalse(any("image_url" in query["sql"] for query in queries.captured_queries))
+        self.assertEqual(len(queries), 1)
+
+        omit_response = self.client.get("/api/rug?omit=description,search_vector,date_created")
+        self.assertEqual(
+            set(omit_response.json()["results"][0]),
+            {"id", "title", "price", "image_url", "status"}
+        )
+
+        self.assertEqual(self.client.get("/api/rug?fields=title,password").status_code, 400)
@@ -0,0 +1,92 @@
+import gzip
+import json
+import tempfile
+from io import StringIO
+from pathlib import Path
+from types import ModuleType
+
+import yaml
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, override_settings
+from django.test.client import RequestFactory
+from django.urls import path
+
+from ..schema import PrebuiltSchemaView, generate_schema, load_schema
+from ..urls import build_urlpatterns
+
+prebuilt_urls = ModuleType("prebuilt_urls")
+prebuilt_urls.urlpatterns = [path("api/schema/", PrebuiltSchemaView.as_view())]
+
+
+class CommittedSchemaTest(SimpleTestCase):
+
+    def test_committed_schema_is_current(self):
+        with open(settings.SCHEMA_FILE, "rb") as schema_file:
+            committed = schema_file.read()
+        # assertEqual on the decoded text shows which lines changed
+        self.assertEqual(
+            committed.decode("utf-8"), generate_schema().decode("utf-8"),
+            "schema.yaml is out of date; run `manage.py build_schema`"
+        )
+
+
+@override_settings(ROOT_URLCONF=prebuilt_urls)
+class PrebuiltSchemaTest(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.schema_file = Path(directory.name) / "schema.yaml"
+        self.schema_file.write_text("openapi: 3.0.3\ninfo:\n  title: Rugs\npaths: {}\n")
+        load_schema.cache_clear()
+        self.addCleanup(load_schema.cache_clear)
+        settings_override = override_settings(SCHEMA_FILE=str(self.schema_file))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_serves_file(self):
+        response = self.client.get("/api/schema/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, self.schema_file.read_bytes())
+        self.assertTrue(response["Content-Type"].startswith("application/vnd.oai.openapi"))
+        self.assertIn("Accept-Encoding", response["Vary"])
+
+        response = self.client.get("/api/schema/", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+    def test_gzip(self):
+        plain = self.client.get("/api/schema/")
+        response = self.client.get("/api/schema/", HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertNotEqual(response["ETag"], plain["ETag"])
+
+    def test_json(self):
+        expected = yaml.safe_load(self.schema_file.read_text())
+        response = self.client.get("/api/schema/", {"format": "json"})
+        self.assertEqual(json.loads(response.content), expected)
+        response = self.client.get("/api/schema/", HTTP_ACCEPT="application/json, */*")
+        self.assertEqual(json.loads(response.content), expected)
+
+    def test_setting_switches_view(self):
+        with override_settings(PREBUILT_SCHEMA=True):
+            urlpatterns = build_urlpatterns()
+        schema_view = next(pattern.callback for pattern in urlpatterns if pattern.name == "schema")
+        response = schema_view(RequestFactory().get("/api/schema/"))
+        self.assertEqual(response.content, self.schema_file.read_bytes())
+
+
+class BuildSchemaCommandTest(SimpleTestCase):
+
+    def test_build_schema(self):
+        with tempfile.TemporaryDirectory() as directory:
+            schema_file = Path(directory) / "schema.yaml"
+            schema_file.write_text("stale")
+            with self.assertRaisesMessage(CommandError, "out of date"):
+                call_command("build_schema", f"--file={schema_file}", "--check", stdout=StringIO())
+
+            call_command("build_schema", f"--file={schema_file}", stdout=StringIO())
+            self.assertEqual(schema_file.read_bytes(), generate_schema())
+            call_command("build_schema", f"--file={schema_file}", "--check", stdout=StringIO())
@@ -1,38 +1,65 @@
-import knox
-from django.contrib.auth.views import LogoutView, LoginView
-from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
-from rest_framework import permissions
-from rest_framework.authtoken.views import obtain_auth_token
+from functools import cache
+
+from django.conf import settings
 from django.urls import path, re_path
+from django.utils.module_loading import import_string
 
 from . import views
 
 
-urlpatterns = [
-    # Authentication
-    path("register", views.RegisterUserView.as_view(), name="register"),
-    path("login", views.LoginUserView.as_view(), name="login"),
-    path("logout", views.LogoutUserView.as_view(), name="logout"),
-    path("verify-password", views.VerifyPasswordView.as_view(), name="verify-password"),
-    path("authenticated", views.AuthenticatedView.as_view(), name="authenticated"),
-    path("user", views.UserView.as_view(), name="user"),
-    path("admin", views.AdminView.as_view(), name="admin"),
-
-    # Rugs
-    path("rug", views.RugsListView.as_view(), name="all_rugs"),
-    path("rug/<int:pk>", views.RugsDetailView.as_view(), name="rug_detail"),
-    path("rug/by-order/<int:pk>", views.RugsByOrderView.as_view(), name="rugs_by_order"),
-
-    # Orders
-    path("order", views.OrderListView.as_view(), name="all_orders"),
-    path("order/<int:pk>", views.OrderDetailView.as_view(), name="order_detail"),
-
-    # Cart
-    path("cart", views.CartListView.as_view(), name="cart"),
-    path("cart/<int:pk>", views.CartDetailView.as_view(), name="cart_detail"),
-    path("cart/price", views.CartPriceView.as_view(), name="cart_price"),
-
-    # Swagger
-    re_path(r'^schema/', SpectacularAPIView.as_view(), name="schema"),
-    re_path(r'^docs/', SpectacularSwaggerView.as_view(url_name="schema"), name='swagger-ui'),
-]
+def lazy_view(view_path, **initkwargs):
+    """
+    Imports the view class on its first request. The schema and docs views pull
+    in most of drf_spectacular, which would otherwise add to every cold start.
+    """
+    load = cache(lambda: import_string(view_path).as_view(**initkwargs))
+
+    def view(request, *args, **kwargs):
+        return load()(request, *args, **kwargs)
+
+    view.csrf_exempt = True
+    return view
+
+
+def build_urlpatterns():
+    # A function, so tests can build the patterns again under other settings
+    return [
+        # Authentication
+        path("register", views.RegisterUserView.as_view(), name="register"),
+        path("login", views.LoginUserView.as_view(), name="login"),
+        path("logout", views.LogoutUserView.as_view(), name="logout"),
+        path("verify-password", views.VerifyPasswordView.as_view(), name="verify-password"),
+        path("authenticated", views.AuthenticatedView.as_view(), name="authenticated"),
+        path("user", views.UserView.as_view(), name="user"),
+        path("admin", views.AdminView.as_view(), name="admin"),
+
+        # Rugs
+        path("rug", views.RugsListView.as_view(), name="all_rugs"),
+        path("rug/<int:pk>", views.RugsDetailView.as_view(), name="rug_detail"),
+        path("rug/by-order/<int:pk>", views.RugsByOrderView.as_view(), name="rugs_by_order"),
+
+        # Orders
+        path("order", views.OrderListView.as_view(), name="all_orders"),
+        path("order/<int:pk>", views.OrderDetailView.as_view(), name="order_detail"),
+
+        # Cart
+        path("cart", views.CartListView.as_view(), name="cart"),
+        path("cart/<int:pk>", views.CartDetailView.as_view(), name="cart_detail"),
+        path("cart/price", views.CartPriceView.as_view(), name="cart_price"),
+        path("cart/summary", views.CartSummaryView.as_view(), name="cart_summary"),
+        path("cart/batch", views.CartBatchView.as_view(), name="cart_batch"),
+
+        # Metrics
+        path("metrics", views.MetricsView.as_view(), name="metrics"),
+
+        # Swagger
+        re_path(r'^schema/', lazy_view(
+            "rugs_app.schema.PrebuiltSchemaView" if getattr(settings, "PREBUILT_SCHEMA", False)
+            else "drf_spectacular.views.SpectacularAPIView"
+        ), name="schema"),
+        re_path(r'^docs/', lazy_view("drf_spectacular.views.SpectacularSwaggerView", url_name="schema"),
+                name='swagger-ui'),
+    ]
+
+
+urlpatterns = build_urlpatterns()
@@ -1,40 +1,50 @@
-import django
+from decimal import Decimal
+
 import knox.views
-from django.contrib.auth import login, authenticate
-from django.contrib.auth.views import LoginView
-from django.core.mail import send_mass_mail
-from django.forms import forms
-from django.http import JsonResponse, HttpResponseRedirect
-from django.middleware.csrf import get_token
+from django.contrib.auth import authenticate
+from django.db import transaction
+from django.db.models import Count, Prefetch, Q, Sum
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import render
-from django.urls import reverse
 from django.utils import timezone
-from django.views.decorators.csrf import csrf_exempt, ensure_csrf_cookie
+from django.utils.crypto import constant_time_compare
 from django_filters.rest_framework import DjangoFilterBackend
-from drf_spectacular.utils import extend_schema_view, extend_schema, OpenApiResponse, OpenApiParameter
+from drf_spectacular.utils import extend_schema_view, extend_schema, OpenApiParameter
 from knox.models import AuthToken
 from rest_framework import generics, serializers
-from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.serializers import AuthTokenSerializer
 from rest_framework.decorators import action
+from rest_framework.exceptions import AuthenticationFailed, NotFound
 from rest_framework.filters import SearchFilter, OrderingFilter
 from rest_framework.generics import GenericAPIView
-from rest_framework.parsers import JSONParser, FormParser
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework.authentication import BasicAuthentication, SessionAuthentication
-from rest_framework.permissions import AllowAny, IsAuthenticated, BasePermission, SAFE_METHODS, IsAdminUser, \
-    DjangoObjectPermissions
-from .models import User, Order, Rug
+from rest_framework.authentication import get_authorization_header
+from rest_framework.permissions import AllowAny, IsAuthenticated, BasePermission, SAFE_METHODS, IsAdminUser
+from .async_views import AsyncAPIViewMixin, AsyncListModelMixin, AsyncRetrieveModelMixin
+from .authentication import CachedTokenAuthentication, create_token, refresh_token
+from .cache import CatalogCacheMixin, CATALOG, ORDERS, user_orders_namespace, order_namespace, cart_namespace, \
+    bump_version
+from .cart import NOT_AVAILABLE, NOT_FOUND, RESERVED, aget_cart_totals, clear_cart, get_cart_totals, get_reservation_ttl, \
+    update_cart
+from .conditional import ConditionalGetMixin
+from .metrics import record_checkout, render_metrics
+from .models import User, Order, Rug, RugHold
+from .pagination import CatalogPagination
+from .replicas import ReplicaReadMixin
+from .search import RugSearchFilter
+from .sparse_fields import SparseFieldsMixin
 
 from .serializer import RegisterSerializer, UserSerializer, RugSerializer, OrderSerializer, VerifyPasswordSerializer, \
-    VerifyPassword, VerifyPasswordRequestSerializer, CartPriceSerializer, CartPrice
+    VerifyPassword, VerifyPasswordRequestSerializer, CartPriceSerializer, CartPrice, ExpandedOrderSerializer, CartSummarySerializer, CartSummary, \
+    CartBatchRequestSerializer, CartBatchSerializer
 from django.conf import settings
 
 
 class IsAdminOrOwnsOrder(BasePermission):
     def has_object_permission(self, request, view, obj):
-        return request.user.is_staff or request.user == obj.user
+        # Compare ids, so the check doesn't load the order's user
+        return request.user.is_staff or request.user.pk == obj.user_id
 
 
 class ReadOnly(BasePermission):
@@ -42,6 +52,19 @@ class ReadOnly(BasePermission):
         return request.method in SAFE_METHODS
 
 
+SPARSE_FIELDS_PARAMETERS = [
+    OpenApiParameter(
+        "fields", str,
+        description="Comma-separated rug fields to return, or __all__ (defaults to " +
+                    ", ".join(RugSerializer.card_fields) + ")"
+    ),
+    OpenApiParameter("omit", str, description="Comma-separated rug fields to leave out"),
+]
+
+ORDER_UPDATE_DESCRIPTION = \
+    "Updates an order by its ID; only allowed if it is the user's order or the user is an admin"
+
+
 def index(request):
     return render(request, "rugs_app/index.html")
 
@@ -63,15 +86,12 @@ class RegisterUserView(generics.CreateAPIView):
             raise serializers.ValidationError({
                 "password": "Passwords don't match"
             })
-        super().create(request, *args, **kwargs)
-        user = authenticate(request, username=request.data.get("username"), password=request.data.get("password"))
-        if user is not None:
-            token = AuthToken.objects.create(user)
-            return Response({
-                "token": token[1]
-            })
-        raise serializers.ValidationError({
-            "error": "cannot register"
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        # The new user is at hand, so there's no need to look them up and hash the password again
+        user = serializer.save()
+        return Response({
+            "token": create_token(user)[1]
         })
 
 
@@ -87,20 +107,39 @@ class LoginUserView(APIView):
     def post(self, request):
         user = authenticate(request, **request.data)
         if user is not None:
-            token = AuthToken.objects.create(user)
+            token = self.get_current_token(request, user)
+            if token is not None:
+                refresh_token(request.auth)
+            else:
+                token = create_token(user)[1]
             return Response({
-                "token": token[1]
+                "token": token
             })
         raise serializers.ValidationError({
             "error": "cannot login"
         })
 
+    def perform_authentication(self, request):
+        # Deferred to get_current_token, so a stale token doesn't stop the user logging in
+        pass
+
+    def get_current_token(self, request, user):
+        # A client logging in again with a valid token of the same user keeps that token
+        try:
+            authenticated_user = request.user
+        except AuthenticationFailed:
+            return None
+        if isinstance(request.auth, AuthToken) and authenticated_user.pk == user.pk:
+            return get_authorization_header(request).split()[1].decode()
+        return None
+
 
 @extend_schema(
     tags=["Logout"],
     description="Logs a user out"
 )
 class LogoutUserView(knox.views.LogoutView):
+    authentication_classes = (CachedTokenAuthentication,)
     serializer_class = None
 
 
@@ -171,18 +210,25 @@ class UserView(APIView):
 @extend_schema(
     tags=["Rugs"]
 )
-class RugsListView(generics.ListCreateAPIView):
+class RugsListView(ReplicaReadMixin, ConditionalGetMixin, CatalogCacheMixin, SparseFieldsMixin, AsyncListModelMixin,
+                   generics.ListCreateAPIView):
     permission_classes = (IsAdminUser | ReadOnly,)
     queryset = Rug.objects.all()
     serializer_class = RugSerializer
-    filter_backends = (DjangoFilterBackend, SearchFilter, OrderingFilter)
+    default_fields = RugSerializer.card_fields  # <url>?fields=title,price or <url>?omit=image_url
+    pagination_class = CatalogPagination  # <url>?pagination=cursor for keyset pagination
+    filter_backends = (DjangoFilterBackend, RugSearchFilter, OrderingFilter)
     filterset_fields = ["status"]
-    search_fields = ["title", "description"]  # <url>?search=<search>
+    search_fields = ["title", "description"]  # <url>?search=<search>, ranked by relevance
     ordering_fields = ["title", "price"]  # <url>?ordering=title, use ordering=-title for descending
 
+    def get_version_namespaces(self, request):
+        return [CATALOG]
+
     @extend_schema(
         description="Gets all available rugs, with options for "
                     "searching, filtering, and sorting",
+        parameters=SPARSE_FIELDS_PARAMETERS
     )
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
@@ -194,23 +240,30 @@ class RugsListView(generics.ListCreateAPIView):
         return super().post(request, *args, **kwargs)
 
 
-RugsListView.pagination_class.page_size = 8
-
-
 @extend_schema(
     tags=["Rugs"]
 )
-class RugsDetailView(generics.RetrieveUpdateDestroyAPIView):
+class RugsDetailView(ReplicaReadMixin, ConditionalGetMixin, CatalogCacheMixin, AsyncRetrieveModelMixin,
+                     generics.RetrieveUpdateDestroyAPIView):
     permission_classes = (IsAdminUser | ReadOnly,)
     queryset = Rug.objects.all()
     serializer_class = RugSerializer
 
+    def get_version_namespaces(self, request):
+        return [CATALOG]
+
     @extend_schema(
         description="Gets a certain rug by its ID"
     )
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
 
+    @extend_schema(
+        description="Replace a rug (must be admin)"
+    )
+    def put(self, request, *args, **kwargs):
+        return super().put(request, *args, **kwargs)
+
     @extend_schema(
         description="Update a rug (must be admin)"
     )
@@ -227,21 +280,46 @@ class RugsDetailView(generics.RetrieveUpdateDestroyAPIView):
 @extend_schema(
     tags=["Orders"],
 )
-class OrderListView(generics.ListCreateAPIView):
+class OrderListView(ReplicaReadMixin, ConditionalGetMixin, AsyncListModelMixin, generics.ListCreateAPIView):
     permission_classes = (IsAuthenticated,)
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
     filter_backends = (DjangoFilterBackend, SearchFilter, OrderingFilter)
     filterset_fields = ["status"]
     ordering_fields = ["date_placed", "status", "price", "rug_count"]
+    vary_on_user = True
+
+    def expand_rugs(self):
+        return "rugs" in self.request.query_params.get("expand", "").split(",")
 
     def get_queryset(self):
+        # Load every order's rugs in one query instead of one query per order
+        if self.expand_rugs():
+            rugs = Rug.objects.only(*RugSerializer.card_fields)
+        else:
+            rugs = Rug.objects.only("id")
+        queryset = self.queryset.prefetch_related(Prefetch("rugs", queryset=rugs))
         if self.request.user.is_staff:
-            return super().get_queryset()
-        return self.queryset.filter(user=self.request.user)
+            return queryset
+        return queryset.filter(user=self.request.user)
+
+    def get_serializer_class(self):
+        if self.request.method == "GET" and self.expand_rugs():
+            return ExpandedOrderSerializer
+        return super().get_serializer_class()
+
+    def get_version_namespaces(self, request):
+        namespaces = [ORDERS] if request.user.is_staff else [user_orders_namespace(request.user.pk)]
+        if self.expand_rugs():
+            # Embedded rug cards change with the catalog
+            namespaces.append(CATALOG)
+        return namespaces
 
     @extend_schema(
-        description="Gets all a user's orders, or all existing orders for an admin user"
+        description="Gets all a user's orders, or all existing orders for an admin user",
+        parameters=[
+            OpenApiParameter("expand", str, enum=["rugs"], description="Set to rugs to embed a card of each rug"),
+        ]
     )
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
@@ -251,45 +329,98 @@ class OrderListView(generics.ListCreateAPIView):
         description="Create an order of all rugs in the user's cart, and clears the cart"
     )
     def post(self, request, *args, **kwargs):
-        for rug in request.user.cart.all():
-            if not rug:
-                print("non existent rug")
+        try:
+            response = self.place_order(request)
+        except serializers.ValidationError:
+            record_checkout("failure")
+            raise
+        record_checkout("success")
+        return response
+
+    def place_order(self, request):
+        with transaction.atomic():
+            # Lock the cart's rugs so a concurrent checkout can't order them too
+            rug_ids = list(
+                Rug.objects.select_for_update(of=("self",))
+                .filter(user=request.user)
+                .order_by("pk")
+                .values_list("pk", flat=True)
+            )
+            if not rug_ids:
+                raise serializers.ValidationError({
+                    "error": "cart is empty"
+                })
+
+            if get_reservation_ttl() and RugHold.objects.filter(
+                rug_id__in=rug_ids, expires_at__gt=timezone.now()
+            ).exclude(user=request.user).exists():
                 raise serializers.ValidationError({
-                    "error": "one or more rugs in order does not exist"
+                    "error": "one or more rugs in order is reserved"
+                })
+
+            totals = Rug.objects.filter(pk__in=rug_ids).aggregate(
+                price=Sum("price"),
+                available=Count("pk", filter=Q(status=Rug.RugStatus.AVAILABLE))
+            )
+            if totals["available"] != len(rug_ids):
+                raise serializers.ValidationError({
+                    "error": "one or more rugs in order is not available"
                 })
-            if rug.status != Rug.RugStatus.AVAILABLE:
-                print("non available rug")
+            try:
+                # SQLite sums decimals as floats, so round back to cents before validating
+                price = OrderSerializer().fields["price"].run_validation(totals["price"].quantize(Decimal("0.01")))
+            except serializers.ValidationError as error:
+                raise serializers.ValidationError({"price": error.detail})
+
+            # The status condition makes a lost race fail here instead of overselling
+            updated = Rug.objects.filter(pk__in=rug_ids, status=Rug.RugStatus.AVAILABLE).update(
+                status=Rug.RugStatus.NOT_AVAILABLE
+            )
+            if updated != len(rug_ids):
                 raise serializers.ValidationError({
                     "error": "one or more rugs in order is not available"
                 })
 
-        # Manually serialize in order to include user
-        serializer = OrderSerializer(data={
-            "user": request.user.pk,
-            "rugs": [rug.pk for rug in request.user.cart.all()],
-            "rug_count": request.user.cart.count(),
-            "price": sum(rug.price for rug in request.user.cart.all())
-        })
-        if serializer.is_valid():
-            # Order is validated, set rugs to no longer be available
-            for rug in request.user.cart.all():
-                rug.status = Rug.RugStatus.NOT_AVAILABLE
-                rug.save()
-            request.user.cart.clear()
-            request.user.save()
+            order = Order.objects.create(user=request.user, rug_count=len(rug_ids), price=price)
+            Order.rugs.through.objects.bulk_create(
+                Order.rugs.through(order_id=order.pk, rug_id=rug_id) for rug_id in rug_ids
+            )
+            User.cart.through.objects.filter(user_id=request.user.pk).delete()
+            if get_reservation_ttl():
+                RugHold.objects.filter(rug_id__in=rug_ids).delete()
+
+            # Bulk queries skip the signals that normally bump these
+            bump_version(CATALOG, cart_namespace(request.user.pk))
 
-            serializer.save()
-            return JsonResponse(serializer.data, status=201)
-        return JsonResponse(serializer.errors, status=400)
+        return JsonResponse(OrderSerializer(order).data, status=201)
 
 
 @extend_schema(
     tags=["Orders"],
 )
-class OrderDetailView(generics.RetrieveUpdateDestroyAPIView):
+@extend_schema_view(
+    put=extend_schema(description=ORDER_UPDATE_DESCRIPTION),
+    patch=extend_schema(description=ORDER_UPDATE_DESCRIPTION),
+)
+class OrderDetailView(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
     permission_classes = (IsAdminOrOwnsOrder,)
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
+    vary_on_user = True
+
+    def get_queryset(self):
+        if self.request.method == "DELETE":
+            return self.queryset
+        # The order's rug ids come in one query, not with a full row per rug
+        return self.queryset.prefetch_related(Prefetch("rugs", queryset=Rug.objects.only("id")))
+
+    def get_version_namespaces(self, request):
+        return [order_namespace(self.kwargs["pk"])]
+
+    def retrieve(self, request, *args, **kwargs):
+        # Check permissions on the order before revealing whether it changed
+        instance = self.get_object()
+        return self.get_conditional_response(request, lambda: Response(self.get_serializer(instance).data))
 
     @extend_schema(
         description="Gets an order by its ID; only allowed if it is the user's order or the user is an admin"
@@ -297,21 +428,20 @@ class OrderDetailView(generics.RetrieveUpdateDestroyAPIView):
     def get(self, request, pk):
         return super().get(request, pk)
 
-    @extend_schema(
-        description="Updates an order by its ID; only allowed if it is the user's order or the user is an admin"
-    )
     @action(detail=True, methods=["put"])
     def partial_update(self, request, *args, **kwargs):
-        if "status" in request.data:
-            status = request.data.get("status")
-            order = Order.objects.get(pk=kwargs["pk"])
-            if status == Order.OrderStatus.READY_FOR_PICKUP:
-                order.date_ready = timezone.now()
-            elif status == Order.OrderStatus.COMPLETE:
-                order.date_completed = timezone.now()
-            order.save()
         return super().partial_update(request, *args, **kwargs)
 
+    def perform_update(self, serializer):
+        # A PATCH to a new status stamps its date, in the same save as the status
+        dates = {}
+        status = serializer.validated_data.get("status") if serializer.partial else None
+        if status == Order.OrderStatus.READY_FOR_PICKUP:
+            dates["date_ready"] = timezone.now()
+        elif status == Order.OrderStatus.COMPLETE:
+            dates["date_completed"] = timezone.now()
+        serializer.save(**dates)
+
     @extend_schema(
         description="Deletes an order by its ID; only allowed if it is the user's order or the user is an admin"
     )
@@ -319,40 +449,63 @@ class OrderDetailView(generics.RetrieveUpdateDestroyAPIView):
         return super().delete(request, *args, **kwargs)
 
 
-class RugsByOrderView(generics.ListAPIView):
+class RugsByOrderView(SparseFieldsMixin, generics.ListAPIView):
     permission_classes = (IsAdminOrOwnsOrder,)
     queryset = Rug.objects.all()
     serializer_class = RugSerializer
+    pagination_class = CatalogPagination  # <url>?pagination=cursor for keyset pagination
+    default_fields = RugSerializer.card_fields
 
     def get_queryset(self):
-        order = Order.objects.get(pk=self.kwargs.get("pk"))
-        order_serializer = OrderSerializer(order)
-        return self.queryset.filter(id__in=order_serializer.data.get("rugs"))
+        # A single join through Order.rugs; the ownership check is part of the same lookup
+        if self.request.user.is_staff:
+            return self.queryset.filter(order=self.kwargs["pk"])
+        return self.queryset.filter(order=self.kwargs["pk"], order__user_id=self.request.user.pk)
+
+    def check_order_access(self, request):
+        # Only needed when nothing matched, to tell a missing order from someone else's
+        owner = Order.objects.filter(pk=self.kwargs["pk"]).values_list("user_id", flat=True).first()
+        if owner is None:
+            raise NotFound()
+        if owner != request.user.pk and not request.user.is_staff:
+            self.permission_denied(request)
 
     @extend_schema(
         tags=["Rugs by Order"],
-        description="Gets all rugs that are part of a specific order"
+        description="Gets all rugs that are part of a specific order",
+        parameters=SPARSE_FIELDS_PARAMETERS
     )
     def get(self, request, *args, **kwargs):
-        order = Order.objects.get(pk=self.kwargs.get("pk"))
-        if order.user != request.user and not request.user.is_staff:
-            return JsonResponse({}, status=403)
         return super().get(request, *args, **kwargs)
 
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+        if not page:
+            self.check_order_access(request)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
 
 @extend_schema(
     tags=["Cart"]
 )
-class CartListView(generics.ListAPIView):
+class CartListView(ReplicaReadMixin, ConditionalGetMixin, SparseFieldsMixin, AsyncListModelMixin, generics.ListAPIView):
     permission_classes = (IsAuthenticated,)
     queryset = Rug.objects.all()
     serializer_class = RugSerializer
+    default_fields = RugSerializer.card_fields
+    vary_on_user = True
 
     def get_queryset(self):
         return self.request.user.cart.all()
 
+    def get_version_namespaces(self, request):
+        # Cart entries embed rug data, so any catalog change counts as a cart change
+        return [cart_namespace(request.user.pk), CATALOG]
+
     @extend_schema(
-        description="Gets all rugs in a user's cart"
+        description="Gets all rugs in a user's cart",
+        parameters=SPARSE_FIELDS_PARAMETERS
     )
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
@@ -361,17 +514,25 @@ class CartListView(generics.ListAPIView):
         description="Add a rug to the user's cart"
     )
     def post(self, request):
-        rug = Rug.objects.get(pk=request.data.get("rug"))
-        if not rug:
+        try:
+            rug_pk = int(request.data.get("rug"))
+        except (TypeError, ValueError):
+            raise serializers.ValidationError({
+                "error": "rug does not exist"
+            })
+        result = update_cart(request.user, add=[rug_pk])["add"][0]["result"]
+        if result == NOT_FOUND:
             raise serializers.ValidationError({
                 "error": "rug does not exist"
             })
-        if rug.status != Rug.RugStatus.AVAILABLE:
+        if result == NOT_AVAILABLE:
             raise serializers.ValidationError({
                 "error": "rug is not available"
             })
-        request.user.cart.add(rug.pk)
-        request.user.save()
+        if result == RESERVED:
+            raise serializers.ValidationError({
+                "error": "rug is reserved"
+            })
         return JsonResponse("Successfully added to cart", status=201, safe=False)
 
     @extend_schema(
@@ -379,15 +540,14 @@ class CartListView(generics.ListAPIView):
         description="Deletes all rugs from the user's cart"
     )
     def delete(self, request):
-        request.user.cart.clear()
-        request.user.save()
+        clear_cart(request.user)
         return JsonResponse({}, status=204)
 
 
 @extend_schema(
     tags=["Cart"]
 )
-class CartDetailView(generics.RetrieveAPIView):
+class CartDetailView(ReplicaReadMixin, generics.RetrieveAPIView):
     permission_classes = (IsAuthenticated,)
     serializer_class = RugSerializer
 
@@ -405,17 +565,54 @@ class CartDetailView(generics.RetrieveAPIView):
         description="Deletes a rug from the user's cart by ID"
     )
     def delete(self, request, pk):
-        rug = Rug.objects.get(pk=pk)
-        if not rug:
+        result = update_cart(request.user, remove=[pk])["remove"][0]["result"]
+        if result == NOT_FOUND:
             raise serializers.ValidationError({
                 "error": "rug does not exist"
             })
-        request.user.cart.remove(Rug.objects.get(pk=pk))
-        request.user.save()
         return JsonResponse({}, status=204)
 
 
-class CartPriceView(APIView):
+class CartBatchView(APIView):
+    permission_classes = (IsAuthenticated,)
+    serializer_class = CartBatchRequestSerializer
+
+    @extend_schema(
+        tags=["Cart"],
+        description="Adds and removes several rugs from the user's cart at once, "
+                    "and returns the outcome for each rug",
+        responses=CartBatchSerializer
+    )
+    def post(self, request):
+        serializer = CartBatchRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = update_cart(request.user, **serializer.validated_data)
+        return Response(CartBatchSerializer(results).data)
+
+
+class CartSummaryView(ReplicaReadMixin, ConditionalGetMixin, APIView):
+    permission_classes = (IsAuthenticated,)
+    serializer_class = CartSummarySerializer
+    vary_on_user = True
+
+    def get_version_namespaces(self, request):
+        return [cart_namespace(request.user.pk), CATALOG]
+
+    @extend_schema(
+        tags=["Cart"],
+        description="Gets the rugs in the user's cart with their count and total price, "
+                    "in place of separate cart and cart price requests"
+    )
+    def get(self, request):
+        return self.get_conditional_response(request, lambda: self.build_summary(request))
+
+    def build_summary(self, request):
+        count, total = get_cart_totals(request.user)
+        items = request.user.cart.only(*RugSerializer.card_fields)
+        return Response(CartSummarySerializer(CartSummary(items=items, count=count, total=total)).data)
+
+
+class CartPriceView(ReplicaReadMixin, AsyncAPIViewMixin, APIView):
     permission_classes = (IsAuthenticated,)
     serializer_class = CartPriceSerializer
 
@@ -425,5 +622,32 @@ class CartPriceView(APIView):
     )
     def get(self, request):
         return Response(CartPriceSerializer(
-            CartPrice(price=sum(rug.price for rug in request.user.cart.all()))
+            CartPrice(price=get_cart_totals(request.user)[1])
+        ).data)
+
+    async def aget(self, request):
+        return Response(CartPriceSerializer(
+            CartPrice(price=(await aget_cart_totals(request.user))[1])
         ).data)
+
+
+class IsStaffOrMetricsToken(BasePermission):
+    # Scrapers send `Authorization: Bearer <METRICS_TOKEN>`; with no token set, only staff get in
+    def has_permission(self, request, view):
+        if request.user.is_staff:
+            return True
+        token = getattr(settings, "METRICS_TOKEN", None)
+        keyword, _, credentials = request.META.get("HTTP_AUTHORIZATION", "").partition(" ")
+        return bool(token) and keyword.lower() == "bearer" and constant_time_compare(credentials, token)
+
+
+class MetricsView(APIView):
+    permission_classes = (IsStaffOrMetricsToken,)
+
+    @extend_schema(
+        tags=["Metrics"],
+        description="Exports request, latency, database and checkout metrics in the Prometheus text format",
+        responses={(200, "text/plain"): str}
+    )
+    def get(self, request):
+        return HttpResponse(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1 +0,0 @@
-from rugs_app.auth_extension import AuthenticationScheme
\ No newline at end of file
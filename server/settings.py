@@ -12,12 +12,9 @@ https://docs.djangoproject.com/en/4.0/ref/settings/
 import os
 from pathlib import Path
 import sys
-import dj_database_url
 import environ
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
-from django.core.management.utils import get_random_secret_key
-
 env = environ.Env()
 environ.Env.read_env()
 
@@ -35,8 +32,17 @@ EMAIL_HOST_USER = os.getenv("EMAIL_HOST_USER", env('EMAIL_HOST_USER'))
 EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD", env('EMAIL_HOST_PASSWORD'))
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 
+# Outbox worker (manage.py process_email_outbox)
+EMAIL_OUTBOX_BATCH_SIZE = int(os.getenv("EMAIL_OUTBOX_BATCH_SIZE", 100))
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv("EMAIL_OUTBOX_MAX_ATTEMPTS", 5))
+EMAIL_OUTBOX_RETRY_DELAY = int(os.getenv("EMAIL_OUTBOX_RETRY_DELAY", 60))
+
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = os.getenv("DJANGO_SECRET_KEY", get_random_secret_key())
+# Only generated when unset, so deployments that set it skip the work on every cold start
+SECRET_KEY = os.getenv("DJANGO_SECRET_KEY")
+if SECRET_KEY is None:
+    from django.core.management.utils import get_random_secret_key
+    SECRET_KEY = get_random_secret_key()
 
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = os.getenv("DEBUG", env('DEBUG') or "False") == "True"
@@ -65,6 +71,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'rugs_app.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -73,6 +80,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'rugs_app.middleware.ReplicaMiddleware',
 ]
 
 CSRF_TRUSTED_ORIGINS = [
@@ -90,7 +98,7 @@ AUTHENTICATION_BACKENDS = (
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'knox.auth.TokenAuthentication',
+        'rugs_app.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend'
@@ -106,8 +114,8 @@ REST_FRAMEWORK = {
         'rest_framework.parsers.FormParser',
     ],
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
-    'PAGE_SIZE': 10
+    'DEFAULT_PAGINATION_CLASS': 'rugs_app.pagination.AsyncPageNumberPagination',
+    'PAGE_SIZE': 8
 }
 
 REST_KNOX = {
@@ -128,6 +136,8 @@ SPECTACULAR_SETTINGS = {
     'TITLE': 'E-commerce Site API',
     'DESCRIPTION': 'Documentation of API for my E-commerce website project',
     'VERSION': '1.0.0',
+    # Registers the knox authentication extension when a schema is generated
+    'PREPROCESSING_HOOKS': ['rugs_app.auth_extension.register_extensions'],
 }
 
 
@@ -164,20 +174,115 @@ if DEVELOPMENT_MODE is True:
 else:
     if os.getenv("DATABASE_URL", None) is None:
         raise Exception("DATABASE_URL environment variable not defined")
+    import dj_database_url
     DATABASES = {
         "default": {
-            'ENGINE': 'dj_db_conn_pool.backends.postgresql',
             **dj_database_url.parse(os.environ.get("DATABASE_URL")),
+            'ENGINE': 'rugs_app.db.backends.pooled_postgresql',
             'POOL_OPTIONS': {
-                'POOL_SIZE': 2,
-                'MAX_OVERFLOW': 1,
+                'POOL_SIZE': int(os.getenv("DATABASE_POOL_SIZE", 5)),
+                'MAX_OVERFLOW': int(os.getenv("DATABASE_POOL_MAX_OVERFLOW", 5)),
+                # Seconds before a connection is replaced, and to wait for one when all are in use
+                'RECYCLE': int(os.getenv("DATABASE_POOL_RECYCLE", 1800)),
+                'TIMEOUT': int(os.getenv("DATABASE_POOL_TIMEOUT", 10)),
+                # Check each connection on checkout
+                'PRE_PING': os.getenv("DATABASE_POOL_PRE_PING", "True") == "True",
             }
         }
     }
+    # Serverless instances (Vercel sets VERCEL) serve one request at a time and are frozen in between, so a
+    # pool only holds server connections open. They keep a single connection across warm invocations instead,
+    # checked before each request in case the server dropped it while the instance was frozen
+    if os.getenv("SERVERLESS", "True" if os.getenv("VERCEL") else "False") == "True":
+        del DATABASES["default"]["POOL_OPTIONS"]
+        DATABASES["default"].update({
+            'ENGINE': 'rugs_app.db.backends.postgresql',
+            # Keep below the server's idle timeout
+            'CONN_MAX_AGE': int(os.getenv("DATABASE_CONN_MAX_AGE", 60)),
+            'CONN_HEALTH_CHECKS': True,
+        })
+
+# Read replicas, as comma-separated database URLs; each becomes a `replica<n>` database. GET requests to the
+# catalog, order list and cart views read from them (see rugs_app.replicas)
+DATABASE_REPLICA_URLS = [url for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url]
+if DATABASE_REPLICA_URLS:
+    import dj_database_url
+    for number, url in enumerate(DATABASE_REPLICA_URLS, 1):
+        # Same backend and connection settings as the primary, with the replica's address
+        address = {key: value for key, value in dj_database_url.parse(url).items()
+                   if key in ("NAME", "USER", "PASSWORD", "HOST", "PORT")}
+        DATABASES[f"replica{number}"] = {
+            **DATABASES["default"],
+            **address,
+            # Tests read the primary's test database through the replicas
+            "TEST": {"MIRROR": "default"},
+        }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != "default"]
+DATABASE_ROUTERS = ["rugs_app.replicas.ReplicaRouter"]
+# Seconds reads stay on the primary after a change they depend on, or after a write by the same user,
+# so that nobody reads a replica that may not have caught up yet
+REPLICA_STICKY_SECONDS = int(os.getenv("REPLICA_STICKY_SECONDS", 5))
+# Seconds a replica that couldn't be connected to is skipped
+REPLICA_RETRY_SECONDS = int(os.getenv("REPLICA_RETRY_SECONDS", 30))
 
 AUTH_USER_MODEL = 'rugs_app.User'
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+# Catalog, order and cart versions live in the cache, and every cached response, ETag and cart total is
+# checked against them, as are cached auth tokens. A change made in one process must therefore be seen by
+# all of them, so outside DEVELOPMENT_MODE CACHE_URL must name a cache every process shares: e.g.
+# dbcache://rugs_cache (after manage.py createcachetable), or a Redis or Memcached URL with its client
+# installed. Serverless instances each count as a process. The per-process memory cache is only used
+# for development.
+
+if DEVELOPMENT_MODE is True:
+    CACHES = {
+        'default': env.cache_url('CACHE_URL', default='locmemcache://'),
+    }
+else:
+    if os.getenv("CACHE_URL", None) is None:
+        raise Exception("CACHE_URL environment variable not defined")
+    CACHES = {
+        'default': env.cache_url('CACHE_URL'),
+    }
+    if CACHES['default']['BACKEND'] in (
+        'django.core.cache.backends.locmem.LocMemCache',
+        'django.core.cache.backends.dummy.DummyCache',
+    ):
+        raise Exception("CACHE_URL must be a cache shared by every process")
+
+# Seconds a cached rug catalog response is kept; any rug change invalidates it sooner
+RUG_CACHE_TIMEOUT = int(os.getenv("RUG_CACHE_TIMEOUT", 300))
+# Longest time a verified auth token is cached (see rugs_app.authentication)
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.getenv("AUTH_TOKEN_CACHE_TIMEOUT", 300))
+# Most tokens a user can hold at once; logging in on another device drops the oldest
+AUTH_TOKEN_LIMIT_PER_USER = int(os.getenv("AUTH_TOKEN_LIMIT_PER_USER", 10))
+# Seconds a rug added to a cart is reserved for that user (0 to let any number of carts hold it);
+# run manage.py release_expired_holds to clear expired reservations
+CART_RESERVATION_TTL = int(os.getenv("CART_RESERVATION_TTL", 0))
+
+# Server-Timing headers and slow request logging (see rugs_app.middleware)
+PERFORMANCE_METRICS = os.getenv("PERFORMANCE_METRICS", "False") == "True"
+SLOW_REQUEST_THRESHOLD = int(os.getenv("SLOW_REQUEST_THRESHOLD", 500))
+# Where each worker process writes its metrics for /api/metrics to merge; unset to keep them per process.
+# Workers sharing it must run on one host, since exited workers are found by process id.
+# Request metrics are only collected with PERFORMANCE_METRICS on
+METRICS_DIR = os.getenv("METRICS_DIR", None)
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", 1))
+# Bearer token a Prometheus scraper can read /api/metrics with; unset, only staff users can
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", None)
+
+# Serve the rug, cart and order reads from async views (see rugs_app.async_views), for ASGI servers.
+# Under WSGI each of them would need an event loop of its own, so leave it off there
+ASYNC_VIEWS = os.getenv("ASYNC_VIEWS", "False") == "True"
+
+# Serve /api/schema/ from the file `manage.py build_schema` writes instead of generating it on every request
+PREBUILT_SCHEMA = os.getenv("PREBUILT_SCHEMA", "False") == "True"
+SCHEMA_FILE = os.getenv("SCHEMA_FILE", os.path.join(BASE_DIR, "schema.yaml"))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
 